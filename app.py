@@ -1,46 +1,25 @@
 import streamlit as st
 import pandas as pd
-from discovery_engine import search_civic_network, generate_civic_insight
-from db_manager import initialize_database, add_user, log_search, get_user_by_name, update_user_profile, \
-    save_collaboration, get_saved_collaborations, publish_user_to_directory
+from discovery_engine import search_civic_network, stream_civic_insight, generate_civic_insight_map_reduce, \
+    get_ttft_stats
+from db_manager import initialize_database, add_user, get_user_by_name, update_user_profile, \
+    save_collaboration, unsave_collaboration, unsave_collaborations, get_saved_collaborations, \
+    count_saved_collaborations, publish_user_to_directory, get_pool_stats
+from contact_store import get_contacts_source, get_store_stats
+from contact_snapshot import select_ids, as_dataframe, get_snapshot_stats
+from network_graph import render_network_map, get_map_cache_stats
+from search_log_writer import enqueue_search_log, get_writer_stats
+from llm_cache import get_cache_stats
+from directory_query import query_directory, count_directory, get_campus_facets, DIRECTORY_PAGE_SIZE, \
+    DOMAIN_MAPPINGS, ROLE_MAPPINGS
+from retrieval import retrieve_for_insight
+from llm_client import LLMError
+from perf_tracing import new_trace, span, get_stage_latency, get_recent_traces, get_tracing_stats
+from llm_router import get_router_stats
+from campus_map import CUNY_COLLEGES
 
 initialize_database()
 
-# The "Bridge": Maps messy CSV shorthand to clean UI names
-CUNY_MAP = {
-    "BMCC": "Borough of Manhattan Community College",
-    "Baruch College": "Baruch College",
-    "Bronx Community College": "Bronx Community College",
-    "Brooklyn College": "Brooklyn College",
-    "City College": "The City College of New York",
-    "College of Staten Island": "College of Staten Island",
-    "Graduate Center": "CUNY Graduate Center",
-    "Guttman Community College": "Guttman Community College",
-    "Hostos Community College": "Hostos Community College",
-    "Hunter College": "Hunter College",
-    "John Jay College": "John Jay College of Criminal Justice",
-    "Kingsborough CC": "Kingsborough Community College",
-    "Kingsborough Community College": "Kingsborough Community College",
-    "LaGuardia CC": "LaGuardia Community College",
-    "Lehman College": "Lehman College",
-    "Macaulay Honors": "Macaulay Honors College",
-    "Medgar Evers": "Medgar Evers College",
-    "Medgar Evers College": "Medgar Evers College",
-    "NYC College of Technology": "New York City College of Technology",
-    "city tech": "New York City College of Technology",
-    "Queens College": "Queens College",
-    "Queensborough CC": "Queensborough Community College",
-    "York College": "York College",
-    "CUNY Law School": "CUNY School of Law",
-    "CUNY SPS": "CUNY School of Professional Studies",
-    "School of Public Health": "CUNY Graduate School of Public Health & Health Policy",
-    "School of Labor & Urban Studies": "CUNY School of Labor and Urban Studies",
-    "Craig Newmark Graduate School of Journalism": "Craig Newmark Graduate School of Journalism at CUNY",
-}
-
-
-CUNY_COLLEGES = sorted(list(set(CUNY_MAP.values())))
-
 # 1. Page Config
 st.set_page_config(page_title="CUNY Civic Discovery", layout="wide", page_icon="🏙️")
 
@@ -151,17 +130,66 @@ else:
         st.title("👤 My Profile")
         st.info(f"**{profile['name']}**\n\n🏫 {profile['campus']}\n\n🎯 {profile['focus']}")
 
-        mode = st.radio("Navigation:", ["🌐 Main Workspace", "⚙️ Edit Profile / Saved"])
+        mode = st.radio("Navigation:", ["🌐 Main Workspace", "⚙️ Edit Profile / Saved", "📊 Performance"])
 
     # --- LOAD DATABASE ---
-    import sqlite3
-
-    conn = sqlite3.connect('cuny_civic_network.db')
-    df = pd.read_sql_query("SELECT * FROM Network_Contacts", conn)
-    conn.close()
+    # Shared across sessions (and across processes with CONTACT_SNAPSHOT=1); only re-read when Network_Contacts changes
+    df = get_contacts_source()
+
+    # --- PERFORMANCE (ADMIN) MODE ---
+    if mode == "📊 Performance":
+        st.subheader("📊 Copilot Performance")
+        st.caption("Latency per stage of a copilot answer, from the tracing spans in Perf_Metrics.")
+
+        p_col1, p_col2 = st.columns(2)
+        with p_col1:
+            window_hours = st.selectbox("Time window", [1, 24, 24 * 7], index=1,
+                                        format_func=lambda h: f"Last {h} hours" if h < 48 else f"Last {h // 24} days")
+        with p_col2:
+            by_provider = st.toggle("Split by provider", value=True)
+
+        latency = get_stage_latency(since_hours=window_hours, by_provider=by_provider)
+        if latency.empty:
+            st.info("No spans recorded in this window yet. Ask the Copilot a question first.")
+        else:
+            st.dataframe(latency, hide_index=True, use_container_width=True)
+            st.bar_chart(latency.groupby("stage")[["p50_ms", "p95_ms", "p99_ms"]].max())
+
+        # Rolling health the router uses to pick a provider per call type (this server process only)
+        st.markdown("**Provider routing**")
+        st.dataframe(pd.DataFrame(get_router_stats()), hide_index=True, use_container_width=True)
+
+        with st.expander("🔎 Recent traces"):
+            st.dataframe(get_recent_traces(limit=20), hide_index=True, use_container_width=True)
+
+        # Perceived latency of streamed answers (this server process only)
+        ttft = get_ttft_stats()
+        t_col1, t_col2, t_col3 = st.columns(3)
+        t_col1.metric("Streamed answers", ttft["count"])
+        t_col2.metric("Time to first token p50", f"{ttft['p50_ms']:.0f} ms" if ttft["p50_ms"] is not None else "–")
+        t_col3.metric("Time to first token p95", f"{ttft['p95_ms']:.0f} ms" if ttft["p95_ms"] is not None else "–")
+
+        # Shared by every process (lives in the database)
+        st.markdown("**LLM cache**")
+        cache_stats = get_cache_stats()
+        if cache_stats:
+            st.dataframe(pd.DataFrame.from_dict(cache_stats, orient="index").rename_axis("cache").reset_index(),
+                         hide_index=True, use_container_width=True)
+        else:
+            st.caption("No cache lookups recorded yet.")
+
+        with st.expander("⚙️ In-process caches and background writers"):
+            st.json({
+                "Contact store": get_store_stats(),
+                "Columnar snapshot": get_snapshot_stats(),
+                "Map cache": get_map_cache_stats(),
+                "Search log writer": get_writer_stats(),
+                "Span writer": get_tracing_stats(),
+                "Connection pool": get_pool_stats(),
+            })
 
     # --- PROFILE SETTINGS MODE ---
-    if mode == "⚙️ Edit Profile / Saved":
+    elif mode == "⚙️ Edit Profile / Saved":
         st.subheader("⚙️ Edit Profile & Saved Contacts")
 
         tab1, tab2 = st.tabs(["Update Info", "⭐ Saved Collaborations"])
@@ -210,12 +238,41 @@ else:
                 st.balloons()
 
         with tab2:
+            # Keyset paging: the stack holds the "before" cursor of every page visited so far
+            if 'saved_page_cursors' not in st.session_state:
+                st.session_state.saved_page_cursors = [None]
             try:
-                saved_df = get_saved_collaborations(profile['user_id'])
-                if not saved_df.empty:
-                    for _, row in saved_df.iterrows():
-                        st.markdown(f"**{row['Contact Name']}** ({row['Campus']}) - {row['Role/Title']}")
+                total_saved = count_saved_collaborations(profile['user_id'])
+                saved_df, next_cursor = get_saved_collaborations(profile['user_id'],
+                                                                 before_id=st.session_state.saved_page_cursors[-1])
+                if total_saved:
+                    page_no = len(st.session_state.saved_page_cursors)
+                    st.caption(f"{total_saved} saved contact(s) · page {page_no}")
+                    for row in saved_df.to_dict("records"):
+                        s_col1, s_col2 = st.columns([5, 1])
+                        with s_col1:
+                            st.markdown(f"**{row['Contact Name']}** ({row['Campus']}) - {row['Role/Title']}")
+                        with s_col2:
+                            if st.button("Remove", key=f"unsave_{row['saved_id']}"):
+                                unsave_collaboration(profile['user_id'], row['ID'])
+                                st.rerun()
+
+                    p_col1, p_col2, p_col3 = st.columns([1, 1, 2])
+                    with p_col1:
+                        if page_no > 1 and st.button("⬅️ Previous"):
+                            st.session_state.saved_page_cursors.pop()
+                            st.rerun()
+                    with p_col2:
+                        if next_cursor is not None and st.button("Next ➡️"):
+                            st.session_state.saved_page_cursors.append(next_cursor)
+                            st.rerun()
+                    with p_col3:
+                        if st.button("🗑️ Remove all on this page"):
+                            unsave_collaborations(profile['user_id'], saved_df['ID'].tolist())
+                            st.session_state.saved_page_cursors = [None]
+                            st.rerun()
                 else:
+                    st.session_state.saved_page_cursors = [None]
                     st.write("You haven't saved any contacts yet!")
             except Exception as e:
                 st.write("No saved contacts found. Ensure database is updated.")
@@ -233,7 +290,8 @@ else:
             # STATE A: VIEWING THE NETWORK MAP FOR A SPECIFIC PERSON
             if st.session_state.viewing_map_for:
                 target_id = st.session_state.viewing_map_for
-                target_person = df[df['ID'] == target_id].iloc[0] if not df[df['ID'] == target_id].empty else None
+                target_rows = select_ids(df, [target_id])
+                target_person = target_rows.iloc[0] if not target_rows.empty else None
 
                 if st.button("⬅️ Back to Directory"):
                     st.session_state.viewing_map_for = None
@@ -260,88 +318,12 @@ else:
                     )
 
                     with st.spinner("Generating physics map..."):
-                        from pyvis.network import Network
                         import streamlit.components.v1 as components
 
-                        net = Network(height='600px', width='100%', bgcolor='#ffffff', font_color='#000000')
-
-                        target_name = str(target_person['Contact Name'])
-                        target_campus = str(target_person['Campus'])
-
-                        domains_str = str(target_person['Civic Domains'])
-                        domains = [d.strip() for d in domains_str.split(',')] if domains_str != "nan" and domains_str != "None" else []
-
-                        # --- MODE 1: ECOSYSTEM VIEW (The New Default) ---
-                        if map_mode == "🌐 Ecosystem View (Focus-Centric)":
-                            added_nodes = set()
-
-                            # The Target Person (Massive, distinct color)
-                            target_node_id = f"TARGET_{target_id}"
-                            net.add_node(target_node_id, label=target_name, color='#FFD700', size=40, title="🌟 CURRENTLY VIEWING 🌟")
-                            added_nodes.add(target_node_id)
-
-                            for domain in domains:
-                                # Central Domain Nodes
-                                if domain not in added_nodes:
-                                    net.add_node(domain, label=domain, color='#9C27B0', size=35, title="Civic Focus")
-                                    added_nodes.add(domain)
-
-                                # Connect Target to Domain
-                                net.add_edge(target_node_id, domain, color='#FFD700', value=3)
-
-                                # Find others sharing this domain
-                                pattern = f"(?i){domain}"
-                                shared_df = df[df['Civic Domains'].fillna('').str.contains(pattern)].head(20) # Limit to 20 to prevent hairball
-
-                                for _, row in shared_df.fillna("Unknown").iterrows():
-                                    if str(row['ID']) != str(target_id):
-                                        peer_name = str(row['Contact Name'])
-                                        peer_campus = str(row['Campus'])
-                                        node_id = f"{peer_name} ({peer_campus})"
-
-                                        hover_text = f"Role: {row.get('Role/Title', 'N/A')}\nCapabilities: {row.get('Capabilities / Expertise', 'N/A')}"
-
-                                        # Add Peer Node
-                                        if node_id not in added_nodes:
-                                            net.add_node(node_id, label=peer_name, color='#2196F3', size=15, title=hover_text)
-                                            added_nodes.add(node_id)
-
-                                        # Add Campus Node
-                                        if peer_campus not in added_nodes:
-                                            net.add_node(peer_campus, label=peer_campus, color='#4CAF50', size=25, title="Campus")
-                                            added_nodes.add(peer_campus)
-
-                                        # Link: Domain -> Campus -> Person
-                                        net.add_edge(domain, peer_campus, color='#e0e0e0')
-                                        net.add_edge(peer_campus, node_id, color='#e0e0e0')
-
-                        # --- MODE 2: DIRECT NETWORK (The Old View) ---
-                        else:
-                            net.add_node(target_name, label=target_name, color='#FF5722', size=35, title="Focus Contact")
-                            net.add_node(target_campus, label=target_campus, color='#4CAF50', size=25, title="Home Campus")
-                            net.add_edge(target_name, target_campus, color='#cccccc')
-
-                            for domain in domains:
-                                net.add_node(domain, label=domain, color='#9C27B0', size=20)
-                                net.add_edge(target_name, domain, color='#cccccc')
-
-                                pattern = f"(?i){domain}"
-                                shared_df = df[df['Civic Domains'].fillna('').str.contains(pattern)].head(15)
-
-                                for _, row in shared_df.fillna("Unknown").iterrows():
-                                    if row['ID'] != target_id:
-                                        peer_name = str(row['Contact Name'])
-                                        node_id = f"{peer_name} ({row['Campus']})"
-                                        hover_text = f"Role: {row.get('Role/Title', 'N/A')}\nCapabilities: {row.get('Capabilities / Expertise', 'N/A')}"
-                                        net.add_node(node_id, label=peer_name, color='#2196F3', size=15, title=hover_text)
-                                        net.add_edge(domain, node_id, color='#e0e0e0')
-
-                        # Generate Map
-                        net.repulsion(node_distance=150, central_gravity=0.05, spring_length=150, spring_strength=0.05)
                         try:
-                            net.save_graph('network_map.html')
-                            HtmlFile = open('network_map.html', 'r', encoding='utf-8')
-                            components.html(HtmlFile.read(), height=620)
+                            # Built in memory and cached per (contact, view, data version)
+                            mode_key = "ecosystem" if map_mode == "🌐 Ecosystem View (Focus-Centric)" else "direct"
+                            components.html(render_network_map(target_id, mode_key), height=620)
                         except Exception as e:
                             st.error(f"Error generating graph: {e}")
 
@@ -369,87 +351,46 @@ else:
                 with f_col1:
                     search_keyword = st.text_input("🔍 Name or Keyword")
 
+                # Facet options come from the materialized canonical campus columns
+                campus_facets = get_campus_facets()
+
                 with f_col2:
-                    # Logic: If it's in our CUNY_MAP, it's a Campus.
-                    all_locations = df['Campus'].dropna().unique().tolist()
-                    cuny_only = sorted(list(set([CUNY_MAP[c] for c in all_locations if c in CUNY_MAP])))
-                    sel_cuny = st.multiselect("🏫 CUNY Campus", cuny_only)
+                    sel_cuny = st.multiselect("🏫 CUNY Campus", campus_facets['cuny'])
 
                 with f_col3:
-                    # Logic: If it's NOT in our CUNY_MAP, it's a Community Partner.
-                    partners_only = sorted([c for c in all_locations if c not in CUNY_MAP])
-                    sel_partners = st.multiselect("🌍 Community Partner", partners_only)
+                    sel_partners = st.multiselect("🌍 Community Partner", campus_facets['partners'])
 
                 with f_col4:
-                    # The Hybrid UI Bucketing Logic for Domains
-                    DOMAIN_MAPPINGS = {
-                        "Education & Youth Development": r"Education|Youth|School|K-12|Tutoring|College|Student|Academia",
-                        "Justice, Policy & Government": r"Justice|\bLaw\b|\bLegal\b|Policy|Advocacy|Voting|Democracy|Rights|Equity|Government|Immigration",
-                        "Health & Wellness": r"Health|Medical|Mental Health|Food Security|Nutrition|\bCare\b|Wellness",
-                        "Community & Civic Engagement": r"Community|Housing|Urban|Planning|Neighborhood|Civic",
-                        "Economic Empowerment & Workforce": r"Economic|Workforce|Jobs|Business|Entrepreneurship|Career",
-                        "Arts, Media & Culture": r"\bArt\b|\bArts\b|Culture|Media|Journalism|History|Communications",
-                        "Environment & Sustainability": r"Environment|Climate|Sustainability|Energy|Green",
-                        "Technology, Data & Innovation": r"Technology|Tech|Data|\bSTEM\b|Innovation|\bIT\b",
-                        "Research & Social Sciences": r"Research|Sociology|Political Science|Science|Study",
-                        "Other / Cross-Cutting": r"Other|Cross|Interdisciplinary"
-                    }
+                    # Bucket -> regex mappings live in directory_query
                     sel_domains = st.multiselect("🎯 Focus Area", list(DOMAIN_MAPPINGS.keys()))
 
                 with f_col5:
-                    # The Hybrid UI Bucketing Logic
-                    ROLE_MAPPINGS = {
-                        "Faculty & Teachers": r"Professor|Adjunct|Faculty|Lecturer|Instructor|Teacher",
-                        "Students & Fellows": r"Student|Candidate|Fellow|Scholar",
-                        "Administration": r"Dean|Director|Provost|President|Coordinator|Manager|Chair|Admin",
-                        "External Partners": r"Founder|\bCEO\b|Consultant|Partner",
-                        "INI Staff": r"\bINI\b|Vngle"
-                    }
                     sel_roles = st.multiselect("💼 Role Category", list(ROLE_MAPPINGS.keys()))
 
                 # ==========================================
                 # THE UPGRADED FILTERING LOGIC
                 # ==========================================
-                filtered_df = df.copy()
-
-                if search_keyword:
-                    # Search across Name, Domains, Affiliation, and Notes simultaneously!
-                    search_mask = (
-                        filtered_df['Contact Name'].fillna('').str.contains(search_keyword, case=False) |
-                        filtered_df['Civic Domains'].fillna('').str.contains(search_keyword, case=False) |
-                        filtered_df['Notes / Insights'].fillna('').str.contains(search_keyword, case=False) |
-                        filtered_df['Program/Org Affiliation'].fillna('').str.contains(search_keyword, case=False)
-                    )
-                    filtered_df = filtered_df[search_mask]
-
-                # Combine the two location dropdowns
-                if sel_cuny or sel_partners:
-                    # We need to find all the "raw" names that match the user's "clean" selections
-                    raw_targets = []
-
-                    # Add partners directly
-                    raw_targets.extend(sel_partners)
-
-                    # Add all raw variations for the selected CUNY schools
-                    for raw_name, clean_name in CUNY_MAP.items():
-                        if clean_name in sel_cuny:
-                            raw_targets.append(raw_name)
-
-                    filtered_df = filtered_df[filtered_df['Campus'].isin(raw_targets)]
+                # Combine the two location dropdowns (both are canonical campus keys: one indexed IN lookup)
+                campus_targets = sel_cuny + sel_partners
 
-                if sel_domains:
-                    combined_domain_pattern = '|'.join([DOMAIN_MAPPINGS[d] for d in sel_domains])
-                    filtered_df = filtered_df[filtered_df['Civic Domains'].fillna('').str.contains(combined_domain_pattern, case=False, regex=True)]
+                # Filters run in SQLite: only the visible page of cards is fetched
+                directory_filters = dict(keyword=search_keyword, campuses=campus_targets,
+                                         domains=sel_domains, roles=sel_roles)
+                filter_signature = repr(directory_filters)
+                if st.session_state.get('directory_filters') != filter_signature:
+                    st.session_state.directory_filters = filter_signature
+                    st.session_state.directory_page = 0
 
-                if sel_roles:
-                    # Combine the regex patterns for the selected buckets and filter the raw text
-                    combined_pattern = '|'.join([ROLE_MAPPINGS[role] for role in sel_roles])
-                    filtered_df = filtered_df[filtered_df['Role/Title'].fillna('').str.contains(combined_pattern, case=False, regex=True)]
+                total_matches = count_directory(**directory_filters)
+                page_count = max(1, -(-total_matches // DIRECTORY_PAGE_SIZE))
+                page = min(st.session_state.get('directory_page', 0), page_count - 1)
+                page_df = query_directory(**directory_filters, page=page)
 
-                st.markdown(f"**Showing {len(filtered_df)} Contacts**")
+                first_shown = page * DIRECTORY_PAGE_SIZE + 1 if total_matches else 0
+                st.markdown(f"**Showing {first_shown}–{page * DIRECTORY_PAGE_SIZE + len(page_df)} of {total_matches} Contacts**")
 
                 # Native Streamlit Container Cards (UPDATED WITH NEW FIELDS)
-                for _, row in filtered_df.head(50).iterrows():
+                for row in page_df.to_dict("records"):
                     with st.container(border=True):
                         st.markdown(f"#### {row.get('Contact Name', 'Unknown')}")
                         st.markdown(f"**{row.get('Campus', 'Unknown')}** | {row.get('Role/Title', '')}")
@@ -465,6 +406,9 @@ else:
                         if pd.notna(row.get('Email/Phone/LinkedIn')):
                             st.markdown(f"**✉️ Contact:** {row['Email/Phone/LinkedIn']}")
 
+                        if search_keyword and pd.notna(row.get('snippet')):
+                            st.markdown(f"**🔎 Match:** {row['snippet']}")
+
                         if pd.notna(row.get('Notes / Insights')):
                             with st.expander("📝 View Notes & Insights"):
                                 st.write(row['Notes / Insights'])
@@ -474,23 +418,42 @@ else:
                         with b_col1:
                             if st.button("⭐ Mark as Interesting", key=f"star_{row['ID']}"):
                                 try:
-                                    save_collaboration(profile['user_id'], row['ID'])
-                                    st.toast(f"Saved {row['Contact Name']} to your list!")
+                                    if save_collaboration(profile['user_id'], row['ID']):
+                                        st.toast(f"Saved {row['Contact Name']} to your list!")
+                                    else:
+                                        st.toast(f"{row['Contact Name']} is already in your list.")
                                 except Exception as e:
                                     st.error("Please run the SQL database update first.")
                         with b_col2:
                             if st.button("🗺️ View Connections", key=f"map_{row['ID']}"):
                                 st.session_state.viewing_map_for = row['ID']
                                 st.rerun()
+
+                # Pager
+                if page_count > 1:
+                    pg_col1, pg_col2, pg_col3 = st.columns([1, 2, 1])
+                    with pg_col1:
+                        if page > 0 and st.button("⬅️ Previous page"):
+                            st.session_state.directory_page = page - 1
+                            st.rerun()
+                    with pg_col2:
+                        st.caption(f"Page {page + 1} of {page_count}")
+                    with pg_col3:
+                        if page < page_count - 1 and st.button("Next page ➡️"):
+                            st.session_state.directory_page = page + 1
+                            st.rerun()
         # ==========================================
         # RIGHT PANE: THE AI COPILOT (30%)
         # ==========================================
         with col_copilot:
             st.markdown("### 🤖 Civic Copilot")
             st.caption("💡 **Tip:** Ask questions that mention specific people, topics, or campuses/locations (e.g., *\"Who does food security at Lehman?\"* or *\"Explain Sada Jaman's work?\"*) for fast results. "
-                       "Open-ended questions will automatically trigger a full-network Deep Search that may take a long time to complete.")
+                       "Open-ended questions will automatically trigger a Deep Search over the most relevant contacts in the network.")
+
 
 
+            full_network = st.toggle("🌐 Full-network analysis", value=False,
+                                     help="For broad questions: scan every contact in parallel shards instead of only the most relevant ones.")
 
             # The Container (fixed height so it doesn't vanish from the screen)
             chat_container = st.container(height=600)
@@ -512,31 +475,67 @@ else:
                 # 2. Create the AI's response space
                 with chat_container:
                     with st.chat_message("assistant"):
-                        # Put the spinner INSIDE the AI's chat bubble
-                        with st.spinner("Analyzing..."):
-                            try:
-                                # We moved log_search here to catch database errors
-                                log_search(profile['user_id'], prompt)
+                        stream_stats = {}
+                        try:
+                            # Put the spinner INSIDE the AI's chat bubble while we search
+                            with st.spinner("Analyzing..."):
+                                # One trace per question: every stage below is timed into Perf_Metrics
+                                new_trace()
+                                # Queued for the background writer: no database write on the answer path
+                                with span("log_search"):
+                                    enqueue_search_log(profile['user_id'], prompt)
 
                                 matches, filters = search_civic_network(prompt, df)
+                                context = None
                                 if not matches.empty:
-                                    insight = generate_civic_insight(prompt, matches)
-                                    response = f"{insight}\n\n*(Analyzed {len(matches)} specific entries)*"
+                                    context_df = matches
+                                    header = ""
+                                    footer = f"*(Analyzed {len(matches)} specific entries)*"
+                                elif full_network:
+                                    st.info("Not enough specific matches. Analyzing the entire network in parallel shards...")
+                                    context_df = None
+                                    insight, shard_stats = generate_civic_insight_map_reduce(prompt, as_dataframe(df))
+                                    skipped = shard_stats['timed_out'] + shard_stats['failed']
+                                    skipped_note = f", {skipped} slow shard(s) skipped" if skipped else ""
+                                    header = "**Deep Insight (Full Network):**\n\n"
+                                    footer = f"*(Analyzed all {len(df)} entries in {shard_stats['shards']} shards{skipped_note})*"
                                 else:
-                                    st.info("Not enough specific matches. Expanding search to the entire network...")
-                                    insight = generate_civic_insight(prompt, df)
-                                    response = f"**Deep Insight (Expanded Search):**\n\n{insight}\n\n*(Analyzed all {len(df)} entries)*"
-
-
-                            except Exception as e:
-                                # THE MAGIC FIX: If anything crashes, the AI will tell us exactly what it is.
-                                response = f"⚠️ **System Error:** {str(e)}"
-
-                        # Render the final response (or the error)
-                        st.markdown(response)
+                                    st.info("Not enough specific matches. Expanding search to the most relevant contacts across the network...")
+                                    context_df, retrieval = retrieve_for_insight(prompt, df)
+                                    context = retrieval['context']
+                                    header = "**Deep Insight (Expanded Search):**\n\n"
+                                    footer = (f"*(Analyzed the {retrieval['selected']} most relevant related entries, "
+                                              f"~{retrieval['tokens']:,} tokens)*")
+
+                            # Stream the answer into the bubble as it is generated
+                            # (the render span includes the streamed completion; the insight span has it alone)
+                            with span("render"):
+                                if header:
+                                    st.markdown(header)
+                                if context_df is not None:
+                                    insight = st.write_stream(stream_civic_insight(prompt, context_df, stats=stream_stats,
+                                                                                 context=context))
+                                    from_cache = stream_stats.get('cached')
+                                else:
+                                    st.markdown(insight)
+                                    from_cache = shard_stats['cached']
+                                if from_cache:
+                                    footer = f"{footer} ⚡ *Cached answer: these contacts haven't changed since it was generated.*"
+                                st.markdown(footer)
+                            response = f"{header}{insight}\n\n{footer}"
+
+                        except LLMError as e:
+                            # The provider itself failed (timeout, rate limit, outage): say so plainly
+                            response = f"⚠️ **The AI provider is not responding right now ({e.kind}).** Please try again in a moment."
+                            st.markdown(response)
+                        except Exception as e:
+                            # THE MAGIC FIX: If anything crashes, the AI will tell us exactly what it is.
+                            response = f"⚠️ **System Error:** {str(e)}"
+                            st.markdown(response)
 
                 # 3. Save the response to session state so it survives the next reload
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                st.session_state.messages.append(
+                    {"role": "assistant", "content": response, "ttft_ms": stream_stats.get('ttft_ms')})
 
                 if 'history' not in st.session_state:
                     st.session_state.history = []
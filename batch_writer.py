@@ -0,0 +1,121 @@
+import atexit
+import sqlite3
+import threading
+import time
+from collections import deque
+from db_manager import transaction
+
+# ---------------------------------------------------------
+# WRITE-BEHIND BATCH WRITER
+# ---------------------------------------------------------
+# Rows are queued in memory (microseconds, never a database write on the request
+# path) and a background thread writes them in ONE transaction whenever the batch
+# is big enough or old enough. The queue is bounded (the oldest rows are dropped)
+# and flushed at shutdown. Used by the search log and the tracing spans.
+
+
+class BatchWriter:
+    """
+    Queue + background thread for one table. write_rows(conn, rows) runs inside a write transaction.
+    With retry_failed, a batch that hits a database error is put back at the front of the queue;
+    otherwise it is counted as dropped.
+    """
+
+    def __init__(self, name, write_rows, batch_size=100, flush_interval=2.0, max_queue_size=10000,
+                 retry_failed=False):
+        self.name = name
+        self.write_rows = write_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.retry_failed = retry_failed
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self._stats = {"enqueued": 0, "written": 0, "flushes": 0, "dropped": 0, "errors": 0, "last_flush_ms": 0.0}
+        atexit.register(self.shutdown)
+
+    def enqueue(self, row):
+        """Queues one row for the background thread. Never blocks on the database."""
+        with self._cond:
+            if len(self._queue) >= self.max_queue_size:
+                self._queue.popleft()
+                self._stats["dropped"] += 1
+            self._queue.append(row)
+            self._stats["enqueued"] += 1
+            self._ensure_thread()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def _write_batch(self, rows):
+        start = time.perf_counter()
+        try:
+            with transaction() as conn:
+                self.write_rows(conn, rows)
+        except sqlite3.Error:
+            with self._cond:
+                self._stats["errors"] += 1
+                if self.retry_failed:
+                    # Put the rows back so the next flush retries them
+                    room = max(self.max_queue_size - len(self._queue), 0)
+                    self._queue.extendleft(reversed(rows[:room]))
+                    self._stats["dropped"] += max(len(rows) - room, 0)
+                else:
+                    self._stats["dropped"] += len(rows)
+            return False
+        with self._cond:
+            self._stats["written"] += len(rows)
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = (time.perf_counter() - start) * 1000
+        return True
+
+    def _drain(self):
+        with self._cond:
+            rows = list(self._queue)
+            self._queue.clear()
+        return rows
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._stopping and len(self._queue) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            rows = self._drain()
+            if rows and not self._write_batch(rows) and not stopping:
+                time.sleep(self.flush_interval)
+            if stopping:
+                return
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """Writes everything queued so far, synchronously. Returns the number of rows written."""
+        rows = self._drain()
+        if rows and self._write_batch(rows):
+            return len(rows)
+        return 0
+
+    def shutdown(self, timeout=5.0):
+        """Stops the background thread after a final flush."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify()
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Counters plus the current queue depth."""
+        with self._cond:
+            return dict(self._stats, queue_depth=len(self._queue))
@@ -0,0 +1,99 @@
+"""
+Copilot throughput and tail latency, offline.
+
+Runs concurrent copilot sessions (search_civic_network + stream_civic_insight) against a
+synthetic directory with the LLM behind the simulated transport (or a recorded cassette),
+and reports requests/second plus time-to-first-token and total latency percentiles.
+
+    python benchmarks/bench_copilot.py --sessions 8 --requests 80 --ttft-ms 600 --error-rate 0.02
+    python benchmarks/bench_copilot.py --replay llm_cassette.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+QUESTIONS = [
+    "who works on housing at hunter college",
+    "mental health and youth development",
+    "food security in the bronx",
+    "anyone who could help a tenant organizing project",
+]
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(len(samples) * q))], 2)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(samples[-1], 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark copilot throughput with a simulated or replayed LLM.")
+    parser.add_argument("--rows", type=int, default=5000, help="synthetic directory size")
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent copilot sessions")
+    parser.add_argument("--requests", type=int, default=64, help="total copilot questions")
+    parser.add_argument("--ttft-ms", type=float, default=400.0)
+    parser.add_argument("--ttft-sigma", type=float, default=0.5)
+    parser.add_argument("--tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--output-tokens", type=int, default=250)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--replay", help="serve the LLM from this cassette instead of simulating it")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    import llm_transport
+    from llm_client import LLMError
+    from synthetic_data import build_synthetic_db
+    if args.replay:
+        llm_transport.configure_transport("replay", cassette_path=args.replay, realtime=True)
+    else:
+        llm_transport.configure_transport("simulated", profile=llm_transport.SimulatedProfile(
+            ttft_median_ms=args.ttft_ms, ttft_sigma=args.ttft_sigma, tokens_per_second=args.tokens_per_second,
+            output_tokens=args.output_tokens, error_rate=args.error_rate, seed=args.seed))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_synthetic_db(os.path.join(tmp, "bench.db"), args.rows, args.seed)
+        import contact_store
+        import discovery_engine
+        df = contact_store.get_contacts_df()
+
+        def ask(i):
+            # A unique suffix per request keeps the insight cache out of the measurement
+            question = f"{QUESTIONS[i % len(QUESTIONS)]} (run {i})" if not args.replay else QUESTIONS[i % len(QUESTIONS)]
+            start = time.perf_counter()
+            try:
+                matches, _ = discovery_engine.search_civic_network(question, df)
+            except LLMError:
+                return {"total_ms": (time.perf_counter() - start) * 1000, "ttft_ms": None, "error": True}
+            stats = {}
+            text = "".join(discovery_engine.stream_civic_insight(question, matches, stats=stats))
+            return {"total_ms": (time.perf_counter() - start) * 1000, "ttft_ms": stats.get("ttft_ms"),
+                    "error": "Error generating insight" in text}
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            results = list(pool.map(ask, range(args.requests)))
+        wall = time.perf_counter() - start
+
+    report = {
+        "sessions": args.sessions, "requests": args.requests, "rows": args.rows,
+        "transport": llm_transport.get_transport_stats(),
+        "throughput_rps": round(args.requests / wall, 2),
+        "errors": sum(r["error"] for r in results),
+        "ttft": _percentiles([r["ttft_ms"] for r in results if r["ttft_ms"] is not None]),
+        "total": _percentiles([r["total_ms"] for r in results]),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
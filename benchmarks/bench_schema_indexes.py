@@ -0,0 +1,163 @@
+"""
+Lookup latency before and after migration 2 (secondary indexes + UNIQUE saved collaborations).
+
+Builds a throwaway database shaped like production before the migrations (Network_Contacts
+as pandas to_sql created it: no primary key, no index on ID), brings it to schema version 1,
+fills it with a seeded synthetic dataset, times the queries the app runs, applies the
+remaining migrations and times them again.
+
+    python benchmarks/bench_schema_indexes.py --users 20000 --contacts 50000 --saved 200000 --logs 500000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+
+# Network_Contacts columns in the order the CSV import (pandas to_sql) created them
+CONTACT_COLUMNS = ["Contact Name", "Campus", "Capabilities / Expertise", "Category", "Civic Domains",
+                   "Communities Served", "Email/Phone/LinkedIn", "ID", "INI Alignments", "Last Email Sent",
+                   "Needs / Challenges", "Notes / Insights", "Oppurtunity Ideas", "Outreach Status",
+                   "Program/Org Affiliation", "Role/Title", "URL (Overview Page)"]
+
+# The other tables as the app created them before the migrations existed
+PRE_MIGRATION_DDL = '''
+CREATE TABLE Users (user_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, campus TEXT NOT NULL,
+                    role TEXT, focus TEXT, status TEXT DEFAULT 'PENDING', email TEXT, projects TEXT);
+CREATE TABLE Saved_Collaborations (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, contact_id TEXT,
+                                   saved_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                   FOREIGN KEY (user_id) REFERENCES Users(user_id),
+                                   FOREIGN KEY (contact_id) REFERENCES Network_Contacts(ID));
+CREATE TABLE Search_Logs (log_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, search_query TEXT,
+                          search_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                          FOREIGN KEY (user_id) REFERENCES Users(user_id));
+'''
+
+SAVED_PAGE_COLUMNS = ", ".join(f'nc."{c}"' for c in db_manager.SAVED_COLUMNS)
+
+LOOKUPS = {
+    "user_by_linked_contact": ("SELECT user_id FROM Users WHERE linked_contact_id = ?", "linked_id"),
+    "user_by_name": ("SELECT user_id, campus, role, focus, email, projects, linked_contact_id "
+                     "FROM Users WHERE name = ?", "name"),
+    "saved_exists": ("SELECT id FROM Saved_Collaborations WHERE user_id = ? AND contact_id = ?", "user_contact"),
+    # First page of get_saved_collaborations and its count_saved_collaborations total
+    "saved_page_join": (f'''
+                        SELECT sc.id AS saved_id, sc.saved_at, {SAVED_PAGE_COLUMNS}
+                        FROM Saved_Collaborations sc
+                                 JOIN Network_Contacts nc ON sc.contact_id = nc.ID
+                        WHERE sc.user_id = ?
+                          AND sc.id < ?
+                        ORDER BY sc.id DESC
+                        LIMIT ?
+                        ''', "user_page"),
+    "saved_count_join": ('''
+                         SELECT COUNT(*)
+                         FROM Saved_Collaborations sc
+                                  JOIN Network_Contacts nc ON sc.contact_id = nc.ID
+                         WHERE sc.user_id = ?
+                         ''', "user_id"),
+    "recent_searches": ("SELECT search_query FROM Search_Logs WHERE user_id = ? AND search_time >= ? "
+                        "ORDER BY search_time DESC LIMIT 20", "user_since"),
+}
+
+
+def create_pre_migration_tables(conn):
+    """Network_Contacts the way the CSV import made it (pandas to_sql: no primary key) plus the original tables."""
+    frame = pd.DataFrame({col: pd.Series(dtype="float64" if col == "Needs / Challenges" else "object")
+                          for col in CONTACT_COLUMNS})
+    frame.to_sql("Network_Contacts", conn, index=False)
+    conn.executescript(PRE_MIGRATION_DDL)
+
+
+def populate(conn, users, contacts, saved, logs, seed):
+    """Seeded synthetic users, contacts, bookmarks and search logs."""
+    rng = random.Random(seed)
+    with db_manager.transaction():
+        conn.executemany('INSERT INTO Network_Contacts (ID, "Contact Name", Campus, "Civic Domains") '
+                         'VALUES (?, ?, ?, ?)',
+                         [(f"CON-{i}", f"Contact {i}", f"Campus {i % 25}", "Housing; Health")
+                          for i in range(contacts)])
+        conn.executemany("INSERT INTO Users (name, campus, role, focus, linked_contact_id) VALUES (?, ?, ?, ?, ?)",
+                         [(f"user{i}", "Hunter", "Student", "Civic tech", f"USER_{i}") for i in range(users)])
+        pairs = {(rng.randrange(1, users + 1), f"CON-{rng.randrange(contacts)}") for _ in range(saved)}
+        conn.executemany("INSERT INTO Saved_Collaborations (user_id, contact_id) VALUES (?, ?)", sorted(pairs))
+        conn.executemany("INSERT INTO Search_Logs (user_id, search_query, search_time) VALUES (?, ?, ?)",
+                         [(rng.randrange(1, users + 1), f"query {i}",
+                           f"2026-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} 12:00:00")
+                          for i in range(logs)])
+    conn.execute("ANALYZE")
+    return sorted(pairs)
+
+
+def time_lookups(conn, users, pairs, iterations, seed):
+    """Median and p95 latency (ms) per lookup over `iterations` random keys."""
+    rng = random.Random(seed)
+    results = {}
+    for name, (sql, key_kind) in LOOKUPS.items():
+        samples = []
+        for _ in range(iterations):
+            user_id = rng.randrange(1, users + 1)
+            params = {
+                "linked_id": (f"USER_{user_id - 1}",),
+                "name": (f"user{user_id - 1}",),
+                "user_contact": rng.choice(pairs),
+                "user_id": (user_id,),
+                "user_page": (user_id, 2 ** 63 - 1, db_manager.SAVED_PAGE_SIZE + 1),
+                "user_since": (user_id, "2026-06-01"),
+            }[key_kind]
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[name] = {"p50_ms": round(statistics.median(samples), 4),
+                         "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 4)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--contacts", type=int, default=50000)
+    parser.add_argument("--saved", type=int, default=200000)
+    parser.add_argument("--logs", type=int, default=500000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_manager.DB_NAME = os.path.join(tmp, "bench.db")
+        conn = db_manager.get_connection()
+        create_pre_migration_tables(conn)
+        db_manager.run_migrations(target_version=1)
+        pairs = populate(conn, args.users, args.contacts, args.saved, args.logs, args.seed)
+
+        before = time_lookups(conn, args.users, pairs, args.iterations, args.seed)
+        start = time.perf_counter()
+        db_manager.run_migrations()
+        migrate_ms = (time.perf_counter() - start) * 1000
+        conn.execute("ANALYZE")
+        after = time_lookups(conn, args.users, pairs, args.iterations, args.seed)
+        db_manager.close_connection()
+
+    report = {"params": vars(args), "migration_ms": round(migrate_ms, 1), "before": before, "after": after}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Migration to v{db_manager.SCHEMA_VERSION} took {migrate_ms:.0f} ms")
+    print(f"{'lookup':<24}{'before p50':>12}{'after p50':>12}{'speedup':>10}")
+    for name in LOOKUPS:
+        b, a = before[name]["p50_ms"], after[name]["p50_ms"]
+        print(f"{name:<24}{b:>10.3f}ms{a:>10.3f}ms{b / max(a, 1e-6):>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Benchmark suite: search, directory filters, map lookups, insight context building and every
+db_manager call, on seeded synthetic directories of increasing size.
+
+Each scale runs in a fresh subprocess (no in-process index or cache leaks between sizes,
+and peak memory is per scale). The LLM is never called: the parse step is stubbed with a
+canned JSON reply (simulated transport). Results are written as JSON for regression comparison.
+
+    python benchmarks/run_benchmarks.py --scales 10000,100000 --output bench.json
+    python benchmarks/run_benchmarks.py --scales 10000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage. tracemalloc would slow every timed call down, so memory is reported as unavailable
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+SEARCH_QUERIES = [
+    "who works on housing at hunter college",
+    "mental health and youth development",
+    "food security in the bronx",
+    "immigration law at john jay",
+    "anyone who could help a tenant organizing project",   # not parsed locally: goes to the stubbed LLM
+]
+DIRECTORY_FILTERS = {
+    "no_filters": {},
+    "keyword": {"keyword": "housing"},
+    "campus": {"campuses": ["Hunter College", "Borough of Manhattan Community College"]},
+    "domain_bucket": {"domains": ["Health & Wellness"]},
+    "all_filters": {"keyword": "youth", "campuses": ["Lehman College"], "domains": ["Education & Youth Development"],
+                    "roles": ["Faculty & Teachers"]},
+}
+REGRESSION_THRESHOLD = 1.25   # --compare flags p50s that got this much slower
+
+
+def summarize(samples_ms):
+    samples_ms = sorted(samples_ms)
+    return {
+        "n": len(samples_ms),
+        "p50_ms": round(statistics.median(samples_ms), 4),
+        "p95_ms": round(samples_ms[max(0, int(len(samples_ms) * 0.95) - 1)], 4),
+        "mean_ms": round(statistics.fmean(samples_ms), 4),
+        "max_ms": round(samples_ms[-1], 4),
+    }
+
+
+def measure(fn, repeat):
+    """Runs fn once cold, then `repeat` times warm. Returns stats with the cold time alongside."""
+    start = time.perf_counter()
+    fn()
+    cold_ms = (time.perf_counter() - start) * 1000
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    stats = summarize(samples) if samples else {}
+    stats["cold_ms"] = round(cold_ms, 3)
+    return stats
+
+
+def _stub_llm():
+    """Puts the LLM behind the simulated transport with no latency (no network, canned parse reply)."""
+    import llm_transport
+    llm_transport.configure_transport("simulated", profile=llm_transport.SimulatedProfile(
+        ttft_median_ms=0, tokens_per_second=1e9, output_tokens=50,
+        json_reply=json.dumps({"domains": ["Housing"], "communities": ["Residents"]})))
+
+
+def run_scale(rows, seed, repeat):
+    """Builds one synthetic database and times everything against it (runs inside the worker process)."""
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    import db_manager
+    from synthetic_data import build_synthetic_db
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        load_seconds = build_synthetic_db(os.path.join(tmp, "bench.db"), rows, seed)
+
+        import contact_store
+        import discovery_engine
+        import directory_query
+        import network_graph
+        import retrieval
+        _stub_llm()
+        rng = random.Random(seed)
+
+        # --- Contact snapshot ---
+        start = time.perf_counter()
+        df = contact_store.get_contacts_df()
+        results["contacts_snapshot_load"] = {"cold_ms": round((time.perf_counter() - start) * 1000, 3)}
+        ids = df["ID"].tolist()
+
+        # --- search_civic_network (LLM parse stubbed) ---
+        for i, query in enumerate(SEARCH_QUERIES):
+            results[f"search_civic_network[{i}]"] = measure(
+                lambda q=query: discovery_engine.search_civic_network(q, df), repeat)
+            results[f"search_civic_network[{i}]"]["query"] = query
+
+        # --- Memory-mapped columnar snapshot (multi-process mode): export, map, search on it ---
+        import contact_snapshot
+        start = time.perf_counter()
+        snapshot = contact_snapshot.get_contact_snapshot()
+        results["columnar_snapshot_export_and_map"] = {"cold_ms": round((time.perf_counter() - start) * 1000, 3),
+                                                       "file_mb": round(len(snapshot._mmap) / 2 ** 20, 1)}
+        for i, query in enumerate(SEARCH_QUERIES):
+            results[f"search_civic_network_snapshot[{i}]"] = measure(
+                lambda q=query: discovery_engine.search_civic_network(q, snapshot), repeat)
+
+        # --- Directory filter chain (count + first page + a deep page) ---
+        for name, filters in DIRECTORY_FILTERS.items():
+            results[f"directory[{name}]"] = measure(
+                lambda f=filters: (directory_query.count_directory(**f), directory_query.query_directory(**f)), repeat)
+        results["directory[page_10]"] = measure(lambda: directory_query.query_directory(page=10), repeat)
+        results["directory[campus_facets]"] = measure(directory_query.get_campus_facets, repeat)
+
+        # --- Map neighbor lookups ---
+        start = time.perf_counter()
+        graph = network_graph.get_contact_graph()
+        results["map_graph_build"] = {"cold_ms": round((time.perf_counter() - start) * 1000, 3)}
+        targets = rng.sample(ids, min(len(ids), max(repeat, 1)))
+        results["map_peers_by_domain"] = summarize(
+            [_timed(lambda t=t: graph.peers_by_domain(t, limit=20)) for t in targets])
+        results["map_ranked_peers"] = summarize([_timed(lambda t=t: graph.ranked_peers(t, limit=20)) for t in targets])
+        network_graph.clear_map_cache()
+        results["map_render[miss]"] = summarize([_timed(lambda t=t: network_graph.render_network_map(t)) for t in targets])
+        results["map_render[hit]"] = summarize([_timed(lambda t=t: network_graph.render_network_map(t)) for t in targets])
+
+        # --- Insight context building (what generate_civic_insight sends, minus the LLM call) ---
+        for i, query in enumerate(SEARCH_QUERIES[:3]):
+            def build_context(q=query):
+                matches, stats = retrieval.retrieve_for_insight(q, df)
+                return discovery_engine._build_insight_messages(q, matches, context=stats["context"])
+            results[f"insight_context[{i}]"] = measure(build_context, repeat)
+
+        # --- db_manager calls ---
+        results.update(_bench_db_manager(db_manager, ids, rng, repeat))
+
+    return {"rows": rows, "load_seconds": round(load_seconds, 2), "peak_rss_mb": _peak_rss_mb(),
+            "benchmarks": results}
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None where getrusage is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def _bench_db_manager(db_manager, ids, rng, repeat):
+    results = {}
+    n_users = max(repeat, 1)
+    results["db.add_user"] = summarize(
+        [_timed(lambda i=i: db_manager.add_user(f"bench user {i}", "Hunter College", "Student", "Housing"))
+         for i in range(n_users)])
+    user_ids = [db_manager.get_user_by_name(f"bench user {i}")[0] for i in range(n_users)]
+    uid = user_ids[0]
+
+    results["db.get_user_by_name"] = measure(lambda: db_manager.get_user_by_name("bench user 0"), repeat)
+    results["db.update_user_profile"] = measure(
+        lambda: db_manager.update_user_profile(uid, "a@b.org", "Hunter College", "Student", "Housing", "x"), repeat)
+    results["db.log_search"] = measure(lambda: db_manager.log_search(uid, "housing at hunter"), repeat)
+    results["db.save_collaboration"] = summarize(
+        [_timed(lambda c=c: db_manager.save_collaboration(uid, c)) for c in rng.sample(ids, min(len(ids), repeat))])
+    bulk = rng.sample(ids, min(len(ids), 200))
+    results["db.save_collaborations[200]"] = measure(lambda: db_manager.save_collaborations(user_ids[-1], bulk), 0)
+    results["db.get_saved_collaborations"] = measure(lambda: db_manager.get_saved_collaborations(user_ids[-1]), repeat)
+    results["db.count_saved_collaborations"] = measure(
+        lambda: db_manager.count_saved_collaborations(user_ids[-1]), repeat)
+    results["db.unsave_collaborations[200]"] = measure(lambda: db_manager.unsave_collaborations(user_ids[-1], bulk), 0)
+    results["db.unsave_collaboration"] = measure(lambda: db_manager.unsave_collaboration(uid, ids[0]), repeat)
+    results["db.publish_user_to_directory"] = measure(
+        lambda: db_manager.publish_user_to_directory(uid, {"name": "bench user 0", "campus": "Hunter College",
+                                                           "focus": "Housing", "projects": "tenant rights"}), repeat)
+    results["db.get_data_version"] = measure(db_manager.get_data_version, repeat)
+    stamp_ids = rng.sample(ids, min(len(ids), 50))
+    results["db.get_contacts_stamp[50]"] = measure(lambda: db_manager.get_contacts_stamp(stamp_ids), repeat)
+    return results
+
+
+def compare(current, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints p50 (or cold) ratios per benchmark against a baseline report. Returns the regressions."""
+    regressions = []
+    for rows, scale in current["results"].items():
+        base_scale = baseline.get("results", {}).get(rows)
+        if not base_scale:
+            print(f"[{rows} rows] no baseline")
+            continue
+        print(f"[{rows} rows]")
+        for name, stats in scale["benchmarks"].items():
+            base = base_scale["benchmarks"].get(name)
+            metric = "p50_ms" if "p50_ms" in stats else "cold_ms"
+            if not base or not base.get(metric):
+                continue
+            ratio = stats[metric] / base[metric]
+            flag = "  <-- REGRESSION" if ratio > threshold else ""
+            print(f"  {name:<40}{base[metric]:>10.3f} -> {stats[metric]:>10.3f} ms  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((rows, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on synthetic directories.")
+    parser.add_argument("--scales", default="10000,100000", help="comma-separated row counts (e.g. 10000,100000,1000000)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=20, help="warm iterations per benchmark")
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--worker-rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_rows:
+        print(json.dumps(run_scale(args.worker_rows, args.seed, args.repeat)))
+        return
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed": args.seed, "repeat": args.repeat,
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "git_rev": _git_rev(),
+        },
+        "results": {},
+    }
+    for rows in (int(s) for s in args.scales.split(",") if s.strip()):
+        print(f"Running {rows} rows...", file=sys.stderr)
+        proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker-rows", str(rows),
+                               "--seed", str(args.seed), "--repeat", str(args.repeat)],
+                              capture_output=True, text=True, check=True)
+        # The last stdout line is the JSON (engine modules may print warnings before it)
+        report["results"][str(rows)] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f))
+        sys.exit(1 if regressions else 0)
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    main()
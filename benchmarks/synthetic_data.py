@@ -0,0 +1,161 @@
+"""
+Seeded synthetic Network_Contacts generator.
+
+Value pools and shapes follow the real cuny_civic_network.db: about 70% of rows on a CUNY
+campus (using the messy CUNY_MAP spellings), the rest on community partners; 1-5
+comma-separated domains, mostly 1-2; ~220-character notes with a long tail; the same
+Category / Outreach Status mix. Rows are produced lazily so 1M-row tables stream
+straight into SQLite.
+
+    python benchmarks/synthetic_data.py /tmp/synthetic.db --rows 100000 --seed 7
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager  # noqa: E402
+from campus_map import CUNY_MAP  # noqa: E402
+
+CUNY_SHARE = 0.7
+
+PARTNERS = [
+    "Brooklyn (External)", "Community - NYC", "Brooklyn (Community)", "Bronx(external)", "Staten Island(external)",
+    "Harlem(External)", "Boys and Girls Club of Harlem", "Northern Manhattan Improvement Corporation",
+    "DREAM/Harlem RBI", "Impact Hub NYC", "Brooklyn Public Library", "Bridge Street Development Corporation",
+    "Downtown Brooklyn Partnership", "Harlem Children's Zone", "The New York Peace Institute",
+    "The Participatory Budgeting Project", "CUNY Institute for State and Local Governance (ISLG)", "Other CUNY",
+]
+
+DOMAINS = [
+    "Education", "Community Development", "Higher Education", "Civic Engagement", "Health", "Student Life",
+    "Youth Development", "Workforce Development", "Technology", "Sociology", "Healthcare", "Mental Health",
+    "Equity", "Immigration", "Media", "Criminal Justice", "Housing", "Public Policy", "Sustainability", "Research",
+    "Arts", "Career Development", "Government", "Social Justice", "Student Affairs", "History", "Policy",
+    "Economic Development", "Justice", "Law", "Political Science", "STEM", "Environmental Justice",
+    "Entrepreneurship", "Public Affairs", "Academia", "Urban Education", "Leadership", "Food Security", "Voting",
+]
+# Roughly Zipf-shaped: the first domains are much more common than the last
+DOMAIN_WEIGHTS = [1.0 / (rank + 1) ** 0.8 for rank in range(len(DOMAINS))]
+DOMAIN_COUNT_WEIGHTS = [788, 340, 96, 25, 8]   # 1..5 domains per contact
+
+COMMUNITIES = [
+    "Students", "General Public", "Youth", "Faculty", "Academics", "College Students", "Researchers",
+    "Community Members", "Professionals", "Campus Community", "Local Community", "Low-Income Individuals",
+    "Residents", "Justice-Impacted Individuals", "INI Fellows", "Bronx Community", "Families", "Immigrants",
+]
+CAPABILITIES = [
+    "Mentorship", "Leadership", "Advocacy", "Research", "Mentoring", "Program Development", "Civic Engagement",
+    "Community Engagement", "Leadership Development", "Service Coordination", "Outreach", "Program Oversight",
+    "Partnership Building", "Storytelling", "Teaching", "Data Analysis", "Program Management", "Event Planning",
+]
+ROLES = [
+    "Professor", "Associate Professor", "Chair / Professor", "Adjunct Lecturer", "Student Org Leader", "Student",
+    "Fellow", "Director", "Director of Communications", "Program Coordinator", "Dean", "Staff", "Founder",
+    "Executive Director", "Learning Experience Designer", "Consultant", "Manager",
+]
+CATEGORIES = [("Faculty Research", 511), ("Student Opportunity", 153), ("Other", 91),
+              ("Civic Leadership & Innovation", 65), ("Community / Mentorship / Civic Insight", 53),
+              ("Civic Engagement", 48), ("Mentorship", 43), ("Community Program", 41)]
+OUTREACH = [("Contacted", 1187), ("In Conversation", 57), ("Declined", 32), ("Not Contacted", 26),
+            ("Future Potential Partner", 19)]
+
+FIRST_NAMES = ["Maria", "James", "Aisha", "Wei", "Carlos", "Fatima", "David", "Priya", "Kwame", "Sofia", "Jamal",
+               "Elena", "Omar", "Grace", "Luis", "Nadia", "Samuel", "Yuki", "Andre", "Leila", "Marcus", "Rosa"]
+LAST_NAMES = ["Rodriguez", "Chen", "Johnson", "Okafor", "Patel", "Garcia", "Kim", "Williams", "Haddad", "Nguyen",
+              "Thompson", "Morales", "Singh", "Baptiste", "Cohen", "Ali", "Rivera", "Brown", "Diaz", "Osei"]
+
+NOTE_WORDS = (
+    "serves leads works with students faculty community partners on programs that support civic engagement "
+    "housing food security mental health youth development voting rights immigration legal services workforce "
+    "training research data policy advocacy the borough neighborhood organizing tenant outreach mentorship "
+    "initiative grant funded center institute collaboration across campuses public health environmental justice "
+    "climate resilience digital equity journalism storytelling arts culture entrepreneurship small business"
+).split()
+
+
+def _pick_tags(rng, pool, k_max=3):
+    return ", ".join(rng.sample(pool, rng.randint(1, k_max)))
+
+
+def _note(rng, name):
+    # Lognormal length: median ~33 words (~200 chars), occasional long notes
+    words = max(5, min(400, int(rng.lognormvariate(3.5, 0.5))))
+    return f"{name} " + " ".join(rng.choice(NOTE_WORDS) for _ in range(words)) + "."
+
+
+def generate_contacts(n_rows, seed=0):
+    """Yields n_rows dicts keyed by Network_Contacts column, deterministic for a given seed."""
+    rng = random.Random(seed)
+    cuny_spellings = list(CUNY_MAP)
+    categories, category_weights = zip(*CATEGORIES)
+    statuses, status_weights = zip(*OUTREACH)
+    for i in range(n_rows):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        campus = rng.choice(cuny_spellings) if rng.random() < CUNY_SHARE else rng.choice(PARTNERS)
+        n_domains = rng.choices(range(1, 6), weights=DOMAIN_COUNT_WEIGHTS)[0]
+        domains = list(dict.fromkeys(rng.choices(DOMAINS, weights=DOMAIN_WEIGHTS, k=n_domains)))
+        yield {
+            "ID": f"SYN-{i}",
+            "Contact Name": name,
+            "Email/Phone/LinkedIn": f"{name.split()[0].lower()}.{i}@example.org",
+            "Role/Title": rng.choice(ROLES),
+            "Campus": campus,
+            "Program/Org Affiliation": f"{rng.choice(DOMAINS)} {rng.choice(['Center', 'Institute', 'Lab', 'Program', 'Collective'])}",
+            "Category": rng.choices(categories, weights=category_weights)[0],
+            "Civic Domains": ", ".join(domains) if rng.random() < 0.95 else None,
+            "Capabilities / Expertise": _pick_tags(rng, CAPABILITIES),
+            "Communities Served": _pick_tags(rng, COMMUNITIES),
+            "Notes / Insights": _note(rng, name) if rng.random() < 0.9 else None,
+            "Outreach Status": rng.choices(statuses, weights=status_weights)[0],
+        }
+
+
+def build_synthetic_db(path, n_rows, seed=0, chunk_size=20000):
+    """
+    Creates a fresh database at path with n_rows synthetic contacts (schema via the normal migrations).
+    Per-row FTS triggers are dropped during the load and the index rebuilt once. Returns load seconds.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    db_manager.DB_NAME = path
+    db_manager.initialize_database()
+    conn = db_manager.get_connection()
+
+    start = time.perf_counter()
+    columns = None
+    with db_manager.transaction():
+        db_manager.drop_fts_triggers(conn.cursor())
+        batch = []
+        for row in generate_contacts(n_rows, seed):
+            row["campus_key"], row["is_cuny"] = db_manager.campus_columns(row["Campus"])
+            if columns is None:
+                columns = list(row)
+                quoted = ", ".join(f'"{c}"' for c in columns)
+                insert = f"INSERT INTO Network_Contacts ({quoted}) VALUES ({', '.join('?' for _ in columns)})"
+            batch.append([row[c] for c in columns])
+            if len(batch) >= chunk_size:
+                conn.executemany(insert, batch)
+                batch = []
+        if batch:
+            conn.executemany(insert, batch)
+        db_manager.rebuild_fts_index(conn)
+        db_manager.create_fts_triggers(conn.cursor())
+    conn.execute("ANALYZE")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic contacts database.")
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    seconds = build_synthetic_db(args.path, args.rows, args.seed)
+    print(f"Wrote {args.rows} contacts to {args.path} in {seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# The "Bridge": Maps messy CSV shorthand to clean UI names
+CUNY_MAP = {
+    "BMCC": "Borough of Manhattan Community College",
+    "Baruch College": "Baruch College",
+    "Bronx Community College": "Bronx Community College",
+    "Brooklyn College": "Brooklyn College",
+    "City College": "The City College of New York",
+    "College of Staten Island": "College of Staten Island",
+    "Graduate Center": "CUNY Graduate Center",
+    "Guttman Community College": "Guttman Community College",
+    "Hostos Community College": "Hostos Community College",
+    "Hunter College": "Hunter College",
+    "John Jay College": "John Jay College of Criminal Justice",
+    "Kingsborough CC": "Kingsborough Community College",
+    "Kingsborough Community College": "Kingsborough Community College",
+    "LaGuardia CC": "LaGuardia Community College",
+    "Lehman College": "Lehman College",
+    "Macaulay Honors": "Macaulay Honors College",
+    "Medgar Evers": "Medgar Evers College",
+    "Medgar Evers College": "Medgar Evers College",
+    "NYC College of Technology": "New York City College of Technology",
+    "city tech": "New York City College of Technology",
+    "Queens College": "Queens College",
+    "Queensborough CC": "Queensborough Community College",
+    "York College": "York College",
+    "CUNY Law School": "CUNY School of Law",
+    "CUNY SPS": "CUNY School of Professional Studies",
+    "School of Public Health": "CUNY Graduate School of Public Health & Health Policy",
+    "School of Labor & Urban Studies": "CUNY School of Labor and Urban Studies",
+    "Craig Newmark Graduate School of Journalism": "Craig Newmark Graduate School of Journalism at CUNY",
+}
+
+CUNY_COLLEGES = sorted(list(set(CUNY_MAP.values())))
+
+
+def normalize_campus_key(value):
+    """Case- and whitespace-insensitive lookup key for a campus spelling."""
+    return " ".join(str(value).split()).lower()
+
+
+# Every known spelling (raw shorthand AND the clean name itself) -> clean name
+_CANONICAL_BY_KEY = {normalize_campus_key(clean): clean for clean in CUNY_MAP.values()}
+_CANONICAL_BY_KEY.update({normalize_campus_key(raw): clean for raw, clean in CUNY_MAP.items()})
+
+
+def canonical_campus(value):
+    """
+    Returns (canonical campus name, is_cuny) for a raw Campus value.
+    CUNY spellings map to the clean UI name; anything else (community partners) is kept, whitespace-collapsed.
+    Empty values return (None, False).
+    """
+    if value is None or value != value:  # value != value catches NaN
+        return None, False
+    text = " ".join(str(value).split())
+    if not text:
+        return None, False
+    clean = _CANONICAL_BY_KEY.get(text.lower())
+    return (clean, True) if clean else (text, False)
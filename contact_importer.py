@@ -0,0 +1,191 @@
+import argparse
+import time
+import pandas as pd
+import db_manager
+from db_manager import get_connection, transaction, campus_columns, create_fts_triggers, drop_fts_triggers, \
+    rebuild_fts_index, create_version_triggers, drop_version_triggers, mark_contacts_rewritten
+from campus_map import canonical_campus
+
+# ---------------------------------------------------------
+# BULK CSV IMPORTER (Network_Contacts)
+# ---------------------------------------------------------
+# Streams a partner spreadsheet in chunks, normalizes headers and values,
+# canonicalizes Campus, dedupes on ID and upserts with executemany inside ONE
+# transaction. Readers keep seeing the old data until the commit.
+# Large files drop the per-row FTS, data-version and change-log triggers, rebuild
+# the FTS index once at the end and bump the data version once, as a full
+# rewrite; the in-process indexes (contact snapshot, tag index, semantic index,
+# network graph) follow the data version and refresh once on next use.
+IMPORT_CHUNK_SIZE = 5000
+
+# Header spellings seen in exports -> Network_Contacts column
+COLUMN_ALIASES = {
+    "opportunity ideas": "Oppurtunity Ideas",
+    "name": "Contact Name",
+    "url": "URL (Overview Page)",
+    "notes": "Notes / Insights",
+}
+
+
+def _header_key(name):
+    return " ".join(str(name).split()).lower()
+
+
+# Derived columns are computed here, never read from the file
+DERIVED_COLUMNS = {"campus_key", "is_cuny"}
+
+
+def get_contact_columns(conn=None):
+    """Importable column names of Network_Contacts, in table order."""
+    conn = conn or get_connection()
+    return [row[1] for row in conn.execute("PRAGMA table_info(Network_Contacts)") if row[1] not in DERIVED_COLUMNS]
+
+
+def map_columns(headers, contact_columns):
+    """Returns ({csv header: table column}, [ignored headers]). Matching ignores case and extra spaces."""
+    by_key = {_header_key(c): c for c in contact_columns}
+    by_key.update({alias: col for alias, col in COLUMN_ALIASES.items() if col in contact_columns})
+    mapping, ignored = {}, []
+    for header in headers:
+        column = by_key.get(_header_key(header))
+        if column and column not in mapping.values():
+            mapping[header] = column
+        else:
+            ignored.append(header)
+    return mapping, ignored
+
+
+def _clean_value(value):
+    if value is None or value != value:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _normalize_chunk(chunk, mapping):
+    """Renames to table columns, trims values, canonicalizes Campus. Returns a list of dict rows."""
+    chunk = chunk[list(mapping)].rename(columns=mapping)
+    rows = []
+    for record in chunk.to_dict("records"):
+        row = {col: _clean_value(value) for col, value in record.items()}
+        if "Campus" in row:
+            row["Campus"] = canonical_campus(row["Campus"])[0]
+            row["campus_key"], row["is_cuny"] = campus_columns(row["Campus"])
+        rows.append(row)
+    return rows
+
+
+def _upsert_rows(conn, rows, columns):
+    """Updates the IDs that exist and inserts the rest. Returns (inserted, updated)."""
+    ids = [row["ID"] for row in rows]
+    existing = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        existing.update(r[0] for r in conn.execute(
+            f"SELECT ID FROM Network_Contacts WHERE ID IN ({placeholders})", chunk))
+
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    updates = [c for c in columns if c != "ID"]
+    to_update = [[row.get(c) for c in updates] + [row["ID"]] for row in rows if row["ID"] in existing]
+    to_insert = [[row.get(c) for c in columns] for row in rows if row["ID"] not in existing]
+
+    if to_update and updates:
+        assignments = ", ".join(f'"{c}" = ?' for c in updates)
+        conn.executemany(f"UPDATE Network_Contacts SET {assignments} WHERE ID = ?", to_update)
+    if to_insert:
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(f"INSERT INTO Network_Contacts ({quoted}) VALUES ({placeholders})", to_insert)
+    return len(to_insert), len(to_update)
+
+
+class _DryRun(Exception):
+    """Raised inside the import transaction to roll it back."""
+
+
+def import_contacts_csv(source, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """
+    Upserts the contacts of a CSV (path or file object) into Network_Contacts in one transaction.
+    Only the columns present in the file are written; rows without an ID and repeated IDs are skipped.
+    Returns stats: rows_read, inserted, updated, skipped_no_id, skipped_duplicate, ignored_columns,
+    elapsed_seconds and rows_per_second. dry_run rolls everything back.
+    """
+    start = time.perf_counter()
+    stats = {"rows_read": 0, "inserted": 0, "updated": 0, "skipped_no_id": 0, "skipped_duplicate": 0,
+             "ignored_columns": [], "bulk_fts_rebuild": False}
+    conn = get_connection()
+    contact_columns = get_contact_columns(conn)
+    seen_ids = set()
+
+    reader = pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunk_size)
+    try:
+        with transaction():
+            mapping = columns = None
+            for chunk in reader:
+                if mapping is None:
+                    mapping, stats["ignored_columns"] = map_columns(list(chunk.columns), contact_columns)
+                    if "ID" not in mapping.values():
+                        raise ValueError("The CSV has no ID column; cannot upsert contacts without IDs.")
+                    columns = list(mapping.values())
+                    if "Campus" in columns:
+                        columns += ["campus_key", "is_cuny"]
+                    # A file at least one chunk long: skip per-row trigger work and refresh once at the end
+                    if len(chunk) >= chunk_size:
+                        drop_fts_triggers(conn.cursor())
+                        drop_version_triggers(conn.cursor())
+                        stats["bulk_fts_rebuild"] = True
+
+                stats["rows_read"] += len(chunk)
+                rows = []
+                for row in _normalize_chunk(chunk, mapping):
+                    if not row["ID"]:
+                        stats["skipped_no_id"] += 1
+                    elif row["ID"] in seen_ids:
+                        stats["skipped_duplicate"] += 1
+                    else:
+                        seen_ids.add(row["ID"])
+                        rows.append(row)
+                if rows:
+                    inserted, updated = _upsert_rows(conn, rows, columns)
+                    stats["inserted"] += inserted
+                    stats["updated"] += updated
+
+            if stats["bulk_fts_rebuild"]:
+                rebuild_fts_index(conn)
+                create_fts_triggers(conn.cursor())
+                create_version_triggers(conn.cursor())
+                mark_contacts_rewritten(conn)
+            if dry_run:
+                raise _DryRun()
+    except _DryRun:
+        pass
+
+    elapsed = time.perf_counter() - start
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["rows_read"] / elapsed) if elapsed > 0 else 0
+    stats["dry_run"] = dry_run
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import a contacts CSV into Network_Contacts.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--db", default=db_manager.DB_NAME, help="SQLite file (default: %(default)s)")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="validate and count, then roll back")
+    args = parser.parse_args()
+
+    db_manager.DB_NAME = args.db
+    db_manager.initialize_database()
+    stats = import_contacts_csv(args.csv_path, chunk_size=args.chunk_size, dry_run=args.dry_run)
+
+    print(f"{'DRY RUN: ' if args.dry_run else ''}read {stats['rows_read']} rows in {stats['elapsed_seconds']}s "
+          f"({stats['rows_per_second']} rows/s)")
+    print(f"  inserted {stats['inserted']}, updated {stats['updated']}, "
+          f"skipped {stats['skipped_no_id']} without ID and {stats['skipped_duplicate']} duplicate IDs")
+    if stats["ignored_columns"]:
+        print(f"  ignored columns: {', '.join(stats['ignored_columns'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+import pandas as pd
+import db_manager
+from db_manager import get_data_version, transaction
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# ---------------------------------------------------------
+# MEMORY-MAPPED COLUMNAR CONTACT SNAPSHOT
+# ---------------------------------------------------------
+# With several Streamlit server processes, every process used to hold its own
+# pandas copy of Network_Contacts. Instead, one process exports the table to a
+# columnar file (per column: int64 offsets + one UTF-8 buffer + a null mask,
+# plus a sorted ID key for lookups) and every process maps it read-only: the
+# pages are shared through the OS page cache and nothing is copied until a
+# function asks for specific rows or columns.
+# Each data version gets its own file (<base>.v<N>), written to a temp name and
+# renamed into place, so readers see a whole snapshot or none, and a file that
+# some process has mapped is never overwritten (Windows refuses to replace a
+# mapped file). When the data version in SQLite moves past the mapped file, the
+# next reader maps the newer file or exports it (one process at a time, under a
+# lock file), then older versions are deleted where the OS allows it.
+# (Arrow IPC would do the same job; pyarrow is not a dependency of this app.)
+MAGIC = b"CCNSNAP1"
+ALIGN = 64
+EXPORT_BATCH_ROWS = 10000
+LOCK_WAIT_SECONDS = 30.0
+
+
+def default_snapshot_path():
+    """Base path of the snapshot files (each data version is written to <base>.v<N>)."""
+    return os.getenv("CONTACT_SNAPSHOT_PATH") or f"{db_manager.DB_NAME}.snapshot"
+
+
+def snapshot_file(base, version):
+    return f"{base}.v{version}"
+
+
+# --- Export ---
+class _ColumnWriter:
+    def __init__(self, name, kind, n_rows):
+        self.name = name
+        self.kind = kind
+        self.nulls = np.zeros(n_rows, dtype=np.uint8)
+        if kind == "str":
+            self.offsets = np.zeros(n_rows + 1, dtype=np.int64)
+            self.data = bytearray()
+        else:
+            self.values = np.zeros(n_rows, dtype=np.int64 if kind == "int" else np.float64)
+
+    def add(self, i, value):
+        if value is None:
+            self.nulls[i] = 1
+        elif self.kind == "str":
+            self.data += str(value).encode("utf-8")
+        else:
+            self.values[i] = value
+        if self.kind == "str":
+            self.offsets[i + 1] = len(self.data)
+
+    def buffers(self):
+        if self.kind == "str":
+            return {"offsets": self.offsets.tobytes(), "data": bytes(self.data), "nulls": self.nulls.tobytes()}
+        return {"values": self.values.tobytes(), "nulls": self.nulls.tobytes()}
+
+
+def _column_kind(declared_type):
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return "int"
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB")):
+        return "float"
+    return "str"
+
+
+def _write_file(path, header, buffers):
+    """Writes header + aligned buffers to a temp file and atomically swaps it in."""
+    layout, position = {}, 0
+    for key, buf in buffers:
+        layout[key] = [position, len(buf)]
+        position += -(-len(buf) // ALIGN) * ALIGN
+    header = dict(header, buffers=layout)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGN) * ALIGN
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)) + header_bytes)
+        for key, buf in buffers:
+            f.seek(data_start + layout[key][0])
+            f.write(buf)
+        f.truncate(data_start + position)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(tmp_path, path)
+    except PermissionError:
+        # Windows, unlocked race: another process already wrote (and mapped) this version
+        os.remove(tmp_path)
+
+
+def export_snapshot(base=None):
+    """
+    Writes Network_Contacts (as of one read transaction) to the snapshot file for its data version.
+    Returns its header (version, rows, columns) plus the file's path.
+    """
+    base = base or default_snapshot_path()
+    with transaction(immediate=False) as conn:
+        version = get_data_version(conn)
+        columns = [(row[1], _column_kind(row[2])) for row in conn.execute("PRAGMA table_info(Network_Contacts)")]
+        n_rows = conn.execute("SELECT COUNT(*) FROM Network_Contacts").fetchone()[0]
+        writers = [_ColumnWriter(name, kind, n_rows) for name, kind in columns]
+        quoted = ", ".join(f'"{name}"' for name, _ in columns)
+        cursor = conn.execute(f"SELECT {quoted} FROM Network_Contacts ORDER BY rowid")
+        i = 0
+        while batch := cursor.fetchmany(EXPORT_BATCH_ROWS):
+            for row in batch:
+                for writer, value in zip(writers, row):
+                    writer.add(i, value)
+                i += 1
+
+    buffers = []
+    for writer in writers:
+        buffers.extend((f"{writer.name}:{part}", buf) for part, buf in writer.buffers().items())
+
+    # Sorted fixed-width ID keys + row permutation: vectorized ID -> row lookups with np.searchsorted
+    id_writer = next((w for w in writers if w.name == "ID"), None)
+    id_width = 0
+    if id_writer is not None and n_rows:
+        ids = np.array([bytes(id_writer.data[id_writer.offsets[r]:id_writer.offsets[r + 1]]) for r in range(n_rows)])
+        id_width = max(1, ids.dtype.itemsize)
+        order = np.argsort(ids, kind="stable").astype(np.int64)
+        buffers.append(("__id_keys", ids[order].astype(f"S{id_width}").tobytes()))
+        buffers.append(("__id_rows", order.tobytes()))
+
+    header = {"version": version, "rows": n_rows, "columns": [[name, kind] for name, kind in columns],
+              "id_width": id_width, "exported_at": time.time()}
+    path = snapshot_file(base, version)
+    _write_file(path, header, buffers)
+    return dict(header, path=path)
+
+
+# --- Reading ---
+class ContactSnapshot:
+    """
+    Read-only view of a snapshot file. Column data stays in the mapped file; rows and columns are
+    decoded only when asked for. Supports the small part of the DataFrame interface the engine uses
+    (columns, len, empty, snapshot[col] / snapshot[[cols]] / snapshot[bool mask]).
+    """
+
+    def __init__(self, path, base=None):
+        self.path = path
+        self.base = base
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a contact snapshot")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header = json.loads(self._mmap[len(MAGIC) + 8:len(MAGIC) + 8 + header_len])
+        self._data_start = -(-(len(MAGIC) + 8 + header_len) // ALIGN) * ALIGN
+        self._layout = header["buffers"]
+        self.version = header["version"]
+        self.rows = header["rows"]
+        self.kinds = dict(header["columns"])
+        self.columns = pd.Index([name for name, _ in header["columns"]])
+        self.id_width = header["id_width"]
+
+    def _buffer(self, key, dtype=np.uint8):
+        start, length = self._layout[key]
+        return np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                             offset=self._data_start + start)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def empty(self):
+        return self.rows == 0
+
+    def _decode(self, name, rows):
+        """Values of one column for the given row indices (None for NULL)."""
+        nulls = self._buffer(f"{name}:nulls")
+        if self.kinds[name] != "str":
+            values = self._buffer(f"{name}:values", np.int64 if self.kinds[name] == "int" else np.float64)
+            picked = values[rows]
+            if len(rows) and nulls[rows].all():
+                return [None] * len(rows)   # read_sql_query gives an object column of None here too
+            if nulls[rows].any():
+                return pd.Series(picked, dtype="float64").where(nulls[rows] == 0).to_numpy()
+            return picked
+        offsets = self._buffer(f"{name}:offsets", np.int64)
+        base = self._data_start + self._layout[f"{name}:data"][0]
+        mm = self._mmap
+        # Plain Python ints in the loop: indexing numpy scalars per value costs more than the decode
+        starts = (offsets[rows] + base).tolist()
+        ends = (offsets[rows + 1] + base).tolist()
+        is_null = nulls[rows].tolist()
+        return [None if null else mm[a:b].decode("utf-8") for a, b, null in zip(starts, ends, is_null)]
+
+    def take(self, rows, columns=None):
+        """DataFrame of the given row indices (in that order), optionally only some columns."""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = list(columns) if columns is not None else list(self.columns)
+        return pd.DataFrame({name: self._decode(name, rows) for name in columns}, columns=columns)
+
+    def rows_for_ids(self, ids):
+        """Row indices of the given contact IDs that exist, in table order."""
+        if not self.id_width or not len(ids):
+            return np.zeros(0, dtype=np.int64)
+        keys = self._buffer("__id_keys", f"S{self.id_width}")
+        order = self._buffer("__id_rows", np.int64)
+        wanted = np.array([str(i).encode("utf-8") for i in ids], dtype=object).astype(f"S{self.id_width}")
+        # Longer IDs can't be in the snapshot; truncation must not turn them into false matches
+        valid = np.array([len(str(i).encode("utf-8")) <= self.id_width for i in ids], dtype=bool)
+        pos = np.searchsorted(keys, wanted)
+        pos_clipped = np.minimum(pos, len(keys) - 1)
+        found = valid & (pos < len(keys)) & (keys[pos_clipped] == wanted)
+        return np.unique(order[pos_clipped[found]])
+
+    def take_ids(self, ids, columns=None):
+        """DataFrame of the contacts with the given IDs, in table order."""
+        return self.take(self.rows_for_ids(ids), columns)
+
+    def to_pandas(self, columns=None):
+        return self.take(np.arange(self.rows), columns)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return pd.Series(self._decode(key, np.arange(self.rows)), name=key)
+        if isinstance(key, (list, pd.Index)):
+            return self.to_pandas(list(key))
+        mask = np.asarray(key, dtype=bool)
+        return self.take(np.flatnonzero(mask))
+
+
+def select_ids(source, ids):
+    """Rows of a DataFrame or ContactSnapshot whose ID is in ids, in table order (always a DataFrame)."""
+    if isinstance(source, ContactSnapshot):
+        return source.take_ids(list(ids))
+    return source[source['ID'].isin(ids)]
+
+
+def narrow_to_ids(source, ids):
+    """A DataFrame is returned as is; a snapshot is cut down to the given IDs before any pandas work."""
+    return source.take_ids(list(ids)) if isinstance(source, ContactSnapshot) else source
+
+
+def as_dataframe(source):
+    """The full table as a DataFrame (materializes a snapshot; use only where every row is needed)."""
+    return source.to_pandas() if isinstance(source, ContactSnapshot) else source
+
+
+# --- Process-wide mapping, reloaded when the data version moves ---
+_mapped = {"snapshot": None}
+_map_lock = threading.Lock()
+_stats = {"maps": 0, "exports": 0, "last_export_ms": 0.0}
+
+
+def _try_lock(lock_file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _export_locked(base, version):
+    """Path of the snapshot for version, exporting it unless another process did while we waited for the lock."""
+    lock_file = open(f"{base}.lock", "a+")
+    try:
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while not _try_lock(lock_file):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for the snapshot export lock on {base}")
+            time.sleep(0.05)
+        try:
+            path = snapshot_file(base, version)
+            if os.path.exists(path):
+                return path
+            start = time.perf_counter()
+            path = export_snapshot(base)["path"]   # may already be a newer version than asked for
+            _stats["exports"] += 1
+            _stats["last_export_ms"] = (time.perf_counter() - start) * 1000
+            return path
+        finally:
+            _unlock(lock_file)
+    finally:
+        lock_file.close()
+
+
+def _remove_old_versions(base, version):
+    """
+    Deletes the files of versions older than the one just mapped (a newer one may be another process's
+    fresh export). Windows refuses while another process maps one; it goes next time.
+    """
+    for path in glob.glob(glob.escape(base) + ".v*"):
+        suffix = path[len(base) + 2:]
+        if suffix.isdigit() and int(suffix) < version:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_contact_snapshot(base=None):
+    """Returns the mapped snapshot for the current data version, exporting and/or remapping when stale."""
+    base = base or default_snapshot_path()
+    version = get_data_version()
+    with _map_lock:
+        snapshot = _mapped["snapshot"]
+        if snapshot is not None and snapshot.base == base and snapshot.version >= version:
+            return snapshot
+        path = snapshot_file(base, version)
+        if not os.path.exists(path):
+            path = _export_locked(base, version)
+        try:
+            mapped = ContactSnapshot(path, base)
+        except FileNotFoundError:
+            # Another process moved to a newer version and deleted this one between the check and the open
+            mapped = ContactSnapshot(_export_locked(base, get_data_version()), base)
+        # Readers still holding the previous snapshot keep its mapping until they drop it
+        previous = snapshot.path if snapshot is not None else None
+        snapshot = _mapped["snapshot"] = mapped
+        _stats["maps"] += 1
+        if previous is not None:
+            _remove_old_versions(base, snapshot.version)
+        return snapshot
+
+
+def get_mapped_version():
+    snapshot = _mapped["snapshot"]
+    return snapshot.version if snapshot is not None else None
+
+
+def get_snapshot_stats():
+    snapshot = _mapped["snapshot"]
+    stats = dict(_stats, version=get_mapped_version(), path=snapshot.path if snapshot else None)
+    stats["rows"] = snapshot.rows if snapshot else 0
+    stats["file_bytes"] = len(snapshot._mmap) if snapshot else 0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Network_Contacts to a memory-mapped snapshot file.")
+    parser.add_argument("--db", default=db_manager.DB_NAME, help="SQLite file (default: %(default)s)")
+    parser.add_argument("--output", help="snapshot base path, written as <base>.v<data version> "
+                                         "(default: <db>.snapshot or $CONTACT_SNAPSHOT_PATH)")
+    args = parser.parse_args()
+
+    db_manager.DB_NAME = args.db
+    db_manager.initialize_database()
+    start = time.perf_counter()
+    header = export_snapshot(args.output)
+    print(f"Exported {header['rows']} contacts (data version {header['version']}) "
+          f"to {header['path']} in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
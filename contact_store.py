@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+import pandas as pd
+from db_manager import get_data_version, transaction
+from contact_snapshot import get_contact_snapshot, get_mapped_version
+
+# ---------------------------------------------------------
+# SHARED CONTACT SNAPSHOT
+# ---------------------------------------------------------
+# Streamlit reruns app.py on every click, so instead of re-reading
+# Network_Contacts each time we keep ONE DataFrame per process and only
+# reload it when the Data_Versions counter says the table changed.
+# The returned DataFrame is shared by every session: never modify it in place.
+#
+# With CONTACT_SNAPSHOT=1 (several server processes behind a load balancer)
+# get_contacts_source() hands out the memory-mapped columnar snapshot instead,
+# so the processes share one copy of the table through the page cache.
+SNAPSHOT_ENABLED = os.getenv("CONTACT_SNAPSHOT", "0") == "1"
+
+_lock = threading.Lock()
+_snapshot = {"version": None, "df": None, "loaded_at": None}
+_stats = {"hits": 0, "misses": 0, "reloads": 0, "last_load_ms": 0.0}
+
+
+def _load_snapshot():
+    """Reads the version stamp and the full table inside one read transaction."""
+    with transaction(immediate=False) as conn:
+        version = get_data_version(conn)
+        df = pd.read_sql_query("SELECT * FROM Network_Contacts", conn)
+    return version, df
+
+
+def get_contacts_df():
+    """Returns the shared Network_Contacts DataFrame, reloading only when the data has changed."""
+    return _get_df_with_version()[0]
+
+
+def _get_df_with_version():
+    current_version = get_data_version()
+
+    with _lock:
+        if _snapshot["df"] is not None and _snapshot["version"] == current_version:
+            _stats["hits"] += 1
+            return _snapshot["df"], _snapshot["version"]
+
+        # Cold start counts as a miss, a stale snapshot counts as a reload
+        if _snapshot["df"] is None:
+            _stats["misses"] += 1
+        else:
+            _stats["reloads"] += 1
+
+        start = time.perf_counter()
+        version, df = _load_snapshot()
+        _stats["last_load_ms"] = (time.perf_counter() - start) * 1000
+
+        _snapshot.update({"version": version, "df": df, "loaded_at": time.time()})
+        return df, version
+
+
+def get_contacts_source():
+    """
+    The contact table for search, filtering, the map graph and the vocabulary: the mapped
+    ContactSnapshot when CONTACT_SNAPSHOT=1, otherwise the shared DataFrame.
+    """
+    return get_contacts_source_with_version()[0]
+
+
+def get_contacts_source_with_version():
+    """
+    (source, data version) from one call, so a cache built from the source can be keyed on the
+    version it was actually loaded at (a separate version read could already see a newer reload).
+    """
+    if SNAPSHOT_ENABLED:
+        snapshot = get_contact_snapshot()
+        return snapshot, snapshot.version
+    return _get_df_with_version()
+
+
+def get_contacts_version():
+    """Returns the data version of the snapshot currently held in memory (None before the first load)."""
+    return get_mapped_version() if SNAPSHOT_ENABLED else _snapshot["version"]
+
+
+def invalidate_contacts():
+    """Drops the in-memory snapshot so the next call re-reads the table."""
+    with _lock:
+        _snapshot.update({"version": None, "df": None, "loaded_at": None})
+
+
+def get_store_stats():
+    """Returns hit/miss/reload counters plus details about the current snapshot."""
+    with _lock:
+        stats = dict(_stats)
+        stats["version"] = _snapshot["version"]
+        stats["rows"] = len(_snapshot["df"]) if _snapshot["df"] is not None else 0
+        stats["loaded_at"] = _snapshot["loaded_at"]
+    return stats
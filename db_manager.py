@@ -1,20 +1,220 @@
+import functools
+import queue
+import re
 import sqlite3
+import threading
 import pandas as pd
-from datetime import datetime
+from contextlib import contextmanager
+from campus_map import canonical_campus
 
 # Define the database name
 DB_NAME = 'cuny_civic_network.db'
 
+# ---------------------------------------------------------
+# CONNECTION MANAGER
+# ---------------------------------------------------------
+# Tuned connections live in a small pool instead of paying connect/close (and the
+# PRAGMAs) on every call. A thread leases one connection on first use and keeps it
+# while it runs; when the thread ends (Streamlit runs every rerun on a fresh thread)
+# the lease hands the connection back, so the next thread reuses it. At most
+# POOL_SIZE idle connections are kept, which bounds the page caches and mmaps.
+# Connections run in autocommit mode; multi-statement writes go through
+# transaction() so they commit (or roll back) as a unit.
+BUSY_TIMEOUT_MS = 5000            # wait for a competing writer instead of failing with "database is locked"
+PAGE_CACHE_KIB = 32 * 1024        # 32 MB page cache per connection
+MMAP_SIZE_BYTES = 256 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 8                     # idle connections kept per database file
+
+_local = threading.local()
+_pools = {}                       # database file -> LifoQueue of idle connections
+_pool_lock = threading.Lock()
+_pool_stats = {"opened": 0, "reused": 0, "returned": 0, "closed": 0}
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_regexp(pattern):
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def _regexp(pattern, value):
+    """SQL `value REGEXP pattern` (case-insensitive search, NULL never matches)."""
+    return value is not None and _compile_regexp(pattern).search(str(value)) is not None
+
+
+def _open_connection():
+    # check_same_thread=False: a pooled connection moves between threads (only one leases it at a time)
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{PAGE_CACHE_KIB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.create_function("REGEXP", 2, _regexp, deterministic=True)
+    return conn
+
+
+def _get_pool(db_name):
+    with _pool_lock:
+        if db_name not in _pools:
+            _pools[db_name] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return _pools[db_name]
+
+
+def _acquire(db_name):
+    try:
+        conn = _get_pool(db_name).get_nowait()
+        with _pool_lock:
+            _pool_stats["reused"] += 1
+        return conn
+    except queue.Empty:
+        with _pool_lock:
+            _pool_stats["opened"] += 1
+        return _open_connection()
+
+
+def _release(conn, db_name):
+    """Returns a connection to its pool (closed instead when the pool is full or it is unusable)."""
+    try:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        _get_pool(db_name).put_nowait(conn)
+        outcome = "returned"
+    except (queue.Full, sqlite3.Error):
+        conn.close()
+        outcome = "closed"
+    with _pool_lock:
+        _pool_stats[outcome] += 1
+
+
+class _Lease:
+    """A thread's hold on one pooled connection, released when the thread's locals are cleared."""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self.conn = _acquire(db_name)
+
+    def __del__(self):
+        if self.conn is not None:
+            try:
+                _release(self.conn, self.db_name)
+            except Exception:
+                pass   # interpreter shutdown
+
 
 def get_connection():
-    """Helper function to get a database connection."""
-    return sqlite3.connect(DB_NAME)
+    """Returns the connection leased to this thread (persistent and tuned; do not close it)."""
+    lease = getattr(_local, "lease", None)
+    if lease is None or lease.db_name != DB_NAME:
+        _local.lease = None   # hands a connection to the previous DB_NAME back to its pool
+        _local.lease = lease = _Lease(DB_NAME)
+    return lease.conn
+
+
+def close_connection():
+    """Closes this thread's connection instead of returning it to the pool (e.g. in tests)."""
+    lease = getattr(_local, "lease", None)
+    if lease is not None:
+        conn, lease.conn = lease.conn, None
+        _local.lease = None
+        conn.close()
+        with _pool_lock:
+            _pool_stats["closed"] += 1
+
+
+def get_pool_stats():
+    """Connections opened, reused from the pool, returned and closed, plus the idle count per database."""
+    with _pool_lock:
+        return dict(_pool_stats, idle={name: pool.qsize() for name, pool in _pools.items()})
+
+
+@contextmanager
+def transaction(immediate=True):
+    """
+    Runs the block in one transaction on this thread's connection and commits at the end.
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue on busy_timeout
+    instead of failing halfway. Nested use joins the outer transaction.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    try:
+        yield conn
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# ---------------------------------------------------------
+# SCHEMA MIGRATIONS
+# ---------------------------------------------------------
+# The schema version lives in PRAGMA user_version. Each migration runs once, in its own
+# transaction, and bumps the version. initialize_database() checks the version only
+# once per process (per database file), so Streamlit reruns skip it completely.
+_migrate_lock = threading.Lock()
+_migrated_dbs = set()
+
+# Contact_Changes keeps the last CHANGE_LOG_KEEP_VERSIONS versions, pruned each time the data
+# version crosses a multiple of CHANGE_LOG_PRUNE_EVERY. Data_Versions['Contact_Changes_floor'] is the
+# highest version whose rows may be gone: an index synced before it has to rebuild from scratch.
+CHANGE_LOG_KEEP_VERSIONS = 10000
+CHANGE_LOG_PRUNE_EVERY = 1000
 
 
 def initialize_database():
-    """Creates the necessary tables if they don't exist yet."""
+    """Brings the database schema up to date (at most once per process)."""
+    with _migrate_lock:
+        if DB_NAME in _migrated_dbs:
+            return
+        run_migrations()
+        _migrated_dbs.add(DB_NAME)
+
+
+def get_schema_version(conn=None):
+    """Returns the migration number the database is at (PRAGMA user_version)."""
+    conn = conn or get_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(target_version=None):
+    """Applies the pending migrations in order, up to target_version (default: all). Returns the new version."""
+    target_version = SCHEMA_VERSION if target_version is None else target_version
     conn = get_connection()
-    cursor = conn.cursor()
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        if version > target_version:
+            break
+        if get_schema_version(conn) >= version:
+            continue
+        with transaction() as conn:
+            # Re-check under the write lock: another process may have just applied it
+            if get_schema_version(conn) >= version:
+                continue
+            migration(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+
+    # Backfill the index for existing databases (or after a VACUUM renumbered the rowids)
+    if get_schema_version(conn) >= 1:
+        fts_rows = conn.execute("SELECT COUNT(*) FROM Contacts_FTS").fetchone()[0]
+        contact_rows = conn.execute("SELECT COUNT(*) FROM Network_Contacts").fetchone()[0]
+        if fts_rows != contact_rows:
+            with transaction():
+                rebuild_fts_index(conn)
+    return get_schema_version(conn)
+
+
+def _add_column_if_missing(cursor, table, column, column_type):
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _migration_1_base_schema(cursor):
+    """Tables, change tracking, FTS, caches and the semantic store (idempotent for pre-migration databases)."""
 
     # Create the main Contacts table (imported from CSV)
     cursor.execute('''
@@ -151,24 +351,316 @@ def initialize_database():
                        )
                    ''')
 
-    # --- SAFEGUARD: Add missing columns to older databases automatically ---
-    try:
-        cursor.execute("ALTER TABLE Users ADD COLUMN email TEXT")
-    except sqlite3.OperationalError:
-        pass  # The column already exists, safely ignore
+    # --- SAFEGUARD: Add missing columns to older databases ---
+    _add_column_if_missing(cursor, "Users", "email", "TEXT")
+    _add_column_if_missing(cursor, "Users", "projects", "TEXT")
+    _add_column_if_missing(cursor, "Users", "linked_contact_id", "TEXT")
 
-    try:
-        cursor.execute("ALTER TABLE Users ADD COLUMN projects TEXT")
-    except sqlite3.OperationalError:
-        pass  # The column already exists, safely ignore
+    # --- CHANGE TRACKING: Triggers bump a version counter whenever a contact row changes ---
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS Data_Versions
+                   (
+                       table_name TEXT PRIMARY KEY,
+                       version    INTEGER NOT NULL DEFAULT 0
+                   )
+                   ''')
+    cursor.execute("INSERT OR IGNORE INTO Data_Versions (table_name, version) VALUES ('Network_Contacts', 0)")
+    cursor.execute("INSERT OR IGNORE INTO Data_Versions (table_name, version) VALUES ('Contact_Changes_floor', 0)")
 
-    try:
-        cursor.execute("ALTER TABLE Users ADD COLUMN linked_contact_id TEXT")
-    except sqlite3.OperationalError:
-        pass  # The column already exists, safely ignore
+    # Change log: which contact IDs changed at which version (lets indexes update incrementally)
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS Contact_Changes
+                   (
+                       change_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+                       version    INTEGER NOT NULL,
+                       contact_id TEXT
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contact_changes_version ON Contact_Changes (version)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_contact_changes_contact ON Contact_Changes (contact_id, version)")
+
+    create_version_triggers(cursor)
+
+    # Bounded change log: drop the rows no incremental sync is expected to need any more
+    cursor.execute(f'''
+                   CREATE TRIGGER IF NOT EXISTS trg_contact_changes_prune
+                   AFTER UPDATE OF version ON Data_Versions
+                   WHEN new.table_name = 'Network_Contacts'
+                    AND new.version / {CHANGE_LOG_PRUNE_EVERY} > old.version / {CHANGE_LOG_PRUNE_EVERY}
+                   BEGIN
+                       DELETE FROM Contact_Changes WHERE version <= new.version - {CHANGE_LOG_KEEP_VERSIONS};
+                       UPDATE Data_Versions SET version = MAX(version, new.version - {CHANGE_LOG_KEEP_VERSIONS})
+                       WHERE table_name = 'Contact_Changes_floor';
+                   END
+                   ''')
+
+    # --- FULL-TEXT SEARCH: FTS5 mirror of the searchable contact fields (rowid = contact rowid) ---
+    cursor.execute('''
+                   CREATE VIRTUAL TABLE IF NOT EXISTS Contacts_FTS USING fts5
+                   (
+                       contact_id UNINDEXED,
+                       name,
+                       domains,
+                       notes,
+                       affiliation,
+                       tokenize = 'unicode61 remove_diacritics 2',
+                       prefix = '2 3'
+                   )
+                   ''')
+    create_fts_triggers(cursor)
+
+    # --- LLM CACHE: Persistent results for repeat questions (see llm_cache.py) ---
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS LLM_Cache
+                   (
+                       cache_name   TEXT NOT NULL,
+                       cache_key    TEXT NOT NULL,
+                       response     TEXT NOT NULL,
+                       created_at   REAL NOT NULL,
+                       last_used_at REAL NOT NULL,
+                       hit_count    INTEGER NOT NULL DEFAULT 0,
+                       PRIMARY KEY (cache_name, cache_key)
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_lru ON LLM_Cache (cache_name, last_used_at)")
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS LLM_Cache_Stats
+                   (
+                       cache_name  TEXT PRIMARY KEY,
+                       hits        INTEGER NOT NULL DEFAULT 0,
+                       misses      INTEGER NOT NULL DEFAULT 0,
+                       expirations INTEGER NOT NULL DEFAULT 0,
+                       evictions   INTEGER NOT NULL DEFAULT 0
+                   )
+                   ''')
+
+    # --- SEMANTIC INDEX: LSA model + one float32 vector per contact (see semantic_index.py) ---
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS Semantic_Model
+                   (
+                       model_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                       features       INTEGER NOT NULL,
+                       dims           INTEGER NOT NULL,
+                       idf            BLOB    NOT NULL,
+                       basis          BLOB    NOT NULL,
+                       synced_version INTEGER NOT NULL DEFAULT 0,
+                       created_at     DATETIME DEFAULT CURRENT_TIMESTAMP
+                   )
+                   ''')
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS Contact_Vectors
+                   (
+                       contact_id TEXT PRIMARY KEY,
+                       model_id   INTEGER NOT NULL,
+                       vector     BLOB    NOT NULL
+                   )
+                   ''')
+
+
+def _migration_2_lookup_indexes(cursor):
+    """Secondary indexes for the per-user lookups, and one saved row per (user, contact)."""
+    # Drop duplicate bookmarks (keep the first save) so the UNIQUE index can be built
+    cursor.execute('''
+                   DELETE FROM Saved_Collaborations
+                   WHERE id NOT IN (SELECT MIN(id) FROM Saved_Collaborations GROUP BY user_id, contact_id)
+                   ''')
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_saved_collab_user_contact "
+                   "ON Saved_Collaborations (user_id, contact_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_search_logs_user_time ON Search_Logs (user_id, search_time)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_linked_contact ON Users (linked_contact_id)")
+    # get_user_by_name (every sign-in) and add_user's existing-user fallback look users up by name; the
+    # UNIQUE on Users.name only exists in newly created databases, older ones scanned the table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_name ON Users (name)")
+    # Network_Contacts was created by pandas without a primary key; ID lookups and joins scanned the table
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_network_contacts_id ON Network_Contacts (ID)")
+
+
+def _migration_3_saved_recent_index(cursor):
+    """Index on Saved_Collaborations(user_id): ordered by (user_id, id), it serves the newest-first keyset pages."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_saved_collab_user_recent ON Saved_Collaborations (user_id)")
+
+
+def _migration_4_canonical_campus(cursor):
+    """Materialized canonical campus (campus_key) and is_cuny flag, backfilled from the raw Campus values."""
+    _add_column_if_missing(cursor, "Network_Contacts", "campus_key", "TEXT")
+    _add_column_if_missing(cursor, "Network_Contacts", "is_cuny", "INTEGER NOT NULL DEFAULT 0")
+    rows = cursor.execute("SELECT DISTINCT Campus FROM Network_Contacts").fetchall()
+    cursor.executemany("UPDATE Network_Contacts SET campus_key = ?, is_cuny = ? WHERE Campus IS ?",
+                       [(*campus_columns(raw), raw) for (raw,) in rows])
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_network_contacts_campus ON Network_Contacts (is_cuny, campus_key)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_network_contacts_campus_key ON Network_Contacts (campus_key)")
+
+
+def _migration_5_perf_metrics(cursor):
+    """Perf_Metrics: one row per tracing span (stage timings, tokens, rows, cache outcome), see perf_tracing.py."""
+    cursor.execute('''
+                   CREATE TABLE IF NOT EXISTS Perf_Metrics
+                   (
+                       id                INTEGER PRIMARY KEY AUTOINCREMENT,
+                       trace_id          TEXT,
+                       stage             TEXT NOT NULL,
+                       provider          TEXT,
+                       started_at        TEXT NOT NULL,
+                       duration_ms       REAL NOT NULL,
+                       prompt_tokens     INTEGER,
+                       completion_tokens INTEGER,
+                       rows              INTEGER,
+                       cache             TEXT,
+                       status            TEXT NOT NULL DEFAULT 'ok',
+                       detail            TEXT
+                   )
+                   ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_perf_metrics_time ON Perf_Metrics (started_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_perf_metrics_trace ON Perf_Metrics (trace_id)")
+
+
+MIGRATIONS = [
+    _migration_1_base_schema,
+    _migration_2_lookup_indexes,
+    _migration_3_saved_recent_index,
+    _migration_4_canonical_campus,
+    _migration_5_perf_metrics,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def campus_columns(raw_campus):
+    """(campus_key, is_cuny) to store next to a raw Campus value; every writer of Campus must set both."""
+    clean, is_cuny = canonical_campus(raw_campus)
+    return clean, int(is_cuny)
+
+
+def create_fts_triggers(cursor):
+    """Triggers that keep Contacts_FTS in sync with Network_Contacts row by row."""
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_insert
+                   AFTER INSERT ON Network_Contacts
+                   BEGIN
+                       INSERT INTO Contacts_FTS (rowid, contact_id, name, domains, notes, affiliation)
+                       VALUES (new.rowid, new.ID, new."Contact Name", new."Civic Domains",
+                               new."Notes / Insights", new."Program/Org Affiliation");
+                   END
+                   ''')
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_update
+                   AFTER UPDATE OF ID, "Contact Name", "Civic Domains", "Notes / Insights", "Program/Org Affiliation"
+                   ON Network_Contacts
+                   BEGIN
+                       DELETE FROM Contacts_FTS WHERE rowid = old.rowid;
+                       INSERT INTO Contacts_FTS (rowid, contact_id, name, domains, notes, affiliation)
+                       VALUES (new.rowid, new.ID, new."Contact Name", new."Civic Domains",
+                               new."Notes / Insights", new."Program/Org Affiliation");
+                   END
+                   ''')
+    cursor.execute('''
+                   CREATE TRIGGER IF NOT EXISTS trg_contacts_fts_delete
+                   AFTER DELETE ON Network_Contacts
+                   BEGIN
+                       DELETE FROM Contacts_FTS WHERE rowid = old.rowid;
+                   END
+                   ''')
 
-    conn.commit()
-    conn.close()
+
+def create_version_triggers(cursor):
+    """Triggers that bump the data version and log the changed contact IDs row by row."""
+    changed_ids = {"INSERT": ["new.ID"], "UPDATE": ["old.ID", "new.ID"], "DELETE": ["old.ID"]}
+    for event, id_refs in changed_ids.items():
+        log_statements = "\n".join(
+            f"INSERT INTO Contact_Changes (version, contact_id) "
+            f"SELECT version, {ref} FROM Data_Versions WHERE table_name = 'Network_Contacts';"
+            for ref in id_refs
+        )
+        cursor.execute(f'''
+                       CREATE TRIGGER IF NOT EXISTS trg_contacts_version_{event.lower()}
+                       AFTER {event} ON Network_Contacts
+                       BEGIN
+                           UPDATE Data_Versions SET version = version + 1 WHERE table_name = 'Network_Contacts';
+                           {log_statements}
+                       END
+                       ''')
+
+
+def drop_version_triggers(cursor):
+    """Removes the version/change-log triggers (bulk loads drop them, then call mark_contacts_rewritten once)."""
+    for event in ("insert", "update", "delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_contacts_version_{event}")
+
+
+def mark_contacts_rewritten(conn):
+    """
+    Records a bulk rewrite of Network_Contacts as ONE data version, with no per-contact change rows:
+    the change-log floor moves to the new version, so every index synced before it rebuilds once.
+    """
+    conn.execute("UPDATE Data_Versions SET version = version + 1 WHERE table_name = 'Network_Contacts'")
+    version = get_data_version(conn)
+    conn.execute("DELETE FROM Contact_Changes WHERE version <= ?", (version,))
+    conn.execute("UPDATE Data_Versions SET version = ? WHERE table_name = 'Contact_Changes_floor'", (version,))
+    return version
+
+
+def drop_fts_triggers(cursor):
+    """Removes the FTS sync triggers (bulk loads drop them, then call rebuild_fts_index once)."""
+    for event in ("insert", "update", "delete"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS trg_contacts_fts_{event}")
+
+
+def rebuild_fts_index(conn):
+    """Repopulates Contacts_FTS from scratch. Used for backfills and bulk loads."""
+    conn.execute("DELETE FROM Contacts_FTS")
+    conn.execute('''
+                 INSERT INTO Contacts_FTS (rowid, contact_id, name, domains, notes, affiliation)
+                 SELECT rowid, ID, "Contact Name", "Civic Domains", "Notes / Insights", "Program/Org Affiliation"
+                 FROM Network_Contacts
+                 ''')
+
+
+def get_data_version(conn=None):
+    """Returns the change counter for Network_Contacts. Every insert/update/delete bumps it."""
+    conn = conn or get_connection()
+    row = conn.execute("SELECT version FROM Data_Versions WHERE table_name = 'Network_Contacts'").fetchone()
+    return row[0] if row else 0
+
+
+def get_change_log_floor(conn=None):
+    """Versions at or below this may be missing from Contact_Changes (pruned, or a bulk import)."""
+    conn = conn or get_connection()
+    row = conn.execute("SELECT version FROM Data_Versions WHERE table_name = 'Contact_Changes_floor'").fetchone()
+    return row[0] if row else 0
+
+
+def get_changed_contact_ids(since_version, conn=None):
+    """
+    Returns the set of contact IDs inserted, updated or deleted after the given data version,
+    or None when the change log no longer goes back that far (the caller must rebuild).
+    """
+    conn = conn or get_connection()
+    if since_version < get_change_log_floor(conn):
+        return None
+    rows = conn.execute("SELECT DISTINCT contact_id FROM Contact_Changes WHERE version > ?",
+                        (since_version,)).fetchall()
+    return {r[0] for r in rows}
+
+
+def get_contacts_stamp(contact_ids, conn=None):
+    """
+    Returns a version stamp for a set of contacts: the last data version at which any of them changed.
+    Very large sets just use the table-wide version (cheaper than thousands of lookups).
+    """
+    contact_ids = list(contact_ids)
+    conn = conn or get_connection()
+
+    if len(contact_ids) > 2000:
+        stamp = get_data_version(conn)
+    else:
+        # A contact whose rows were pruned last changed at or before the floor
+        stamp = get_change_log_floor(conn)
+        for i in range(0, len(contact_ids), 500):
+            chunk = contact_ids[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            row = conn.execute(f"SELECT MAX(version) FROM Contact_Changes WHERE contact_id IN ({placeholders})",
+                               chunk).fetchone()
+            stamp = max(stamp, row[0] or 0)
+    return stamp
 
 
 def add_user(name, campus, role, focus):
@@ -180,136 +672,171 @@ def add_user(name, campus, role, focus):
                        INSERT INTO Users (name, campus, role, focus)
                        VALUES (?, ?, ?, ?)
                        ''', (name, campus, role, focus))
-        conn.commit()
         user_id = cursor.lastrowid
     except sqlite3.IntegrityError:
         # If the user already exists, just get their ID
         cursor.execute('SELECT user_id FROM Users WHERE name = ?', (name,))
         user_id = cursor.fetchone()[0]
 
-    conn.close()
     return user_id
 
 
 def get_user_by_name(name):
     """Retrieves all 7 data points for an existing user."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    cursor = get_connection().cursor()
     cursor.execute("SELECT user_id, campus, role, focus, email, projects, linked_contact_id FROM Users WHERE name = ?", (name,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return cursor.fetchone()
 
 
 def update_user_profile(user_id, email, campus, role, focus, projects):
     """Updates an existing user's profile in the database."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-                   UPDATE Users
-                   SET email    = ?,
-                       campus   = ?,
-                       role     = ?,
-                       focus    = ?,
-                       projects = ?
-                   WHERE user_id = ?
-                   """, (email, campus, role, focus, projects, user_id))
-    conn.commit()
-    conn.close()
+    get_connection().execute("""
+                             UPDATE Users
+                             SET email    = ?,
+                                 campus   = ?,
+                                 role     = ?,
+                                 focus    = ?,
+                                 projects = ?
+                             WHERE user_id = ?
+                             """, (email, campus, role, focus, projects, user_id))
 
 
 def log_search(user_id, query):
     """Logs a user's search query for analytics."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-                   INSERT INTO Search_Logs (user_id, search_query)
-                   VALUES (?, ?)
-                   ''', (user_id, query))
-    conn.commit()
-    conn.close()
+    get_connection().execute('''
+                             INSERT INTO Search_Logs (user_id, search_query)
+                             VALUES (?, ?)
+                             ''', (user_id, query))
 
 
 def save_collaboration(user_id, contact_id):
-    """Saves a contact to a user's 'Interesting' list. Prevents duplicates."""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # First, check if they already saved this person so we don't get duplicates
-    cursor.execute("SELECT id FROM Saved_Collaborations WHERE user_id = ? AND contact_id = ?", (user_id, contact_id))
-    exists = cursor.fetchone()
-
-    if not exists:
-        cursor.execute(
-            "INSERT INTO Saved_Collaborations (user_id, contact_id) VALUES (?, ?)",
-            (user_id, contact_id)
-        )
-        conn.commit()
-    conn.close()
-
-
-def get_saved_collaborations(user_id):
-    """Retrieves all contacts a user has marked as interesting."""
-    conn = get_connection()
+    """Saves a contact to a user's 'Interesting' list. Returns False if it was already saved."""
+    # One atomic statement: the UNIQUE (user_id, contact_id) index makes duplicates impossible
+    cursor = get_connection().execute('''
+                                      INSERT INTO Saved_Collaborations (user_id, contact_id)
+                                      VALUES (?, ?)
+                                      ON CONFLICT (user_id, contact_id) DO NOTHING
+                                      ''', (user_id, contact_id))
+    return cursor.rowcount > 0
+
+
+def save_collaborations(user_id, contact_ids):
+    """Bulk version of save_collaboration. Returns how many contacts were newly saved."""
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany('''
+                         INSERT INTO Saved_Collaborations (user_id, contact_id)
+                         VALUES (?, ?)
+                         ON CONFLICT (user_id, contact_id) DO NOTHING
+                         ''', [(user_id, contact_id) for contact_id in contact_ids])
+        return conn.total_changes - before
+
+
+def unsave_collaboration(user_id, contact_id):
+    """Removes a contact from a user's 'Interesting' list. Returns False if it was not saved."""
+    cursor = get_connection().execute("DELETE FROM Saved_Collaborations WHERE user_id = ? AND contact_id = ?",
+                                      (user_id, contact_id))
+    return cursor.rowcount > 0
+
+
+def unsave_collaborations(user_id, contact_ids):
+    """Bulk version of unsave_collaboration. Returns how many bookmarks were removed."""
+    with transaction() as conn:
+        before = conn.total_changes
+        conn.executemany("DELETE FROM Saved_Collaborations WHERE user_id = ? AND contact_id = ?",
+                         [(user_id, contact_id) for contact_id in contact_ids])
+        return conn.total_changes - before
+
+
+# Columns the Saved tab actually shows (instead of nc.*)
+SAVED_COLUMNS = ["ID", "Contact Name", "Campus", "Role/Title"]
+SAVED_PAGE_SIZE = 25
+
+
+def get_saved_collaborations(user_id, limit=SAVED_PAGE_SIZE, before_id=None):
+    """
+    One page of a user's saved contacts, newest first.
+    Keyset pagination: pass the returned next_before_id to get the following page.
+    Returns (page_df, next_before_id), where next_before_id is None on the last page.
+    """
     # We use a JOIN query to get the actual contact details, not just their IDs
-    query = """
-            SELECT nc.* \
-            FROM Saved_Collaborations sc \
+    columns = ", ".join(f'nc."{c}"' for c in SAVED_COLUMNS)
+    query = f"""
+            SELECT sc.id AS saved_id, sc.saved_at, {columns}
+            FROM Saved_Collaborations sc
                      JOIN Network_Contacts nc ON sc.contact_id = nc.ID
             WHERE sc.user_id = ?
-            ORDER BY sc.saved_at DESC \
+              AND sc.id < ?
+            ORDER BY sc.id DESC
+            LIMIT ?
             """
-    df = pd.read_sql_query(query, conn, params=(user_id,))
-    conn.close()
-    return df
+    # Fetch one extra row to know whether another page exists
+    page = pd.read_sql_query(query, get_connection(),
+                             params=(user_id, before_id if before_id is not None else 2 ** 63 - 1, limit + 1))
+    if len(page) > limit:
+        page = page.head(limit)
+        return page, int(page["saved_id"].iloc[-1])
+    return page, None
+
+
+def count_saved_collaborations(user_id):
+    """Number of saved contacts a user has (matching what get_saved_collaborations pages through)."""
+    return get_connection().execute('''
+                                    SELECT COUNT(*)
+                                    FROM Saved_Collaborations sc
+                                             JOIN Network_Contacts nc ON sc.contact_id = nc.ID
+                                    WHERE sc.user_id = ?
+                                    ''', (user_id,)).fetchone()[0]
 
 
 def publish_user_to_directory(user_id, profile):
     """Inserts or updates the user's profile in the public Network_Contacts table."""
     import uuid
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # 1. Check if the user already has a linked contact ID
-    cursor.execute("SELECT linked_contact_id FROM Users WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
-    linked_id = result[0] if result and result[0] else None
-
-    # 2. If not, generate a unique ID and save it to the Users table
-    if not linked_id:
-        linked_id = f"USER_{user_id}_{uuid.uuid4().hex[:8]}"
-        cursor.execute("UPDATE Users SET linked_contact_id = ? WHERE user_id = ?", (linked_id, user_id))
-
-    # 3. Check if they are already in the public directory
-    cursor.execute("SELECT ID FROM Network_Contacts WHERE ID = ?", (linked_id,))
-    exists = cursor.fetchone()
-
-    name = profile.get('name', '')
-    email = profile.get('email', '')
-    role = profile.get('role', '')
-    campus = profile.get('campus', '')
-    focus = profile.get('focus', '')
-    projects = profile.get('projects', '')
-
-    # 4. Insert or Update their public card
-    if exists:
-        cursor.execute("""
-                       UPDATE Network_Contacts
-                       SET "Contact Name"         = ?,
-                           "Email/Phone/LinkedIn" = ?,
-                           "Role/Title"           = ?,
-                           Campus                 = ?,
-                           "Civic Domains"        = ?,
-                           "Notes / Insights"     = ?
-                       WHERE ID = ?
-                       """, (name, email, role, campus, focus, projects, linked_id))
-    else:
-        cursor.execute("""
-                       INSERT INTO Network_Contacts (ID, "Contact Name", "Email/Phone/LinkedIn", "Role/Title", Campus,
-                                                     "Civic Domains", "Notes / Insights")
-                       VALUES (?, ?, ?, ?, ?, ?, ?)
-                       """, (linked_id, name, email, role, campus, focus, projects))
-
-    conn.commit()
-    conn.close()
-    return linked_id
\ No newline at end of file
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # 1. Check if the user already has a linked contact ID
+        cursor.execute("SELECT linked_contact_id FROM Users WHERE user_id = ?", (user_id,))
+        result = cursor.fetchone()
+        linked_id = result[0] if result and result[0] else None
+
+        # 2. If not, generate a unique ID and save it to the Users table
+        if not linked_id:
+            linked_id = f"USER_{user_id}_{uuid.uuid4().hex[:8]}"
+            cursor.execute("UPDATE Users SET linked_contact_id = ? WHERE user_id = ?", (linked_id, user_id))
+
+        # 3. Check if they are already in the public directory
+        cursor.execute("SELECT ID FROM Network_Contacts WHERE ID = ?", (linked_id,))
+        exists = cursor.fetchone()
+
+        name = profile.get('name', '')
+        email = profile.get('email', '')
+        role = profile.get('role', '')
+        campus = profile.get('campus', '')
+        focus = profile.get('focus', '')
+        projects = profile.get('projects', '')
+
+        campus_key, is_cuny = campus_columns(campus)
+
+        # 4. Insert or Update their public card
+        if exists:
+            cursor.execute("""
+                           UPDATE Network_Contacts
+                           SET "Contact Name"         = ?,
+                               "Email/Phone/LinkedIn" = ?,
+                               "Role/Title"           = ?,
+                               Campus                 = ?,
+                               campus_key             = ?,
+                               is_cuny                = ?,
+                               "Civic Domains"        = ?,
+                               "Notes / Insights"     = ?
+                           WHERE ID = ?
+                           """, (name, email, role, campus, campus_key, is_cuny, focus, projects, linked_id))
+        else:
+            cursor.execute("""
+                           INSERT INTO Network_Contacts (ID, "Contact Name", "Email/Phone/LinkedIn", "Role/Title", Campus,
+                                                         campus_key, is_cuny, "Civic Domains", "Notes / Insights")
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                           """, (linked_id, name, email, role, campus, campus_key, is_cuny, focus, projects))
+
+    return linked_id
@@ -0,0 +1,137 @@
+import threading
+import pandas as pd
+from db_manager import get_connection, get_data_version
+from search_index import BM25_WEIGHTS, build_match_expression
+
+# ---------------------------------------------------------
+# DIRECTORY FILTERS, PUSHED DOWN TO SQLITE
+# ---------------------------------------------------------
+# The directory used to copy the whole DataFrame and chain boolean masks on
+# every rerun, then show head(50). Now the filter selections are compiled into
+# one parameterized query: the database returns only the visible page of cards
+# (LIMIT/OFFSET) and a separate COUNT gives the total for the pager.
+DIRECTORY_PAGE_SIZE = 25
+
+# Only what a directory card shows
+DIRECTORY_COLUMNS = [
+    "ID", "Contact Name", "Campus", "Role/Title", "Program/Org Affiliation", "Civic Domains",
+    "Capabilities / Expertise", "Communities Served", "Email/Phone/LinkedIn", "Notes / Insights",
+]
+
+# The Hybrid UI Bucketing Logic for Domains (case-insensitive regexes over "Civic Domains")
+DOMAIN_MAPPINGS = {
+    "Education & Youth Development": r"Education|Youth|School|K-12|Tutoring|College|Student|Academia",
+    "Justice, Policy & Government": r"Justice|\bLaw\b|\bLegal\b|Policy|Advocacy|Voting|Democracy|Rights|Equity|Government|Immigration",
+    "Health & Wellness": r"Health|Medical|Mental Health|Food Security|Nutrition|\bCare\b|Wellness",
+    "Community & Civic Engagement": r"Community|Housing|Urban|Planning|Neighborhood|Civic",
+    "Economic Empowerment & Workforce": r"Economic|Workforce|Jobs|Business|Entrepreneurship|Career",
+    "Arts, Media & Culture": r"\bArt\b|\bArts\b|Culture|Media|Journalism|History|Communications",
+    "Environment & Sustainability": r"Environment|Climate|Sustainability|Energy|Green",
+    "Technology, Data & Innovation": r"Technology|Tech|Data|\bSTEM\b|Innovation|\bIT\b",
+    "Research & Social Sciences": r"Research|Sociology|Political Science|Science|Study",
+    "Other / Cross-Cutting": r"Other|Cross|Interdisciplinary"
+}
+
+# The Hybrid UI Bucketing Logic for Roles (case-insensitive regexes over "Role/Title")
+ROLE_MAPPINGS = {
+    "Faculty & Teachers": r"Professor|Adjunct|Faculty|Lecturer|Instructor|Teacher",
+    "Students & Fellows": r"Student|Candidate|Fellow|Scholar",
+    "Administration": r"Dean|Director|Provost|President|Coordinator|Manager|Chair|Admin",
+    "External Partners": r"Founder|\bCEO\b|Consultant|Partner",
+    "INI Staff": r"\bINI\b|Vngle"
+}
+
+
+def compile_directory_filters(keyword=None, campuses=None, domains=None, roles=None):
+    """
+    Turns the directory selections into SQL pieces: (from_clause, where_clause, params, ranked).
+    campuses are canonical campus keys (see get_campus_facets); domains and roles are bucket names.
+    """
+    where, params = [], []
+    match = build_match_expression(keyword) if keyword else ""
+
+    if match:
+        # Search across Name, Domains, Affiliation, and Notes simultaneously (FTS5, best matches first)
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        from_clause = f"""
+            (SELECT rowid AS fts_rowid,
+                    bm25(Contacts_FTS, {weights}) AS score,
+                    snippet(Contacts_FTS, -1, '**', '**', '…', 12) AS snippet
+             FROM Contacts_FTS
+             WHERE Contacts_FTS MATCH ?) hits
+            JOIN Network_Contacts nc ON nc.rowid = hits.fts_rowid
+            """
+        params.append(match)
+    else:
+        from_clause = "Network_Contacts nc"
+
+    if campuses:
+        where.append(f"nc.campus_key IN ({', '.join('?' for _ in campuses)})")
+        params.extend(campuses)
+
+    if domains:
+        where.append('nc."Civic Domains" REGEXP ?')
+        params.append("|".join(DOMAIN_MAPPINGS[d] for d in domains))
+
+    if roles:
+        where.append('nc."Role/Title" REGEXP ?')
+        params.append("|".join(ROLE_MAPPINGS[r] for r in roles))
+
+    where_clause = ("WHERE " + " AND ".join(where)) if where else ""
+    return from_clause, where_clause, params, bool(match)
+
+
+def count_directory(keyword=None, campuses=None, domains=None, roles=None):
+    """Total number of contacts matching the directory filters."""
+    from_clause, where_clause, params, _ = compile_directory_filters(keyword, campuses, domains, roles)
+    query = f"SELECT COUNT(*) FROM {from_clause} {where_clause}"
+    return get_connection().execute(query, params).fetchone()[0]
+
+
+def query_directory(keyword=None, campuses=None, domains=None, roles=None, page=0, page_size=DIRECTORY_PAGE_SIZE):
+    """
+    One page of directory cards matching the filters.
+    Keyword searches come back best match first with a highlighted 'snippet' column; otherwise table order.
+    """
+    from_clause, where_clause, params, ranked = compile_directory_filters(keyword, campuses, domains, roles)
+    columns = ", ".join(f'nc."{c}"' for c in DIRECTORY_COLUMNS)
+    if ranked:
+        columns += ", hits.snippet"
+        order = "ORDER BY hits.score, nc.rowid"
+    else:
+        order = "ORDER BY nc.rowid"
+    query = f"""
+            SELECT {columns}
+            FROM {from_clause}
+            {where_clause}
+            {order}
+            LIMIT ? OFFSET ?
+            """
+    return pd.read_sql_query(query, get_connection(), params=params + [int(page_size), int(page) * int(page_size)])
+
+
+# ---------------------------------------------------------
+# CAMPUS FACETS
+# ---------------------------------------------------------
+# Option lists for the campus / partner multiselects, read from the materialized
+# campus_key / is_cuny columns (covered by an index) once per data version.
+_facets = {"version": None, "cuny": [], "partners": []}
+_facets_lock = threading.Lock()
+
+
+def get_campus_facets():
+    """Returns {'cuny': [canonical CUNY campuses], 'partners': [community partners]}, sorted."""
+    version = get_data_version()
+    with _facets_lock:
+        if _facets["version"] != version:
+            rows = get_connection().execute('''
+                                            SELECT DISTINCT is_cuny, campus_key
+                                            FROM Network_Contacts
+                                            WHERE campus_key IS NOT NULL
+                                            ''').fetchall()
+            _facets.update({
+                "version": version,
+                "cuny": sorted(key for is_cuny, key in rows if is_cuny),
+                "partners": sorted(key for is_cuny, key in rows if not is_cuny),
+            })
+        return {"cuny": _facets["cuny"], "partners": _facets["partners"]}
@@ -1,33 +1,39 @@
 import pandas as pd
-from openai import OpenAI
 import json
-import os
-from dotenv import load_dotenv
+import hashlib
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from llm_client import LLMError
+from llm_router import route_completion, route_stream_completion, route_cache_scope
+from llm_cache import normalize_query, make_cache_key, cache_get, cache_put, \
+    PARSE_CACHE_TTL_SECONDS, PARSE_CACHE_MAX_ENTRIES, INSIGHT_CACHE_TTL_SECONDS, INSIGHT_CACHE_MAX_ENTRIES
+from db_manager import get_contacts_stamp
+from query_parser import parse_query_locally, LOCAL_PARSE_MIN_CONFIDENCE
+from retrieval import build_context_text, shard_contacts
+from semantic_index import semantic_search
+from search_index import search_contacts, rank_by_hits, get_tag_index
+from perf_tracing import span
+from contact_snapshot import select_ids, narrow_to_ids, as_dataframe
 
 # ---------------------------------------------------------
 # CONFIGURATION
 # ---------------------------------------------------------
-load_dotenv()
-PROVIDER = 'GEMINI'
-
-if PROVIDER == 'OLLAMA':
-    client = OpenAI(base_url="http://localhost:11434/v1", api_key="ollama")
-    MODEL_NAME = "llama3"
-elif PROVIDER == 'OPENAI':
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    MODEL_NAME = "gpt-4o-mini"
-elif PROVIDER == 'GEMINI':
-    client = OpenAI(
-        base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
-        api_key=os.getenv("GEMINI_API_KEY")
-    )
-    MODEL_NAME = "gemini-2.5-flash"
+# Provider, model, timeouts, retries and the concurrency cap live in llm_client.py;
+# which provider answers each call type is decided per call by llm_router.py
+PARSE_TIMEOUT_SECONDS = 20
+INSIGHT_TIMEOUT_SECONDS = 90
 
+# How many meaning-based candidates to return when keyword matching finds nothing
+SEMANTIC_TOP_K = 25
 
-def parse_discovery_query(query):
-    system_prompt = "You are a Civic Discovery Agent. You MUST output a valid JSON object."
 
-    user_prompt = f"""
+# The parse prompt is a module-level template so its hash can be part of the cache key:
+# editing the prompt automatically invalidates every cached parse.
+PARSE_SYSTEM_PROMPT = "You are a Civic Discovery Agent. You MUST output a valid JSON object."
+
+PARSE_PROMPT_TEMPLATE = """
     Translate this query into search terms.
     QUERY: "{query}"
 
@@ -40,33 +46,83 @@ def parse_discovery_query(query):
 
     JSON EXAMPLE: {{"names": ["Liz Evans"], "domains": ["Public Health"]}}
     """
+
+PARSE_PROMPT_HASH = hashlib.sha256((PARSE_SYSTEM_PROMPT + PARSE_PROMPT_TEMPLATE).encode("utf-8")).hexdigest()[:16]
+
+
+def parse_discovery_query(query, raise_errors=False):
+    """
+    Turns a question into {"names", "domains", "communities", "campus", "capabilities"} filters.
+    An empty dict means "nothing to filter on". If the LLM fails and there is no local parse
+    to fall back on, raise_errors=True raises the LLMError (timeout, rate_limit, ...) instead.
+    """
+    with span("parse") as s:
+        filters, outcome = _parse_discovery_query(query, raise_errors, s)
+        s.set(cache=outcome)
+        return filters
+
+
+def _parse_discovery_query(query, raise_errors, s):
+    """parse_discovery_query without the span. Returns (filters, cache outcome: local / hit / miss)."""
+    # Fast path: simple campus/topic/person questions are parsed locally, no network call
+    local_filters, confidence = parse_query_locally(query)
+    if confidence >= LOCAL_PARSE_MIN_CONFIDENCE:
+        return local_filters, "local"
+
+    # Repeat questions skip the network entirely
+    cache_key = make_cache_key(normalize_query(query), route_cache_scope("parse"), PARSE_PROMPT_HASH)
+    cached = cache_get("parse", cache_key, PARSE_CACHE_TTL_SECONDS)
+    if cached is not None:
+        return cached, "hit"
+
+    system_prompt = PARSE_SYSTEM_PROMPT
+    user_prompt = PARSE_PROMPT_TEMPLATE.format(query=query)
+    route = {}
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
+        response = route_completion(
+            "parse",
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
+            timeout=PARSE_TIMEOUT_SECONDS,
+            route=route,
             temperature=0,
             response_format={"type": "json_object"}
         )
+        s.set(provider=route.get("provider"))
 
         # Robust JSON cleaning for Gemini responses
-        raw_content = response.choices[0].message.content.strip()
+        raw_content = (response.choices[0].message.content or "").strip()
         if raw_content.startswith('```json'):
             raw_content = raw_content[7:-3].strip()
         elif raw_content.startswith('```'):
             raw_content = raw_content[3:-3].strip()
 
-        return json.loads(raw_content)
-    except Exception as e:
+        try:
+            filters = json.loads(raw_content)
+        except json.JSONDecodeError as e:
+            raise LLMError("bad_response", f"Parse reply was not valid JSON: {e}", route.get("provider")) from e
+
+        if filters:
+            cache_put("parse", cache_key, filters, PARSE_CACHE_MAX_ENTRIES)
+        return filters, "miss"
+    except LLMError as e:
         print(f"⚠️ LLM Parsing Error: {e}")
-        return {}
+        s.set(status=e.kind)
+        # Provider slow or down: a partial local parse beats no search at all
+        if local_filters or not raise_errors:
+            return local_filters, "local"
+        raise
 
 
 def search_civic_network(query, df):
-    filters = parse_discovery_query(query)
-    results = df.copy()
+    """
+    Parses the query and filters df (a DataFrame or a mapped ContactSnapshot) down to the matches.
+    Returns (results DataFrame, filters).
+    """
+    filters = parse_discovery_query(query, raise_errors=True)
+    results = df
 
     col_map = {
         "domains": "Civic Domains",
@@ -78,35 +134,47 @@ def search_civic_network(query, df):
     if not filters:
         return pd.DataFrame(), {}
 
-    # Handle standard category filters
-    for key, values in filters.items():
-        if key == "names": continue
+    with span("filter") as s:
+        # Handle standard category filters (bitmap intersection over the inverted tag index)
+        category_filters = {
+            col_map[key]: values for key, values in filters.items()
+            if key in col_map and col_map[key] in df.columns and values
+        }
+        if category_filters:
+            matched_ids = get_tag_index().match(category_filters)
+            results = select_ids(results, matched_ids)
 
-        target_col = col_map.get(key)
-        if target_col and target_col in df.columns and values:
-            pattern = '|'.join(values)
-            results = results[results[target_col].fillna('').str.contains(pattern, case=False)]
+        # Handle keyword/name search across the primary database fields (FTS5, ranked by BM25)
+        if "names" in filters and filters["names"]:
+            hits = search_contacts(filters["names"], columns=["name", "notes", "affiliation"])
+            results = rank_by_hits(results, hits)
 
-    # Handle keyword/name search across the primary database fields
-    if "names" in filters and filters["names"]:
-        pattern = '|'.join(filters["names"])
-        results['search_text'] = results['Contact Name'].fillna('') + " " + results['Notes / Insights'].fillna(
-            '') + " " + results['Program/Org Affiliation'].fillna('')
-        mask = results['search_text'].str.contains(pattern, case=False, na=False)
-        results = results[mask]
-        results = results.drop(columns=['search_text'])
+        # Keyword matching missed: fall back to contacts that are close in MEANING
+        # (e.g. "housing insecurity" -> notes about tenant organizing). The campus stays a hard constraint.
+        if results.empty:
+            campus_filter = {col: values for col, values in category_filters.items() if col == "Campus"}
+            allowed_ids = get_tag_index().match(campus_filter) if campus_filter else None
+            results = semantic_candidates(query, df, allowed_ids=allowed_ids)
+            s.set(detail="semantic_fallback")
+        results = as_dataframe(results)
+        s.set(rows=len(results))
 
     return results, filters
 
 
-def generate_civic_insight(query, matches):
-    """
-    Takes the filtered data and generates a natural language answer
-    using the RAW NOTES and METADATA from the Database.
-    """
+def semantic_candidates(query, df, allowed_ids=None, top_k=SEMANTIC_TOP_K):
+    """Rows of df closest in meaning to the query (local LSA index), best first, with a semantic_score column."""
+    hits = semantic_search(query, top_k=top_k, allowed_ids=allowed_ids)
+    df = narrow_to_ids(df, [contact_id for contact_id, _ in hits])
+    if not hits:
+        return df.iloc[0:0]
+    scores = pd.DataFrame(hits, columns=["ID", "semantic_score"])
+    ranked = df.merge(scores, on="ID", how="inner")
+    return ranked.sort_values("semantic_score", ascending=False).reset_index(drop=True)
 
-    # 1. Helpful guidance text for broad or unanswerable queries
-    guidance_text = """Could you please provide more context or specify what you're looking for? For instance:
+
+# Helpful guidance text for broad or unanswerable queries
+GUIDANCE_TEXT = """Could you please provide more context or specify what you're looking for? For instance:
 
 * Are you interested in finding a specific individual or organization?
 * Do you have a particular topic or area of focus in mind (e.g., education, healthcare, social justice)?
@@ -115,23 +183,20 @@ def generate_civic_insight(query, matches):
 
 Once I have a better understanding of your inquiry, I'll do my best to provide a helpful response using the provided database records."""
 
-    # 2. If no data matched at all (Empty Quick Search), return the guide immediately
-    if matches.empty:
-        return guidance_text
-
-    # Build Rich Context
-    context_text = ""
-    for idx, row in matches.iterrows():
-        context_text += f"""
-        ---
-        CONTACT: {row.get('Contact Name', 'Unknown')} ({row.get('Campus', 'Unknown')})
-        ROLE: {row.get('Role/Title', '')} | {row.get('Program/Org Affiliation', '')}
-        RAW NOTE: "{row.get('Notes / Insights', '')}"
-        CHALLENGES: "{row.get('Needs / Challenges', 'N/A')}"
-        TAGS: {row.get('Civic Domains', '')}
-        """
-
-    # 3. Instruct the AI to scan everything and use the guide if the question is too broad
+
+def _build_insight_messages(query, matches, token_budget=None, context=None):
+    """
+    Builds the chat messages for an insight request (rows are used in order until the budget).
+    context is an already built (text, rows, tokens) for these matches, e.g. from retrieve_for_insight.
+    """
+    # Build Rich Context (stops at the token budget when one is given)
+    if context is None:
+        with span("context") as s:
+            context = build_context_text(matches, token_budget)
+            s.set(rows=context[1], prompt_tokens=context[2])
+    context_text = context[0]
+
+    # Instruct the AI to scan everything and use the guide if the question is too broad
     system_prompt = "You are a CUNY Civic Insight Analyst. You are given a massive database dump. You MUST scan the ENTIRE text below to find the answer."
 
     user_prompt = f"""
@@ -143,21 +208,277 @@ Once I have a better understanding of your inquiry, I'll do my best to provide a
     - If the exact answer is found, summarize it clearly.
     - IF the user's question is too broad, too vague, or if the exact answer is NOT found in the database, DO NOT guess. Reply EXACTLY with this text:
 
-    {guidance_text}
+    {GUIDANCE_TEXT}
 
     RELEVANT DATA:
     {context_text}
     """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def _insight_cache_key(mode, query, matches, *settings):
+    """
+    Same question + same matched contacts + same model => same answer.
+    The contacts' change stamp is part of the key, so editing or republishing any of
+    them makes old answers unreachable (they then age out of the LRU).
+    """
+    contact_ids = sorted(matches['ID'].astype(str))
+    ids_hash = hashlib.sha256("\n".join(contact_ids).encode("utf-8")).hexdigest()
+    stamp = get_contacts_stamp(contact_ids)
+    return make_cache_key(mode, normalize_query(query), ids_hash, stamp, route_cache_scope("insight"), *settings)
+
+
+def generate_civic_insight(query, matches, token_budget=None, context=None):
+    """
+    Takes the filtered data and generates a natural language answer
+    using the RAW NOTES and METADATA from the Database.
+    Rows are used in order, so pass them ranked when a token_budget is set.
+    """
+
+    # If no data matched at all (Empty Quick Search), return the guide immediately
+    if matches.empty:
+        return GUIDANCE_TEXT
+
+    with span("insight", rows=len(matches)) as s:
+        cache_key = _insight_cache_key("insight", query, matches, token_budget)
+        cached = cache_get("insight", cache_key, INSIGHT_CACHE_TTL_SECONDS)
+        s.set(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            return cached
+
+        route = {}
+        try:
+            response = route_completion(
+                "insight",
+                messages=_build_insight_messages(query, matches, token_budget, context),
+                timeout=INSIGHT_TIMEOUT_SECONDS,
+                route=route,
+                temperature=0.1
+            )
+            s.set(provider=route.get("provider"))
+            answer = response.choices[0].message.content
+            if answer:
+                cache_put("insight", cache_key, answer, INSIGHT_CACHE_MAX_ENTRIES)
+            return answer
+        except LLMError as e:
+            s.set(status=e.kind)
+            return f"Error generating insight: {e}"
+
+
+
+# Recent time-to-first-token samples (ms) for perceived-latency tracking
+_ttft_samples = deque(maxlen=1000)
+
+
+def stream_civic_insight(query, matches, token_budget=None, stats=None, context=None):
+    """
+    Streaming version of generate_civic_insight: yields text deltas as they arrive.
+    If a stats dict is passed it is filled with ttft_ms (time to first token), total_ms, cached and provider.
+    """
+    if stats is None:
+        stats = {}
+    start = time.perf_counter()
+    stats["cached"] = False
+
+    if matches.empty:
+        stats.update({"ttft_ms": 0.0, "total_ms": 0.0})
+        yield GUIDANCE_TEXT
+        return
+
+    with span("insight", rows=len(matches)) as s:
+        cache_key = _insight_cache_key("insight", query, matches, token_budget)
+        cached = cache_get("insight", cache_key, INSIGHT_CACHE_TTL_SECONDS)
+        s.set(cache="hit" if cached is not None else "miss")
+        if cached is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            stats.update({"cached": True, "ttft_ms": elapsed, "total_ms": elapsed})
+            yield cached
+            return
 
+        parts = []
+        route = {}
+        try:
+            stream = route_stream_completion(
+                "insight",
+                messages=_build_insight_messages(query, matches, token_budget, context),
+                timeout=INSIGHT_TIMEOUT_SECONDS,
+                route=route,
+                temperature=0.1
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if "ttft_ms" not in stats:
+                    stats["ttft_ms"] = (time.perf_counter() - start) * 1000
+                    _ttft_samples.append(stats["ttft_ms"])
+                parts.append(delta)
+                yield delta
+
+            # Only complete answers are cached
+            if parts:
+                cache_put("insight", cache_key, "".join(parts), INSIGHT_CACHE_MAX_ENTRIES)
+        except LLMError as e:
+            s.set(status=e.kind)
+            prefix = "\n\n" if "ttft_ms" in stats else ""
+            yield f"{prefix}Error generating insight: {e}"
+        finally:
+            stats["total_ms"] = (time.perf_counter() - start) * 1000
+            stats["provider"] = route.get("provider")
+            s.set(provider=route.get("provider"))
+            if "ttft_ms" in stats:
+                s.set(detail=f"ttft_ms={stats['ttft_ms']:.0f}")
+
+
+def get_ttft_stats():
+    """Summarizes recent time-to-first-token samples: count, p50 and p95 in milliseconds."""
+    samples = sorted(_ttft_samples)
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None}
+    return {
+        "count": len(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
+
+
+# ---------------------------------------------------------
+# MAP-REDUCE MODE (full-network questions)
+# ---------------------------------------------------------
+# The rows are split into shards that fit one prompt each. The "map" prompts run
+# concurrently in a bounded thread pool and pull out only the relevant facts;
+# one "reduce" prompt merges them. Wall-clock time follows the shard size, not
+# the directory size, and a slow shard is dropped instead of stalling the answer.
+MAP_SHARD_TOKEN_BUDGET = 6000
+MAP_MAX_WORKERS = 8
+MAP_SHARD_TIMEOUT_SECONDS = 45
+NO_FINDINGS = "NONE"
+
+
+def _extract_shard_findings(query, shard_text, timeout):
+    """Map step: pulls the facts relevant to the question out of one shard."""
+    system_prompt = "You are a CUNY Civic Insight Analyst. Extract only facts from the records that help answer the question."
+    user_prompt = f"""
+    User Question: "{query}"
+
+    Instructions:
+    - List every person, campus, program or need in the records below that is relevant to the question, with a short note on why.
+    - Use ONLY the records below. Do not answer the question yet.
+    - If nothing is relevant, reply EXACTLY with: {NO_FINDINGS}
+
+    RECORDS:
+    {shard_text}
+    """
+    response = route_completion(
+        "insight",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        timeout=timeout,
+        temperature=0
+    )
+    return (response.choices[0].message.content or "").strip()
+
+
+def _merge_findings(query, findings):
+    """Reduce step: turns the per-shard findings into one answer."""
+    system_prompt = "You are a CUNY Civic Insight Analyst. You are given notes extracted from every part of the network database."
+    joined = "\n\n".join(f"--- FINDINGS {i + 1} ---\n{text}" for i, text in enumerate(findings))
+    user_prompt = f"""
+    User Question: "{query}"
+
+    Instructions:
+    - Answer based ONLY on the findings below, merging duplicates across them.
+    - Cite specific people, campuses, or programs to build cross-campus connections.
+    - IF the findings do not answer the question, DO NOT guess. Reply EXACTLY with this text:
+
+    {GUIDANCE_TEXT}
+
+    FINDINGS:
+    {joined}
+    """
+    response = route_completion(
+        "insight",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ],
+        timeout=INSIGHT_TIMEOUT_SECONDS,
+        temperature=0.1
+    )
+    return response.choices[0].message.content
+
+
+def generate_civic_insight_map_reduce(query, matches, shard_token_budget=MAP_SHARD_TOKEN_BUDGET,
+                                      max_workers=MAP_MAX_WORKERS, shard_timeout=MAP_SHARD_TIMEOUT_SECONDS):
+    """
+    Answers a question over ALL given rows with concurrent per-shard extraction and a final merge.
+    Returns (answer, stats) where stats counts shards, failed/timed-out shards and shards with findings,
+    and says whether the answer came from the cache.
+    """
+    with span("map_reduce", rows=len(matches)) as s:
+        answer, stats = _map_reduce_insight(query, matches, shard_token_budget, max_workers, shard_timeout)
+        s.set(cache="hit" if stats["cached"] else "miss",
+              detail=f"shards={stats['shards']} timed_out={stats['timed_out']} failed={stats['failed']}")
+        return answer, stats
+
+
+def _map_reduce_insight(query, matches, shard_token_budget, max_workers, shard_timeout):
+    stats = {"shards": 0, "completed": 0, "with_findings": 0, "timed_out": 0, "failed": 0, "cached": False}
+    if matches.empty:
+        return GUIDANCE_TEXT, stats
+
+    cache_key = _insight_cache_key("map_reduce", query, matches, shard_token_budget)
+    cached = cache_get("insight", cache_key, INSIGHT_CACHE_TTL_SECONDS)
+    if cached is not None:
+        stats.update(cached["stats"])
+        stats["cached"] = True
+        return cached["answer"], stats
+
+    shards = shard_contacts(matches, shard_token_budget)
+    stats["shards"] = len(shards)
+    workers = max(1, min(max_workers, len(shards)))
+
+    # Queued shards start late, so the overall deadline grows with the number of "waves"
+    waves = -(-len(shards) // workers)
+    deadline = shard_timeout * waves + 5
+
+    findings = [None] * len(shards)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insight-map")
+    # Each shard runs in a copy of the caller's context so its completion span joins the same trace
+    futures = {executor.submit(contextvars.copy_context().run, _extract_shard_findings, query, shard, shard_timeout): i
+               for i, shard in enumerate(shards)}
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.1
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error generating insight: {e}"
\ No newline at end of file
+        for future in as_completed(futures, timeout=deadline):
+            try:
+                findings[futures[future]] = future.result()
+                stats["completed"] += 1
+            except LLMError as e:
+                print(f"⚠️ Map shard failed: {e}")
+                stats["timed_out" if e.kind == "timeout" else "failed"] += 1
+    except FuturesTimeout:
+        stats["timed_out"] += sum(1 for f in futures if not f.done())
+    finally:
+        # Don't wait for stragglers; their results are simply not used
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    useful = [text for text in findings if text and text.strip().upper() != NO_FINDINGS]
+    stats["with_findings"] = len(useful)
+    if not useful:
+        return GUIDANCE_TEXT, stats
+
+    try:
+        answer = _merge_findings(query, useful)
+    except LLMError as e:
+        return f"Error generating insight: {e}", stats
+
+    # Answers built from a partial set of shards are not cached
+    if answer and not (stats["timed_out"] or stats["failed"]):
+        cache_put("insight", cache_key, {"answer": answer, "stats": stats}, INSIGHT_CACHE_MAX_ENTRIES)
+    return answer, stats
\ No newline at end of file
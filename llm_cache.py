@@ -0,0 +1,160 @@
+import atexit
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from db_manager import get_connection, transaction
+
+# ---------------------------------------------------------
+# PERSISTENT LLM RESULT CACHE
+# ---------------------------------------------------------
+# Lives in the main SQLite file (LLM_Cache / LLM_Cache_Stats tables) so every
+# Streamlit process and every restart shares it. Each logical cache ("parse",
+# ...) has its own TTL and LRU size bound.
+#
+# Lookups are a plain SELECT: they never take the write lock on the answer path.
+# Hit/miss counters and LRU touches are kept in memory and written in one go by
+# the next cache_put (which holds the write lock anyway) or get_cache_stats.
+PARSE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+PARSE_CACHE_MAX_ENTRIES = 5000
+INSIGHT_CACHE_TTL_SECONDS = 3 * 24 * 3600
+INSIGHT_CACHE_MAX_ENTRIES = 2000
+
+
+def normalize_query(query):
+    """Lowercases, collapses whitespace and drops trailing punctuation so trivial variants share an entry."""
+    text = " ".join(str(query).lower().split())
+    return re.sub(r"[\s?.!,;:]+$", "", text)
+
+
+def make_cache_key(*parts):
+    """Hashes the key parts (query, model, provider, prompt hash, ...) into one fixed-size key."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+_pending_lock = threading.Lock()
+_pending = {"stats": {}, "touches": {}}   # cache -> [hits, misses, expirations]; (cache, key) -> [last used, hits]
+
+
+def _bump_stats(conn, cache_name, hits=0, misses=0, expirations=0, evictions=0):
+    conn.execute('''
+                 INSERT INTO LLM_Cache_Stats (cache_name, hits, misses, expirations, evictions)
+                 VALUES (?, ?, ?, ?, ?)
+                 ON CONFLICT(cache_name) DO UPDATE SET hits        = hits + excluded.hits,
+                                                       misses      = misses + excluded.misses,
+                                                       expirations = expirations + excluded.expirations,
+                                                       evictions   = evictions + excluded.evictions
+                 ''', (cache_name, hits, misses, expirations, evictions))
+
+
+def _flush_pending(conn):
+    """Writes the buffered counters and LRU touches inside the caller's write transaction."""
+    with _pending_lock:
+        stats, touches = _pending["stats"], _pending["touches"]
+        _pending["stats"], _pending["touches"] = {}, {}
+    if touches:
+        conn.executemany('''
+                         UPDATE LLM_Cache
+                         SET last_used_at = MAX(last_used_at, ?),
+                             hit_count    = hit_count + ?
+                         WHERE cache_name = ? AND cache_key = ?
+                         ''', [(used, hits, name, key) for (name, key), (used, hits) in touches.items()])
+    for name, (hits, misses, expirations) in stats.items():
+        _bump_stats(conn, name, hits=hits, misses=misses, expirations=expirations)
+
+
+def flush_cache_stats():
+    """Writes the buffered hit/miss counters and LRU touches now (also runs at exit)."""
+    with _pending_lock:
+        if not _pending["stats"] and not _pending["touches"]:
+            return
+    try:
+        with transaction() as conn:
+            _flush_pending(conn)
+    except sqlite3.Error:
+        pass   # statistics are best effort
+
+
+atexit.register(flush_cache_stats)
+
+
+def cache_get(cache_name, cache_key, ttl_seconds):
+    """Returns the cached value (decoded JSON) or None on a miss or an expired entry. Never writes."""
+    now = time.time()
+    row = get_connection().execute("SELECT response, created_at FROM LLM_Cache WHERE cache_name = ? AND cache_key = ?",
+                                   (cache_name, cache_key)).fetchone()
+    # An expired entry is left for the next cache_put of the same key (or LRU eviction) to replace
+    expired = row is not None and ttl_seconds and now - row[1] > ttl_seconds
+
+    with _pending_lock:
+        counters = _pending["stats"].setdefault(cache_name, [0, 0, 0])
+        if row is None or expired:
+            counters[1] += 1
+            counters[2] += 1 if expired else 0
+            return None
+        counters[0] += 1
+        touch = _pending["touches"].setdefault((cache_name, cache_key), [now, 0])
+        touch[0] = now
+        touch[1] += 1
+    return json.loads(row[0])
+
+
+def cache_put(cache_name, cache_key, value, max_entries):
+    """Stores a value and evicts the least recently used entries beyond max_entries."""
+    now = time.time()
+    with transaction() as conn:
+        # Buffered touches first, so the eviction below sees this process's recent hits
+        _flush_pending(conn)
+        conn.execute('''
+                     INSERT OR REPLACE INTO LLM_Cache (cache_name, cache_key, response, created_at, last_used_at)
+                     VALUES (?, ?, ?, ?, ?)
+                     ''', (cache_name, cache_key, json.dumps(value), now, now))
+
+        evicted = conn.execute('''
+                               DELETE FROM LLM_Cache
+                               WHERE cache_name = ?
+                                 AND cache_key IN (SELECT cache_key
+                                                   FROM LLM_Cache
+                                                   WHERE cache_name = ?
+                                                   ORDER BY last_used_at DESC
+                                                   LIMIT -1 OFFSET ?)
+                               ''', (cache_name, cache_name, max_entries)).rowcount
+        if evicted:
+            _bump_stats(conn, cache_name, evictions=evicted)
+
+
+def get_cache_stats(cache_name=None):
+    """Returns {cache_name: {hits, misses, expirations, evictions, entries, hit_rate}}."""
+    flush_cache_stats()
+    conn = get_connection()
+    query = '''
+            SELECT s.cache_name, s.hits, s.misses, s.expirations, s.evictions,
+                   (SELECT COUNT(*) FROM LLM_Cache c WHERE c.cache_name = s.cache_name)
+            FROM LLM_Cache_Stats s
+            '''
+    params = ()
+    if cache_name:
+        query += " WHERE s.cache_name = ?"
+        params = (cache_name,)
+    rows = conn.execute(query, params).fetchall()
+
+    stats = {}
+    for name, hits, misses, expirations, evictions, entries in rows:
+        lookups = hits + misses
+        stats[name] = {
+            "hits": hits, "misses": misses, "expirations": expirations, "evictions": evictions,
+            "entries": entries, "hit_rate": hits / lookups if lookups else 0.0,
+        }
+    return stats
+
+
+def clear_cache(cache_name=None):
+    """Deletes cached entries (one cache or all of them). Statistics are kept."""
+    conn = get_connection()
+    if cache_name:
+        conn.execute("DELETE FROM LLM_Cache WHERE cache_name = ?", (cache_name,))
+    else:
+        conn.execute("DELETE FROM LLM_Cache")
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import openai
+from openai import OpenAI, AsyncOpenAI
+from dotenv import load_dotenv
+import llm_transport
+from perf_tracing import span
+
+# ---------------------------------------------------------
+# LLM CLIENT LAYER
+# ---------------------------------------------------------
+# One place that talks to the chat-completion providers:
+# - one client per provider, created lazily and reused (keeps HTTP connections alive)
+# - explicit per-call timeouts
+# - jittered exponential backoff on 429 / 5xx / connection resets
+# - a process-wide semaphore that caps in-flight requests across all Streamlit sessions
+# - structured errors (LLMError.kind) so "the provider timed out" is not confused with "nothing parsed"
+# - a pluggable transport underneath (llm_transport.py: live / record / replay / simulated)
+# - a "completion" tracing span per call (provider, tokens, outcome; see perf_tracing.py)
+load_dotenv()
+
+PROVIDER_CONFIGS = {
+    'OLLAMA': {"base_url": "http://localhost:11434/v1", "api_key": "ollama", "model": "llama3"},
+    'OPENAI': {"base_url": None, "api_key_env": "OPENAI_API_KEY", "model": "gpt-4o-mini"},
+    'GEMINI': {"base_url": "https://generativelanguage.googleapis.com/v1beta/openai/",
+               "api_key_env": "GEMINI_API_KEY", "model": "gemini-2.5-flash"},
+}
+
+PROVIDER = os.getenv("LLM_PROVIDER", "GEMINI").upper()
+if PROVIDER not in PROVIDER_CONFIGS:
+    raise ValueError(f"Unknown LLM_PROVIDER: {PROVIDER!r} (expected one of {sorted(PROVIDER_CONFIGS)})")
+MODEL_NAME = PROVIDER_CONFIGS[PROVIDER]["model"]
+
+DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 60))
+MAX_RETRIES = 3
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", 8))
+
+# Error kinds worth retrying; timeouts are NOT retried so tail latency stays bounded
+RETRYABLE_KINDS = {"rate_limit", "server", "connection"}
+
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+_in_flight_count = 0
+_in_flight_lock = threading.Lock()
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """
+    A classified provider failure.
+    kind is one of: timeout, rate_limit, server, connection, auth, bad_request,
+    bad_response, overloaded, config, unknown.
+    """
+
+    def __init__(self, kind, message, provider=None, status_code=None):
+        super().__init__(message)
+        self.kind = kind
+        self.provider = provider
+        self.status_code = status_code
+
+    @property
+    def retryable(self):
+        return self.kind in RETRYABLE_KINDS
+
+    def __str__(self):
+        return f"[{self.kind}] {super().__str__()}"
+
+
+def classify_error(exc, provider=None):
+    """Maps an OpenAI SDK exception to an LLMError."""
+    if isinstance(exc, LLMError):
+        return exc
+    status = getattr(exc, "status_code", None)
+    if isinstance(exc, openai.APITimeoutError):
+        kind = "timeout"
+    elif isinstance(exc, openai.APIConnectionError):
+        kind = "connection"
+    elif isinstance(exc, openai.RateLimitError) or status == 429:
+        kind = "rate_limit"
+    elif isinstance(exc, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        kind = "auth"
+    elif isinstance(exc, openai.APIStatusError) and status and status >= 500:
+        kind = "server"
+    elif isinstance(exc, openai.APIStatusError):
+        kind = "bad_request"
+    else:
+        kind = "unknown"
+    return LLMError(kind, str(exc), provider=provider, status_code=status)
+
+
+def _client_kwargs(provider):
+    config = PROVIDER_CONFIGS[provider]
+    api_key = config.get("api_key") or os.getenv(config.get("api_key_env", ""))
+    if not api_key and not llm_transport.needs_api_key():
+        api_key = "offline"
+    if not api_key:
+        raise LLMError("config", f"No API key configured for {provider} ({config.get('api_key_env')})", provider)
+    kwargs = {"api_key": api_key, "timeout": DEFAULT_TIMEOUT_SECONDS, "max_retries": 0}
+    if config.get("base_url"):
+        kwargs["base_url"] = config["base_url"]
+    return kwargs
+
+
+def get_client(provider=None):
+    """Returns the shared sync client for a provider (created on first use)."""
+    provider = provider or PROVIDER
+    with _clients_lock:
+        if provider not in _clients:
+            _clients[provider] = llm_transport.wrap_client(OpenAI(**_client_kwargs(provider)), provider)
+        return _clients[provider]
+
+
+def get_async_client(provider=None):
+    """Returns the shared async client for a provider (created on first use)."""
+    provider = provider or PROVIDER
+    with _clients_lock:
+        if provider not in _async_clients:
+            _async_clients[provider] = llm_transport.wrap_client(
+                AsyncOpenAI(**_client_kwargs(provider)), provider, is_async=True)
+        return _async_clients[provider]
+
+
+def reset_clients():
+    """Drops the cached clients so the next call builds new ones (e.g. after switching transports)."""
+    with _clients_lock:
+        _clients.clear()
+        _async_clients.clear()
+
+
+def _backoff_delay(attempt, exc=None):
+    """Full-jitter exponential backoff, honouring a Retry-After header when the provider sends one."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), BACKOFF_MAX_SECONDS))
+        except ValueError:
+            pass
+    return delay
+
+
+def _acquire_slot(timeout, provider):
+    global _in_flight_count
+    if not _in_flight.acquire(timeout=timeout):
+        raise LLMError("overloaded", f"Too many LLM requests in flight (limit {MAX_IN_FLIGHT})", provider)
+    with _in_flight_lock:
+        _in_flight_count += 1
+
+
+def _release_slot():
+    global _in_flight_count
+    with _in_flight_lock:
+        _in_flight_count -= 1
+    _in_flight.release()
+
+
+def chat_completion(messages, provider=None, model=None, timeout=None, retries=MAX_RETRIES, **kwargs):
+    """
+    Sync chat completion with timeout, retries and the global concurrency cap.
+    Extra kwargs (temperature, response_format, ...) are passed to the API. Raises LLMError.
+    """
+    provider = provider or PROVIDER
+    model = model or PROVIDER_CONFIGS[provider]["model"]
+    timeout = timeout or DEFAULT_TIMEOUT_SECONDS
+
+    with span("completion", provider=provider) as s:
+        for attempt in range(retries + 1):
+            _acquire_slot(timeout, provider)
+            try:
+                response = get_client(provider).chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **kwargs)
+                s.add_tokens(getattr(response, "usage", None))
+                return response
+            except Exception as e:
+                error = classify_error(e, provider)
+                if not error.retryable or attempt == retries:
+                    raise error from e
+                delay = _backoff_delay(attempt, e)
+            finally:
+                _release_slot()
+            time.sleep(delay)
+
+
+def stream_chat_completion(messages, provider=None, model=None, timeout=None, retries=MAX_RETRIES, **kwargs):
+    """
+    Streaming chat completion: yields chunks. Retries happen only before the first chunk,
+    and the concurrency slot is held until the stream is fully consumed. Raises LLMError.
+    """
+    provider = provider or PROVIDER
+    model = model or PROVIDER_CONFIGS[provider]["model"]
+    timeout = timeout or DEFAULT_TIMEOUT_SECONDS
+
+    with span("completion", provider=provider) as s:
+        for attempt in range(retries + 1):
+            _acquire_slot(timeout, provider)
+            started = False
+            try:
+                stream = get_client(provider).chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, stream=True, **kwargs)
+                streamed_chars = 0
+                for chunk in stream:
+                    started = True
+                    if getattr(chunk, "usage", None) is not None:
+                        s.add_tokens(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        streamed_chars += len(chunk.choices[0].delta.content)
+                    yield chunk
+                # Most providers send no usage on streams: estimate (~4 characters per token)
+                if s.completion_tokens is None:
+                    s.set(completion_tokens=streamed_chars // 4,
+                          prompt_tokens=sum(len(str(m.get("content") or "")) for m in messages) // 4)
+                return
+            except Exception as e:
+                error = classify_error(e, provider)
+                if started or not error.retryable or attempt == retries:
+                    raise error from e
+                delay = _backoff_delay(attempt, e)
+            finally:
+                _release_slot()
+            time.sleep(delay)
+
+
+async def achat_completion(messages, provider=None, model=None, timeout=None, retries=MAX_RETRIES, **kwargs):
+    """Async twin of chat_completion. Shares the same process-wide concurrency cap. Raises LLMError."""
+    provider = provider or PROVIDER
+    model = model or PROVIDER_CONFIGS[provider]["model"]
+    timeout = timeout or DEFAULT_TIMEOUT_SECONDS
+
+    with span("completion", provider=provider) as s:
+        for attempt in range(retries + 1):
+            await asyncio.to_thread(_acquire_slot, timeout, provider)
+            try:
+                response = await get_async_client(provider).chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **kwargs)
+                s.add_tokens(getattr(response, "usage", None))
+                return response
+            except Exception as e:
+                error = classify_error(e, provider)
+                if not error.retryable or attempt == retries:
+                    raise error from e
+                delay = _backoff_delay(attempt, e)
+            finally:
+                _release_slot()
+            await asyncio.sleep(delay)
+
+
+def get_in_flight():
+    """Number of LLM requests currently holding a concurrency slot."""
+    with _in_flight_lock:
+        return _in_flight_count
@@ -0,0 +1,254 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from llm_client import chat_completion, stream_chat_completion, LLMError, PROVIDER, PROVIDER_CONFIGS
+from perf_tracing import span
+
+# ---------------------------------------------------------
+# LATENCY-AWARE PROVIDER ROUTER
+# ---------------------------------------------------------
+# Each call type ("parse", "insight") goes to the fastest healthy provider among
+# the configured ones, by rolling median latency over the last calls of that
+# type. Full completions are ranked on total latency and streams on time to the
+# first chunk (two separate windows: the numbers aren't comparable).
+# A provider that keeps failing (or times out) is skipped for a cooldown,
+# and a failed call fails over to the next provider before giving up.
+# Every decision is recorded as a "route" span in Perf_Metrics.
+#
+# Configuration (environment):
+#   LLM_PROVIDERS          providers the router may use, in preference order
+#                          (default: LLM_PROVIDER, then GEMINI/OPENAI when their API keys are set)
+#   LLM_PARSE_PROVIDERS    optional preference list for query parsing (e.g. "OLLAMA,GEMINI")
+#   LLM_INSIGHT_PROVIDERS  optional preference list for insight generation
+CALL_TYPES = ("parse", "insight")
+METRICS = ("total", "ttft")   # full completion latency / streamed time to first chunk
+
+WINDOW_SIZE = 50              # calls per (provider, call type) kept for the rolling stats
+MIN_SAMPLES = 5               # below this a provider's latency is "unknown"
+UNHEALTHY_ERROR_RATE = 0.5
+FAILURES_TO_TRIP = 3          # consecutive failures that take a provider out of rotation
+COOLDOWN_SECONDS = 30.0       # ... for this long, then one probe call is allowed
+EXPLORE_RATE = 0.05           # share of calls that re-measure a provider other than the fastest
+ROUTED_RETRIES = 1            # retries on the same provider before failing over
+
+# Failures worth trying elsewhere; a malformed request would fail on every provider
+FAILOVER_KINDS = {"timeout", "rate_limit", "server", "connection", "overloaded", "auth", "config"}
+
+
+def _env_list(name):
+    return [p.strip().upper() for p in os.getenv(name, "").split(",") if p.strip().upper() in PROVIDER_CONFIGS]
+
+
+def _default_providers():
+    # OLLAMA needs a local server, so it is only used when asked for
+    providers = [PROVIDER]
+    for provider in ("GEMINI", "OPENAI"):
+        if provider not in providers and os.getenv(PROVIDER_CONFIGS[provider]["api_key_env"]):
+            providers.append(provider)
+    return providers
+
+
+ROUTER_PROVIDERS = _env_list("LLM_PROVIDERS") or _default_providers()
+ROUTE_PREFERENCES = {
+    "parse": _env_list("LLM_PARSE_PROVIDERS"),
+    "insight": _env_list("LLM_INSIGHT_PROVIDERS"),
+}
+
+
+class ProviderHealth:
+    """
+    Rolling error window and circuit state for one (provider, call type), shared by streamed and
+    non-streamed calls, plus one latency window per metric (see METRICS).
+    """
+
+    def __init__(self):
+        self.calls = deque(maxlen=WINDOW_SIZE)   # (ok, error kind)
+        self.latencies = {metric: deque(maxlen=WINDOW_SIZE) for metric in METRICS}   # successful calls, ms
+        self.consecutive_failures = 0
+        self.open_until = 0.0                    # out of rotation until this monotonic time
+        self.last_error = None
+
+    def record(self, ok, latency_ms, kind=None, metric="total"):
+        self.calls.append((ok, kind))
+        if ok:
+            self.latencies[metric].append(latency_ms)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+            return
+        self.consecutive_failures += 1
+        self.last_error = kind
+        # Timeouts trip immediately: waiting out another one is exactly the tail latency to avoid
+        if kind == "timeout" or self.consecutive_failures >= FAILURES_TO_TRIP or \
+                (len(self.calls) >= MIN_SAMPLES and self.error_rate() >= UNHEALTHY_ERROR_RATE):
+            self.open_until = time.monotonic() + COOLDOWN_SECONDS
+
+    def error_rate(self):
+        return sum(1 for ok, _ in self.calls if not ok) / len(self.calls) if self.calls else 0.0
+
+    def latency_ms(self, metric="total"):
+        """Median latency of successful calls, or None while there are fewer than MIN_SAMPLES."""
+        samples = sorted(self.latencies[metric])
+        return samples[len(samples) // 2] if len(samples) >= MIN_SAMPLES else None
+
+    def healthy(self, now):
+        return now >= self.open_until
+
+    def snapshot(self, now):
+        stats = {"calls": len(self.calls), "error_rate": round(self.error_rate(), 3)}
+        for metric in METRICS:
+            samples = sorted(self.latencies[metric])
+            stats[f"{metric}_p50_ms"] = round(samples[len(samples) // 2], 1) if samples else None
+            stats[f"{metric}_p95_ms"] = \
+                round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1) if samples else None
+        return dict(stats, **{
+            "healthy": self.healthy(now),
+            "cooldown_s": round(max(0.0, self.open_until - now), 1),
+            "last_error": self.last_error,
+        })
+
+
+_health = {}
+_lock = threading.Lock()
+
+
+def _get_health(provider, call_type):
+    key = (provider, call_type)
+    if key not in _health:
+        _health[key] = ProviderHealth()
+    return _health[key]
+
+
+def candidate_providers(call_type):
+    """Providers a call type may use, in preference order (its own list if configured, else LLM_PROVIDERS)."""
+    return list(ROUTE_PREFERENCES.get(call_type) or ROUTER_PROVIDERS)
+
+
+def route_cache_scope(call_type):
+    """Cache-key component for a call type: its candidate providers and models (not the one that answered)."""
+    return "|".join(f"{p}:{PROVIDER_CONFIGS[p]['model']}" for p in candidate_providers(call_type))
+
+
+def rank_providers(call_type, metric="total"):
+    """
+    Order to try providers in: healthy before cooling down; among healthy ones the preferred
+    provider while its latency (for this metric) is still unknown, then the measured ones fastest
+    first, then the unmeasured rest. Occasionally an unmeasured or slower provider goes first so
+    its numbers stay current.
+    """
+    candidates = candidate_providers(call_type)
+    now = time.monotonic()
+    with _lock:
+        info = {p: (_get_health(p, call_type).healthy(now), _get_health(p, call_type).latency_ms(metric))
+                for p in candidates}
+
+    def sort_key(item):
+        position, provider = item
+        healthy, latency = info[provider]
+        return (not healthy, latency is None and position > 0, latency or 0.0, position)
+
+    ranked = [p for _, p in sorted(enumerate(candidates), key=sort_key)]
+    healthy_rest = [p for p in ranked[1:] if info[p][0]]
+    if healthy_rest and random.random() < EXPLORE_RATE:
+        explore = random.choice(healthy_rest)
+        ranked.remove(explore)
+        ranked.insert(0, explore)
+    return ranked
+
+
+def record_outcome(provider, call_type, ok, latency_ms, kind=None, metric="total"):
+    with _lock:
+        _get_health(provider, call_type).record(ok, latency_ms, kind, metric)
+
+
+def _describe(call_type, provider, failures):
+    failed = ", ".join(f"{p} {kind}" for p, kind in failures)
+    return f"{call_type} -> {provider}" + (f" (failover after {failed})" if failed else "")
+
+
+def route_completion(call_type, messages, timeout=None, route=None, **kwargs):
+    """
+    chat_completion on the best provider for call_type, failing over on provider errors.
+    If a route dict is passed it is filled with provider, failovers and latency_ms. Raises the last LLMError.
+    """
+    failures = []
+    with span("route") as s:
+        for provider in rank_providers(call_type):
+            start = time.perf_counter()
+            try:
+                response = chat_completion(messages, provider=provider, timeout=timeout,
+                                           retries=ROUTED_RETRIES, **kwargs)
+            except LLMError as e:
+                record_outcome(provider, call_type, False, (time.perf_counter() - start) * 1000, e.kind)
+                if e.kind not in FAILOVER_KINDS:
+                    raise
+                failures.append((provider, e.kind))
+                s.set(detail=_describe(call_type, "?", failures))
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+            record_outcome(provider, call_type, True, latency_ms)
+            s.set(provider=provider, detail=_describe(call_type, provider, failures))
+            if route is not None:
+                route.update({"provider": provider, "failovers": len(failures), "latency_ms": latency_ms})
+            return response
+        raise _exhausted(call_type, failures)
+
+
+def route_stream_completion(call_type, messages, timeout=None, route=None, **kwargs):
+    """
+    Streaming twin of route_completion: yields chunks. Fails over only before the first chunk.
+    Providers are ranked (and measured) on time to the first chunk, which is what route's
+    latency_ms holds (time to the end for a stream that sends no chunks at all).
+    """
+    failures = []
+    with span("route") as s:
+        for provider in rank_providers(call_type, metric="ttft"):
+            start = time.perf_counter()
+            started = False
+
+            def _started():
+                latency_ms = (time.perf_counter() - start) * 1000
+                record_outcome(provider, call_type, True, latency_ms, metric="ttft")
+                s.set(provider=provider, detail=_describe(call_type, provider, failures))
+                if route is not None:
+                    route.update({"provider": provider, "failovers": len(failures), "latency_ms": latency_ms})
+
+            try:
+                for chunk in stream_chat_completion(messages, provider=provider, timeout=timeout,
+                                                    retries=ROUTED_RETRIES, **kwargs):
+                    if not started:
+                        started = True
+                        _started()
+                    yield chunk
+                if not started:
+                    _started()
+                return
+            except LLMError as e:
+                record_outcome(provider, call_type, False, (time.perf_counter() - start) * 1000, e.kind, "ttft")
+                if started or e.kind not in FAILOVER_KINDS:
+                    raise
+                failures.append((provider, e.kind))
+                s.set(detail=_describe(call_type, "?", failures))
+        raise _exhausted(call_type, failures)
+
+
+def _exhausted(call_type, failures):
+    if not failures:
+        return LLMError("config", f"No LLM provider configured for {call_type}")
+    provider, kind = failures[-1]
+    tried = ", ".join(f"{p} ({k})" for p, k in failures)
+    return LLMError(kind, f"Every provider failed for {call_type}: {tried}", provider=provider)
+
+
+def get_router_stats():
+    """Per (call type, provider): rolling calls, error rate, p50/p95 total and ttft latency and circuit state."""
+    now = time.monotonic()
+    with _lock:
+        return [dict(call_type=call_type, provider=provider, **_get_health(provider, call_type).snapshot(now))
+                for call_type in CALL_TYPES for provider in candidate_providers(call_type)]
+
+
+def reset_router():
+    with _lock:
+        _health.clear()
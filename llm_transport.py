@@ -0,0 +1,337 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# ---------------------------------------------------------
+# PLUGGABLE LLM TRANSPORT (record / replay / simulated)
+# ---------------------------------------------------------
+# Sits under llm_client: get_client() hands out one of these instead of (or
+# wrapped around) the real OpenAI client, so timeouts, retries, the concurrency
+# cap and everything in discovery_engine run unchanged on an offline box.
+# - live:      the real provider (default)
+# - record:    the real provider, every request/response pair appended to a cassette (JSONL)
+# - replay:    responses served from the cassette; no network, no API key
+# - simulated: an in-process OpenAI-compatible stand-in with configurable latency,
+#              token rate and error rate
+# The client objects only implement chat.completions.create, which is all llm_client uses.
+TRANSPORT_MODES = ("live", "record", "replay", "simulated")
+TRANSPORT_MODE = os.getenv("LLM_TRANSPORT", "live").lower()
+CASSETTE_PATH = os.getenv("LLM_CASSETTE", "llm_cassette.jsonl")
+# Replay sleeps for the recorded latencies (and inter-chunk gaps) instead of answering instantly
+REPLAY_REALTIME = os.getenv("LLM_REPLAY_REALTIME", "0") == "1"
+
+# Request fields that identify a cassette entry (timeouts and the like are not part of the key)
+KEY_FIELDS = ("model", "messages", "stream", "temperature", "response_format", "max_tokens")
+
+
+class SimulatedProfile:
+    """
+    Latency and failure model for simulated mode.
+    Time to first token is lognormal around ttft_median_ms; the answer then streams at tokens_per_second.
+    error_rate of the calls fail before the first token with a kind drawn from error_kinds.
+    """
+
+    def __init__(self, ttft_median_ms=400.0, ttft_sigma=0.5, tokens_per_second=60.0, output_tokens=250,
+                 error_rate=0.0, error_kinds=None, json_reply=None, seed=None):
+        self.ttft_median_ms = ttft_median_ms
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.error_kinds = error_kinds or {"rate_limit": 0.5, "server": 0.3, "connection": 0.2}
+        self.json_reply = json_reply or '{"domains": ["Community Development"]}'
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(ttft_median_ms=float(os.getenv("LLM_SIM_TTFT_MS", 400)),
+                   ttft_sigma=float(os.getenv("LLM_SIM_TTFT_SIGMA", 0.5)),
+                   tokens_per_second=float(os.getenv("LLM_SIM_TOKENS_PER_SECOND", 60)),
+                   output_tokens=int(os.getenv("LLM_SIM_OUTPUT_TOKENS", 250)),
+                   error_rate=float(os.getenv("LLM_SIM_ERROR_RATE", 0)))
+
+    def sample(self):
+        """Returns (ttft seconds, output token count, error kind or None) for one call."""
+        with self.lock:
+            ttft = self.rng.lognormvariate(0, self.ttft_sigma) * self.ttft_median_ms / 1000
+            tokens = max(1, int(self.rng.gauss(self.output_tokens, self.output_tokens * 0.25)))
+            error = None
+            if self.rng.random() < self.error_rate:
+                kinds, weights = zip(*self.error_kinds.items())
+                error = self.rng.choices(kinds, weights=weights)[0]
+            return ttft, tokens, error
+
+
+_state = {"mode": TRANSPORT_MODE, "cassette": CASSETTE_PATH, "profile": None, "realtime": REPLAY_REALTIME}
+_stats = {"calls": 0, "recorded": 0, "replayed": 0, "replay_misses": 0, "simulated": 0, "simulated_errors": 0}
+_lock = threading.Lock()
+_cassettes = {}          # path -> {request key: [entries]}
+_replay_cursor = {}      # (path, request key) -> next entry index
+
+
+def configure_transport(mode, cassette_path=None, profile=None, realtime=None):
+    """
+    Switches the transport for every client created afterwards (llm_client drops its cached clients).
+    profile is a SimulatedProfile for simulated mode, or {provider: SimulatedProfile} to simulate
+    providers that behave differently; realtime replays the recorded latencies.
+    """
+    if mode not in TRANSPORT_MODES:
+        raise ValueError(f"Unknown LLM transport: {mode!r} (expected one of {TRANSPORT_MODES})")
+    import llm_client
+    with _lock:
+        _state["mode"] = mode
+        if cassette_path:
+            _state["cassette"] = cassette_path
+        if profile is not None:
+            _state["profile"] = profile
+        if realtime is not None:
+            _state["realtime"] = realtime
+        _cassettes.pop(_state["cassette"], None)
+        _replay_cursor.clear()
+    llm_client.reset_clients()
+
+
+def get_transport_mode():
+    return _state["mode"]
+
+
+def get_transport_stats():
+    with _lock:
+        return dict(_stats, mode=_state["mode"], cassette=_state["cassette"])
+
+
+def needs_api_key():
+    """Replay and simulated mode never reach a provider."""
+    return _state["mode"] in ("live", "record")
+
+
+def wrap_client(real_client, provider, is_async=False):
+    """Returns the client llm_client should use for a provider under the current transport mode."""
+    mode = _state["mode"]
+    if mode == "live":
+        return real_client
+    if mode == "record":
+        completions = _RecordingCompletions(real_client, provider, _state["cassette"])
+    elif mode == "replay":
+        completions = _ReplayCompletions(provider, _state["cassette"], _state["realtime"])
+    else:
+        profile = _state["profile"] = _state["profile"] or SimulatedProfile.from_env()
+        if isinstance(profile, dict):
+            profile = profile.get(provider) or SimulatedProfile.from_env()
+        completions = _SimulatedCompletions(provider, profile)
+    return _AsyncClient(completions) if is_async else _Client(completions)
+
+
+# ---------------------------------------------------------
+# CLIENT SHELLS
+# ---------------------------------------------------------
+class _Namespace:
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+
+class _Client:
+    """Looks like OpenAI(): client.chat.completions.create(...)."""
+
+    def __init__(self, completions):
+        self.chat = _Namespace(completions=_Namespace(create=completions.create))
+
+
+class _AsyncClient:
+    """Looks like AsyncOpenAI(): the blocking transport runs in a worker thread."""
+
+    def __init__(self, completions):
+        async def create(**kwargs):
+            if kwargs.get("stream"):
+                chunks = await asyncio.to_thread(lambda: list(completions.create(**kwargs)))
+                return _aiter(chunks)
+            return await asyncio.to_thread(completions.create, **kwargs)
+        self.chat = _Namespace(completions=_Namespace(create=create))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def request_key(kwargs):
+    """Stable hash of the fields that determine a reply."""
+    payload = {field: kwargs.get(field) for field in KEY_FIELDS}
+    payload["stream"] = bool(payload["stream"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _llm_error(kind, message, provider):
+    from llm_client import LLMError
+    return LLMError(kind, message, provider=provider)
+
+
+# ---------------------------------------------------------
+# RECORD
+# ---------------------------------------------------------
+class _RecordingCompletions:
+    def __init__(self, real_client, provider, path):
+        self.real = real_client
+        self.provider = provider
+        self.path = path
+
+    def create(self, **kwargs):
+        start = time.perf_counter()
+        entry = {"key": request_key(kwargs), "provider": self.provider,
+                 "request": {field: kwargs.get(field) for field in KEY_FIELDS if kwargs.get(field) is not None}}
+        try:
+            response = self.real.chat.completions.create(**kwargs)
+        except Exception as e:
+            from llm_client import classify_error
+            entry.update({"error": {"kind": classify_error(e, self.provider).kind, "message": str(e)},
+                          "elapsed_ms": (time.perf_counter() - start) * 1000})
+            self._append(entry)
+            raise
+        if kwargs.get("stream"):
+            return self._record_stream(response, entry, start)
+        entry.update({"response": response.model_dump(mode="json"),
+                      "elapsed_ms": (time.perf_counter() - start) * 1000})
+        self._append(entry)
+        return response
+
+    def _record_stream(self, stream, entry, start):
+        chunks = []
+        for chunk in stream:
+            chunks.append({"at_ms": (time.perf_counter() - start) * 1000, "chunk": chunk.model_dump(mode="json")})
+            yield chunk
+        # Only fully consumed streams are recorded
+        entry.update({"chunks": chunks, "elapsed_ms": (time.perf_counter() - start) * 1000})
+        self._append(entry)
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False)
+        with _lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            _stats["calls"] += 1
+            _stats["recorded"] += 1
+            _cassettes.pop(self.path, None)
+
+
+# ---------------------------------------------------------
+# REPLAY
+# ---------------------------------------------------------
+def _load_cassette(path):
+    """Cassette entries grouped by request key, in recording order (cached per path)."""
+    with _lock:
+        if path not in _cassettes:
+            entries = {}
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            entries.setdefault(entry["key"], []).append(entry)
+            _cassettes[path] = entries
+        return _cassettes[path]
+
+
+class _ReplayCompletions:
+    def __init__(self, provider, path, realtime):
+        self.provider = provider
+        self.path = path
+        self.realtime = realtime
+
+    def _next_entry(self, key):
+        entries = _load_cassette(self.path).get(key)
+        with _lock:
+            _stats["calls"] += 1
+            if not entries:
+                _stats["replay_misses"] += 1
+                return None
+            # Repeated identical requests cycle through the recorded replies
+            cursor = _replay_cursor.get((self.path, key), 0)
+            _replay_cursor[(self.path, key)] = cursor + 1
+            _stats["replayed"] += 1
+            return entries[cursor % len(entries)]
+
+    def create(self, **kwargs):
+        entry = self._next_entry(request_key(kwargs))
+        if entry is None:
+            raise _llm_error("config", f"No cassette entry for this request in {self.path}", self.provider)
+        if "error" in entry:
+            self._sleep(entry.get("elapsed_ms", 0))
+            raise _llm_error(entry["error"]["kind"], entry["error"]["message"], self.provider)
+        if kwargs.get("stream"):
+            return self._replay_stream(entry.get("chunks", []))
+        self._sleep(entry.get("elapsed_ms", 0))
+        return ChatCompletion.model_validate(entry["response"])
+
+    def _replay_stream(self, chunks):
+        previous_ms = 0.0
+        for item in chunks:
+            self._sleep(item["at_ms"] - previous_ms)
+            previous_ms = item["at_ms"]
+            yield ChatCompletionChunk.model_validate(item["chunk"])
+
+    def _sleep(self, ms):
+        if self.realtime and ms > 0:
+            time.sleep(ms / 1000)
+
+
+# ---------------------------------------------------------
+# SIMULATED
+# ---------------------------------------------------------
+FILLER_WORDS = ("These contacts could collaborate on community programs across campuses, pairing research "
+                "capacity with local partners and student organizers. ").split()
+
+
+def _estimate_tokens(messages):
+    return max(1, sum(len(str(m.get("content") or "")) for m in messages) // 4)
+
+
+class _SimulatedCompletions:
+    def __init__(self, provider, profile):
+        self.provider = provider
+        self.profile = profile
+
+    def create(self, model=None, messages=(), timeout=None, stream=False, response_format=None, **_kwargs):
+        ttft, tokens, error = self.profile.sample()
+        with _lock:
+            _stats["calls"] += 1
+            _stats["simulated"] += 1
+            if error:
+                _stats["simulated_errors"] += 1
+
+        if timeout and ttft > timeout:
+            time.sleep(timeout)
+            raise _llm_error("timeout", f"Simulated {self.provider} call timed out after {timeout}s", self.provider)
+        if error:
+            time.sleep(ttft)
+            raise _llm_error(error, f"Simulated {self.provider} {error} error", self.provider)
+
+        if (response_format or {}).get("type") == "json_object":
+            pieces = [self.profile.json_reply]
+        else:
+            pieces = [FILLER_WORDS[i % len(FILLER_WORDS)] + " " for i in range(tokens)]
+        meta = {"id": f"sim-{time.time_ns()}", "created": int(time.time()), "model": model or "simulated"}
+        usage = {"prompt_tokens": _estimate_tokens(messages), "completion_tokens": len(pieces),
+                 "total_tokens": _estimate_tokens(messages) + len(pieces)}
+
+        if stream:
+            return self._stream(pieces, ttft, meta)
+        time.sleep(ttft + len(pieces) / self.profile.tokens_per_second)
+        return ChatCompletion.model_validate(dict(meta, object="chat.completion", usage=usage, choices=[
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "".join(pieces)}}]))
+
+    def _stream(self, pieces, ttft, meta):
+        time.sleep(ttft)
+        gap = 1 / self.profile.tokens_per_second
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(gap)
+            yield ChatCompletionChunk.model_validate(dict(meta, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+        yield ChatCompletionChunk.model_validate(dict(meta, object="chat.completion.chunk", choices=[
+            {"index": 0, "delta": {}, "finish_reason": "stop"}]))
@@ -0,0 +1,287 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from contact_store import get_contacts_source_with_version
+from search_index import normalize_tag
+
+# ---------------------------------------------------------
+# CONTACT <-> DOMAIN <-> CAMPUS ADJACENCY GRAPH (network map)
+# ---------------------------------------------------------
+# The map used to regex-scan the whole table once per domain of the target on
+# every render. Instead, the bipartite adjacency lists are built once per data
+# version: contact -> domains, domain -> contacts, contact -> campus and
+# campus -> contacts, all as integer IDs. A neighbor lookup is O(degree) and
+# peers can be ranked by how many domains they share with the target.
+NODE_FIELDS = ["Contact Name", "Campus", "Role/Title", "Capabilities / Expertise"]
+
+
+def _clean(value):
+    return None if value is None or value != value else value  # value != value catches NaN
+
+
+def _split_domains(value):
+    """Raw 'Civic Domains' cell -> [(normalized key, display label)] in cell order, without duplicates."""
+    value = _clean(value)
+    if value is None:
+        return []
+    seen, out = set(), []
+    for part in str(value).split(","):
+        label = part.strip()
+        key = normalize_tag(label)
+        if key and key not in seen:
+            seen.add(key)
+            out.append((key, label))
+    return out
+
+
+class ContactGraph:
+    """Immutable adjacency lists for one data version. Contacts, domains and campuses are integer IDs."""
+
+    def __init__(self, df, version=None):
+        self.version = version
+        self.contact_ids = []       # contact index -> contact ID
+        self.contact_index = {}     # contact ID -> contact index
+        self.nodes = []             # contact index -> display fields (NODE_FIELDS)
+        self.domain_keys = []       # domain index -> normalized key
+        self.domain_labels = []     # domain index -> display label (first spelling seen)
+        self.domain_index = {}      # normalized key -> domain index
+        self.campus_labels = []
+        self.campus_index = {}
+        self.contact_domains = []   # contact index -> [domain index]
+        self.contact_campus = []    # contact index -> campus index or None
+        self.domain_contacts = []   # domain index -> [contact index]
+        self.campus_contacts = []   # campus index -> [contact index]
+
+        columns = [c for c in ["ID", "Civic Domains"] + NODE_FIELDS if c in df.columns]
+        for row in df[columns].to_dict("records"):
+            contact_id = row.get("ID")
+            if _clean(contact_id) is None or contact_id in self.contact_index:
+                continue
+            c = len(self.contact_ids)
+            self.contact_ids.append(contact_id)
+            self.contact_index[contact_id] = c
+            self.nodes.append({field: _clean(row.get(field)) for field in NODE_FIELDS})
+
+            domains = []
+            for key, label in _split_domains(row.get("Civic Domains")):
+                d = self.domain_index.get(key)
+                if d is None:
+                    d = self.domain_index[key] = len(self.domain_keys)
+                    self.domain_keys.append(key)
+                    self.domain_labels.append(label)
+                    self.domain_contacts.append([])
+                self.domain_contacts[d].append(c)
+                domains.append(d)
+            self.contact_domains.append(domains)
+
+            campus = _clean(row.get("Campus"))
+            campus = " ".join(str(campus).split()) if campus is not None else ""
+            if campus:
+                k = self.campus_index.get(campus)
+                if k is None:
+                    k = self.campus_index[campus] = len(self.campus_labels)
+                    self.campus_labels.append(campus)
+                    self.campus_contacts.append([])
+                self.campus_contacts[k].append(c)
+                self.contact_campus.append(k)
+            else:
+                self.contact_campus.append(None)
+
+    def node(self, contact_id):
+        """Display fields for a contact (name, campus, role, capabilities), or None."""
+        c = self.contact_index.get(contact_id)
+        return self.nodes[c] if c is not None else None
+
+    def domains_of(self, contact_id):
+        """Display labels of the contact's civic domains, in cell order."""
+        c = self.contact_index.get(contact_id)
+        return [self.domain_labels[d] for d in self.contact_domains[c]] if c is not None else []
+
+    def campus_of(self, contact_id):
+        c = self.contact_index.get(contact_id)
+        k = self.contact_campus[c] if c is not None else None
+        return self.campus_labels[k] if k is not None else None
+
+    def _shared_counts(self, c):
+        """Peer index -> number of domains shared with contact c (one pass over the target's domains)."""
+        counts = Counter()
+        for d in self.contact_domains[c]:
+            counts.update(self.domain_contacts[d])
+        counts.pop(c, None)
+        return counts
+
+    def peers_by_domain(self, contact_id, limit=20):
+        """
+        For each of the contact's domains: (domain label, [peer contact IDs]), peers ranked by how many
+        domains they share with the contact (ties keep table order), at most `limit` per domain.
+        """
+        c = self.contact_index.get(contact_id)
+        if c is None:
+            return []
+        shared = self._shared_counts(c)
+        out = []
+        for d in self.contact_domains[c]:
+            members = [p for p in self.domain_contacts[d] if p != c]
+            members.sort(key=lambda p: -shared[p])  # stable: equal scores stay in table order
+            out.append((self.domain_labels[d], [self.contact_ids[p] for p in members[:limit]]))
+        return out
+
+    def ranked_peers(self, contact_id, limit=20):
+        """[(peer contact ID, shared domain count, [shared domain labels])], most shared domains first."""
+        c = self.contact_index.get(contact_id)
+        if c is None:
+            return []
+        target_domains = set(self.contact_domains[c])
+        top = sorted(self._shared_counts(c).items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [(self.contact_ids[p], n,
+                 [self.domain_labels[d] for d in self.contact_domains[p] if d in target_domains])
+                for p, n in top]
+
+    def campus_peers(self, contact_id):
+        """Contact IDs on the same campus (excluding the contact)."""
+        c = self.contact_index.get(contact_id)
+        k = self.contact_campus[c] if c is not None else None
+        return [self.contact_ids[p] for p in self.campus_contacts[k] if p != c] if k is not None else []
+
+
+_graph = {"graph": None}
+_graph_lock = threading.Lock()
+
+
+def get_contact_graph():
+    """Returns the adjacency graph for the current contact snapshot, rebuilding it only when the data changed."""
+    df, version = get_contacts_source_with_version()
+    with _graph_lock:
+        graph = _graph["graph"]
+        if graph is None or graph.version != version:
+            graph = _graph["graph"] = ContactGraph(df, version)
+        return graph
+
+
+# ---------------------------------------------------------
+# IN-MEMORY MAP RENDERING (LRU per contact, view and data version)
+# ---------------------------------------------------------
+# pyvis HTML is generated as a string (no shared network_map.html on disk, so
+# concurrent sessions can't overwrite each other's maps) and cached, so going
+# back to a contact or toggling between the two views is a dictionary lookup.
+MAP_CACHE_MAX_ENTRIES = 128
+MAP_MODES = ("ecosystem", "direct")
+ECOSYSTEM_PEERS_PER_DOMAIN = 20   # limit to prevent hairball
+DIRECT_PEERS_PER_DOMAIN = 15
+
+_map_cache = OrderedDict()
+_map_cache_lock = threading.Lock()
+_map_stats = {"hits": 0, "misses": 0, "evictions": 0, "last_render_ms": 0.0}
+
+
+def _peer_node(graph, peer_id):
+    node = graph.node(peer_id)
+    peer_name = str(node['Contact Name'] or 'Unknown')
+    peer_campus = str(node['Campus'] or 'Unknown')
+    hover_text = f"Role: {node['Role/Title'] or 'Unknown'}\nCapabilities: {node['Capabilities / Expertise'] or 'Unknown'}"
+    return f"{peer_name} ({peer_campus})", peer_name, peer_campus, hover_text
+
+
+def _build_network(graph, target_id, mode):
+    from pyvis.network import Network
+
+    net = Network(height='600px', width='100%', bgcolor='#ffffff', font_color='#000000')
+    target = graph.node(target_id)
+    target_name = str(target['Contact Name'] or 'Unknown')
+    target_campus = str(target['Campus'] or 'Unknown')
+
+    # --- MODE 1: ECOSYSTEM VIEW (Focus-Centric) ---
+    if mode == "ecosystem":
+        added_nodes = set()
+
+        # The Target Person (Massive, distinct color)
+        target_node_id = f"TARGET_{target_id}"
+        net.add_node(target_node_id, label=target_name, color='#FFD700', size=40, title="🌟 CURRENTLY VIEWING 🌟")
+        added_nodes.add(target_node_id)
+
+        # Peers sharing the most domains with the target come first
+        for domain, peer_ids in graph.peers_by_domain(target_id, limit=ECOSYSTEM_PEERS_PER_DOMAIN):
+            # Central Domain Nodes
+            if domain not in added_nodes:
+                net.add_node(domain, label=domain, color='#9C27B0', size=35, title="Civic Focus")
+                added_nodes.add(domain)
+
+            # Connect Target to Domain
+            net.add_edge(target_node_id, domain, color='#FFD700', value=3)
+
+            for peer_id in peer_ids:
+                node_id, peer_name, peer_campus, hover_text = _peer_node(graph, peer_id)
+
+                # Add Peer Node
+                if node_id not in added_nodes:
+                    net.add_node(node_id, label=peer_name, color='#2196F3', size=15, title=hover_text)
+                    added_nodes.add(node_id)
+
+                # Add Campus Node
+                if peer_campus not in added_nodes:
+                    net.add_node(peer_campus, label=peer_campus, color='#4CAF50', size=25, title="Campus")
+                    added_nodes.add(peer_campus)
+
+                # Link: Domain -> Campus -> Person
+                net.add_edge(domain, peer_campus, color='#e0e0e0')
+                net.add_edge(peer_campus, node_id, color='#e0e0e0')
+
+    # --- MODE 2: DIRECT NETWORK (Person-Centric) ---
+    else:
+        net.add_node(target_name, label=target_name, color='#FF5722', size=35, title="Focus Contact")
+        net.add_node(target_campus, label=target_campus, color='#4CAF50', size=25, title="Home Campus")
+        net.add_edge(target_name, target_campus, color='#cccccc')
+
+        for domain, peer_ids in graph.peers_by_domain(target_id, limit=DIRECT_PEERS_PER_DOMAIN):
+            net.add_node(domain, label=domain, color='#9C27B0', size=20)
+            net.add_edge(target_name, domain, color='#cccccc')
+
+            for peer_id in peer_ids:
+                node_id, peer_name, _, hover_text = _peer_node(graph, peer_id)
+                net.add_node(node_id, label=peer_name, color='#2196F3', size=15, title=hover_text)
+                net.add_edge(domain, node_id, color='#e0e0e0')
+
+    net.repulsion(node_distance=150, central_gravity=0.05, spring_length=150, spring_strength=0.05)
+    return net
+
+
+def render_network_map(target_id, mode="ecosystem"):
+    """Returns the pyvis HTML for a contact's map ('ecosystem' or 'direct'), from the LRU cache when possible."""
+    if mode not in MAP_MODES:
+        raise ValueError(f"Unknown map mode: {mode!r} (expected one of {MAP_MODES})")
+    graph = get_contact_graph()
+    if graph.node(target_id) is None:
+        raise KeyError(f"Unknown contact: {target_id!r}")
+
+    key = (target_id, mode, graph.version)
+    with _map_cache_lock:
+        html = _map_cache.get(key)
+        if html is not None:
+            _map_cache.move_to_end(key)
+            _map_stats["hits"] += 1
+            return html
+        _map_stats["misses"] += 1
+
+    start = time.perf_counter()
+    html = _build_network(graph, target_id, mode).generate_html()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    with _map_cache_lock:
+        _map_stats["last_render_ms"] = elapsed_ms
+        _map_cache[key] = html
+        _map_cache.move_to_end(key)
+        while len(_map_cache) > MAP_CACHE_MAX_ENTRIES:
+            _map_cache.popitem(last=False)
+            _map_stats["evictions"] += 1
+    return html
+
+
+def get_map_cache_stats():
+    """Hit/miss/eviction counters plus the current number of cached maps."""
+    with _map_cache_lock:
+        return dict(_map_stats, entries=len(_map_cache))
+
+
+def clear_map_cache():
+    with _map_cache_lock:
+        _map_cache.clear()
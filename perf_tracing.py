@@ -0,0 +1,194 @@
+import contextvars
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+from db_manager import get_connection
+from batch_writer import BatchWriter
+
+# ---------------------------------------------------------
+# PER-STAGE TRACING SPANS (Perf_Metrics)
+# ---------------------------------------------------------
+# `with span("parse") as s:` times one stage of a copilot answer and can carry
+# the provider, prompt/completion tokens, matched rows and the cache outcome.
+# Finished spans are queued in memory and written in batches by a background
+# thread (the same BatchWriter as the search log), so tracing never adds
+# a database write to the answer path. All spans of one question share a trace_id.
+STAGES = ("log_search", "parse", "filter", "context", "completion", "insight", "map_reduce", "render")
+TRACING_ENABLED = os.getenv("PERF_TRACING", "1") != "0"
+
+FLUSH_BATCH_SIZE = 200
+FLUSH_INTERVAL_SECONDS = 2.0
+MAX_QUEUE_SIZE = 20000        # beyond this the oldest spans are dropped
+RETENTION_DAYS = 14
+PRUNE_EVERY_FLUSHES = 100
+
+SPAN_FIELDS = ("provider", "prompt_tokens", "completion_tokens", "rows", "cache", "status", "detail")
+
+_trace_id = contextvars.ContextVar("perf_trace_id", default=None)
+_current_stage = contextvars.ContextVar("perf_stage", default=None)
+
+
+class Span:
+    """One timed stage. Attributes can be filled in while the stage runs (see SPAN_FIELDS)."""
+
+    __slots__ = ("stage", "trace_id", "started_at", "duration_ms") + SPAN_FIELDS
+
+    def __init__(self, stage, trace_id=None, **attrs):
+        self.stage = stage
+        self.trace_id = trace_id
+        self.started_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        self.duration_ms = 0.0
+        for field in SPAN_FIELDS:
+            setattr(self, field, None)
+        self.status = "ok"
+        self.set(**attrs)
+
+    def set(self, **attrs):
+        for field, value in attrs.items():
+            if field not in SPAN_FIELDS:
+                raise AttributeError(f"Unknown span field: {field}")
+            setattr(self, field, value)
+        return self
+
+    def add_tokens(self, usage):
+        """Copies prompt/completion token counts from an OpenAI usage object (if the provider sent one)."""
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+            self.completion_tokens = getattr(usage, "completion_tokens", None)
+        return self
+
+    def as_row(self):
+        return (self.trace_id, self.stage, self.provider, self.started_at, round(self.duration_ms, 3),
+                self.prompt_tokens, self.completion_tokens, self.rows, self.cache, self.status, self.detail)
+
+
+def new_trace():
+    """Starts a new trace (one copilot question) in the current context and returns its ID."""
+    trace_id = uuid.uuid4().hex[:16]
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def get_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Times the enclosed block as one stage. An exception marks the span with its LLMError kind
+    (or exception type) and is re-raised. Nested spans get the enclosing stage as their detail.
+    """
+    s = Span(stage, _trace_id.get(), **attrs)
+    if s.detail is None:
+        s.detail = _current_stage.get()
+    token = _current_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.status = getattr(e, "kind", None) or type(e).__name__
+        raise
+    finally:
+        s.duration_ms = (time.perf_counter() - start) * 1000
+        try:
+            _current_stage.reset(token)
+        except ValueError:
+            pass   # a generator finished in a different context than it started in
+        record_span(s)
+
+
+def record_span(s):
+    """Queues a finished span for the background writer."""
+    if TRACING_ENABLED:
+        _writer.enqueue(s.as_row())
+
+
+# --- Background writer ---
+def _insert_spans(conn, rows):
+    conn.executemany('''
+                     INSERT INTO Perf_Metrics (trace_id, stage, provider, started_at, duration_ms,
+                                               prompt_tokens, completion_tokens, rows, cache, status, detail)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                     ''', rows)
+    if (_writer.stats()["flushes"] + 1) % PRUNE_EVERY_FLUSHES == 0:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("DELETE FROM Perf_Metrics WHERE started_at < ?", (cutoff,))
+
+
+# Metrics are best effort: a failed batch is counted and dropped, never retried on the answer path
+_writer = BatchWriter("perf-metrics-writer", _insert_spans, batch_size=FLUSH_BATCH_SIZE,
+                      flush_interval=FLUSH_INTERVAL_SECONDS, max_queue_size=MAX_QUEUE_SIZE)
+
+
+def flush():
+    """Writes every queued span now. Returns the number written."""
+    return _writer.flush()
+
+
+def shutdown(timeout=5.0):
+    _writer.shutdown(timeout)
+
+
+def get_tracing_stats():
+    return _writer.stats()
+
+
+# ---------------------------------------------------------
+# REPORTING (admin view)
+# ---------------------------------------------------------
+def get_stage_latency(since_hours=24, by_provider=True):
+    """
+    Latency percentiles per stage (and provider) over the last since_hours:
+    count, p50/p95/p99/max ms, error count, cache hit rate and mean tokens/rows.
+    """
+    flush()
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=since_hours)).strftime("%Y-%m-%d %H:%M:%S")
+    df = pd.read_sql_query('''
+                           SELECT stage, COALESCE(provider, '') AS provider, duration_ms, prompt_tokens,
+                                  completion_tokens, rows, cache, status
+                           FROM Perf_Metrics
+                           WHERE started_at >= ?
+                           ''', get_connection(), params=(cutoff,))
+    keys = ["stage", "provider"] if by_provider else ["stage"]
+    if df.empty:
+        return pd.DataFrame(columns=keys + ["count", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+
+    df["error"] = df["status"] != "ok"
+    df["cache_hit"] = df["cache"].isin(["hit", "local"]).astype(float).where(df["cache"].notna())
+    grouped = df.groupby(keys)
+    summary = grouped["duration_ms"].quantile([0.5, 0.95, 0.99]).unstack()
+    summary.columns = ["p50_ms", "p95_ms", "p99_ms"]
+    summary.insert(0, "count", grouped.size())
+    summary["max_ms"] = grouped["duration_ms"].max()
+    summary["errors"] = grouped["error"].sum()
+    summary["cache_hit_rate"] = grouped["cache_hit"].mean()
+    summary["avg_prompt_tokens"] = grouped["prompt_tokens"].mean()
+    summary["avg_completion_tokens"] = grouped["completion_tokens"].mean()
+    summary["avg_rows"] = grouped["rows"].mean()
+
+    order = {stage: i for i, stage in enumerate(STAGES)}
+    summary = summary.reset_index()
+    summary = summary.sort_values(keys, key=lambda col: col.map(order) if col.name == "stage" else col)
+    return summary.round(1).reset_index(drop=True)
+
+
+def get_recent_traces(limit=20):
+    """The spans of the last `limit` traces, newest trace first."""
+    flush()
+    return pd.read_sql_query('''
+                             WITH recent AS (SELECT trace_id, MAX(id) AS last_id
+                                             FROM Perf_Metrics
+                                             WHERE trace_id IS NOT NULL
+                                             GROUP BY trace_id
+                                             ORDER BY last_id DESC
+                                             LIMIT ?)
+                             SELECT p.trace_id, p.stage, p.provider, p.started_at, p.duration_ms, p.prompt_tokens,
+                                    p.completion_tokens, p.rows, p.cache, p.status, p.detail
+                             FROM Perf_Metrics p
+                             JOIN recent ON recent.trace_id = p.trace_id
+                             ORDER BY recent.last_id DESC, p.id
+                             ''', get_connection(), params=(limit,))
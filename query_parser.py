@@ -0,0 +1,148 @@
+import re
+import threading
+from campus_map import CUNY_MAP
+from contact_store import get_contacts_source_with_version
+
+# ---------------------------------------------------------
+# LOCAL FAST-PATH QUERY PARSER
+# ---------------------------------------------------------
+# Most copilot questions just name a campus, a topic or a person
+# ("Who does food security at Lehman?"). This parser answers those from a
+# vocabulary built out of the data itself, so the LLM is only needed for
+# questions it can't cover with confidence.
+
+# Below this confidence parse_discovery_query falls back to the LLM
+LOCAL_PARSE_MIN_CONFIDENCE = 0.75
+
+# Longest phrase (in words) we try to match
+MAX_PHRASE_WORDS = 6
+
+# When one phrase could mean several things, the earlier category wins
+CATEGORY_PRIORITY = ["names", "campus", "domains", "communities"]
+
+# Question scaffolding that doesn't need to be "understood" to answer the query
+FILLER_WORDS = {
+    "a", "about", "all", "an", "and", "any", "anyone", "are", "at", "be", "by", "can", "connect", "contact",
+    "contacts", "do", "does", "doing", "explain", "find", "for", "from", "give", "has", "have", "help", "here",
+    "i", "in", "involved", "is", "know", "list", "me", "more", "my", "of", "on", "or", "people", "person",
+    "please", "show", "someone", "tell", "that", "the", "there", "to", "what", "whats", "who", "whos", "with",
+    "work", "working", "works", "which", "where", "cuny", "campus", "college", "focus", "focused", "related",
+}
+
+# Aliases that are too ambiguous to stand for a campus on their own (boroughs, generic words)
+AMBIGUOUS_CAMPUS_ALIASES = {"bronx", "brooklyn", "manhattan", "staten island", "city", "cuny", "school", "graduate"}
+
+# Tags too generic to be treated as a topic match
+GENERIC_TAGS = {"other", "none", "n a", "na", "general", "general public", "unknown"}
+
+
+def normalize_text(text):
+    """Lowercases, drops possessives and punctuation, and turns '&' into 'and'."""
+    text = str(text).lower().replace("&", " and ")
+    text = re.sub(r"[’']s\b", "", text)
+    text = re.sub(r"[^a-z0-9]+", " ", text)
+    return " ".join(text.split())
+
+
+def _campus_aliases(name):
+    """'Lehman College' -> {'lehman college', 'lehman'}; 'LaGuardia CC' -> {'laguardia cc', 'laguardia'}."""
+    full = normalize_text(name)
+    aliases = {full}
+    short = re.sub(r"^the ", "", full)
+    short = re.sub(r" (community college|college|cc)$", "", short)
+    if short and short not in AMBIGUOUS_CAMPUS_ALIASES:
+        aliases.add(short)
+    return aliases
+
+
+def build_vocabulary(df):
+    """Builds {normalized phrase: (category, value to emit)} from CUNY_MAP and the contact table."""
+    candidates = {category: {} for category in CATEGORY_PRIORITY}
+
+    # Campuses: every raw spelling that maps to the same college is emitted together,
+    # so "city tech" also finds rows stored as "NYC College of Technology" (or already-canonical
+    # rows written by the importer as "New York City College of Technology")
+    raw_by_clean = {}
+    for raw, clean in CUNY_MAP.items():
+        raw_by_clean.setdefault(clean, {clean}).add(raw)
+    campus_values = set(df["Campus"].dropna().astype(str).str.strip()) if "Campus" in df.columns else set()
+    for raw in campus_values | set(CUNY_MAP):
+        clean = CUNY_MAP.get(raw)
+        spellings = sorted(raw_by_clean[clean]) if clean else [raw]
+        for name in {raw, clean} - {None}:
+            for alias in _campus_aliases(name):
+                candidates["campus"][alias] = spellings
+
+    # Topics and communities: the individual comma-separated tags
+    for category, col in (("domains", "Civic Domains"), ("communities", "Communities Served")):
+        if col not in df.columns:
+            continue
+        for cell in df[col].dropna().astype(str):
+            for tag in cell.split(","):
+                tag = " ".join(tag.split())
+                phrase = normalize_text(tag)
+                if len(phrase) > 2 and phrase not in GENERIC_TAGS:
+                    candidates[category][phrase] = [tag]
+
+    # People: full names only (single words are too easy to hit by accident)
+    if "Contact Name" in df.columns:
+        for name in df["Contact Name"].dropna().astype(str):
+            phrase = normalize_text(name)
+            if len(phrase.split()) >= 2:
+                candidates["names"][phrase] = [name.strip()]
+
+    vocabulary = {}
+    for category in reversed(CATEGORY_PRIORITY):
+        for phrase, values in candidates[category].items():
+            vocabulary[phrase] = (category, values)
+    return vocabulary
+
+
+_vocab = {"version": None, "phrases": {}}
+_vocab_lock = threading.Lock()
+
+
+def get_vocabulary():
+    """Returns the phrase vocabulary, rebuilt only when the contact snapshot changes."""
+    df, version = get_contacts_source_with_version()
+    with _vocab_lock:
+        if _vocab["version"] != version or not _vocab["phrases"]:
+            _vocab["phrases"] = build_vocabulary(df)
+            _vocab["version"] = version
+        return _vocab["phrases"]
+
+
+def parse_query_locally(query, vocabulary=None):
+    """
+    Greedy longest-phrase match of the query against the vocabulary.
+    Returns (filters, confidence) where filters has the same shape as the LLM parse
+    and confidence is the share of meaningful words that were recognised.
+    """
+    if vocabulary is None:
+        vocabulary = get_vocabulary()
+
+    words = normalize_text(query).split()
+    filters = {}
+    covered = set()
+
+    i = 0
+    while i < len(words):
+        for size in range(min(MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+            phrase = " ".join(words[i:i + size])
+            match = vocabulary.get(phrase)
+            if match and not (size == 1 and phrase in FILLER_WORDS):
+                category, values = match
+                for value in values:
+                    if value not in filters.setdefault(category, []):
+                        filters[category].append(value)
+                covered.update(range(i, i + size))
+                i += size
+                break
+        else:
+            i += 1
+
+    meaningful = [idx for idx, word in enumerate(words) if word not in FILLER_WORDS or idx in covered]
+    if not filters or not meaningful:
+        return {}, 0.0
+    confidence = len(covered & set(meaningful)) / len(meaningful)
+    return filters, confidence
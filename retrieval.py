@@ -0,0 +1,113 @@
+import re
+from query_parser import FILLER_WORDS
+from search_index import search_contacts, rank_by_hits
+from contact_snapshot import narrow_to_ids
+from perf_tracing import span
+
+# ---------------------------------------------------------
+# RANKED, TOKEN-BUDGETED RETRIEVAL (Deep Search)
+# ---------------------------------------------------------
+# Instead of pasting the whole directory into the prompt, contacts are ranked
+# against the question (FTS5 BM25 over name, domains, notes and affiliation)
+# and added to the context only until the token budget is spent. Prompt size,
+# latency and cost are therefore bounded no matter how big the table grows.
+# Only as many ranked rows as could possibly fit are fetched from FTS5.
+DEEP_SEARCH_TOKEN_BUDGET = 12000
+RECORD_BATCH_SIZE = 64   # rows converted to dicts at a time while filling a budget
+
+# Rough chars-per-token ratio for English text; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (no tokenizer dependency)."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _clean(value, default=''):
+    return default if value is None or value != value else value  # value != value catches NaN
+
+
+def format_contact_block(row):
+    """Formats one contact (a dict-like row) the way the insight prompt expects it."""
+    return f"""
+        ---
+        CONTACT: {_clean(row.get('Contact Name'), 'Unknown')} ({_clean(row.get('Campus'), 'Unknown')})
+        ROLE: {_clean(row.get('Role/Title'))} | {_clean(row.get('Program/Org Affiliation'))}
+        RAW NOTE: "{_clean(row.get('Notes / Insights'))}"
+        CHALLENGES: "{_clean(row.get('Needs / Challenges'), 'N/A')}"
+        TAGS: {_clean(row.get('Civic Domains'))}
+        """
+
+
+# The smallest block a contact can produce (every field empty): no budget fits more rows than
+# token_budget // MIN_BLOCK_TOKENS + 1, so fetching that many ranked rows never changes the selection
+MIN_BLOCK_TOKENS = estimate_tokens(format_contact_block({
+    col: "" for col in ("Contact Name", "Campus", "Role/Title", "Program/Org Affiliation", "Notes / Insights",
+                        "Needs / Challenges", "Civic Domains")}))
+
+
+def max_contacts_for_budget(token_budget):
+    return token_budget // MIN_BLOCK_TOKENS + 1 if token_budget else None
+
+
+def iter_records(matches):
+    """Rows as dicts, converted a batch at a time so a caller that stops early skips the rest."""
+    for start in range(0, len(matches), RECORD_BATCH_SIZE):
+        yield from matches.iloc[start:start + RECORD_BATCH_SIZE].to_dict("records")
+
+
+def build_context_text(matches, token_budget=None):
+    """
+    Joins contact blocks in the given (ranked) order, stopping before the budget is exceeded.
+    Returns (context_text, contacts_used, estimated_tokens).
+    """
+    blocks = []
+    used_tokens = 0
+    for row in iter_records(matches):
+        block = format_contact_block(row)
+        block_tokens = estimate_tokens(block)
+        if token_budget and blocks and used_tokens + block_tokens > token_budget:
+            break
+        blocks.append(block)
+        used_tokens += block_tokens
+    return "".join(blocks), len(blocks), used_tokens
+
+
+def shard_contacts(matches, shard_token_budget):
+    """Splits the contacts into consecutive context shards of at most shard_token_budget tokens each."""
+    shards = []
+    blocks, used_tokens = [], 0
+    for row in matches.to_dict("records"):
+        block = format_contact_block(row)
+        block_tokens = estimate_tokens(block)
+        if blocks and used_tokens + block_tokens > shard_token_budget:
+            shards.append("".join(blocks))
+            blocks, used_tokens = [], 0
+        blocks.append(block)
+        used_tokens += block_tokens
+    if blocks:
+        shards.append("".join(blocks))
+    return shards
+
+
+def rank_contacts(query, df, limit=None):
+    """Ranks contacts by BM25 relevance to any meaningful word of the question (best `limit` only, if given)."""
+    words = [w for w in re.findall(r"\w+", str(query).lower()) if len(w) > 2 and w not in FILLER_WORDS]
+    if not words:
+        return narrow_to_ids(df, []).iloc[0:0]
+    return rank_by_hits(df, search_contacts(words, limit=limit))
+
+
+def retrieve_for_insight(query, df, token_budget=DEEP_SEARCH_TOKEN_BUDGET):
+    """
+    Picks the most relevant contacts that fit in the token budget.
+    Returns (selected_df, stats) where stats has candidates (ranked rows considered), selected, tokens
+    and the built context, which generate/stream_civic_insight accept so the prompt isn't rebuilt.
+    """
+    ranked = rank_contacts(query, df, limit=max_contacts_for_budget(token_budget))
+    with span("context") as s:
+        context = build_context_text(ranked, token_budget)
+        s.set(rows=context[1], prompt_tokens=context[2])
+    stats = {"candidates": len(ranked), "selected": context[1], "tokens": context[2], "context": context}
+    return ranked.head(context[1]), stats
@@ -0,0 +1,294 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+from db_manager import get_connection, get_data_version, get_changed_contact_ids, transaction
+from contact_snapshot import narrow_to_ids
+
+# ---------------------------------------------------------
+# FULL-TEXT SEARCH (SQLite FTS5)
+# ---------------------------------------------------------
+# Contacts_FTS is kept in sync by triggers on Network_Contacts (see db_manager).
+# Column order in the index: contact_id, name, domains, notes, affiliation
+FTS_COLUMNS = ["name", "domains", "notes", "affiliation"]
+
+# BM25 column weights: a hit in the name matters more than a hit deep in the notes
+BM25_WEIGHTS = (0.0, 10.0, 4.0, 1.0, 2.0)
+
+
+def build_match_expression(text):
+    """Turns free text into a safe FTS5 prefix query: every word must match (quoted, so no syntax errors)."""
+    tokens = re.findall(r"\w+", str(text).lower())
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def search_contacts(terms, columns=None, limit=None):
+    """
+    Ranks contacts against one or more search phrases using BM25.
+    Phrases are OR'ed together, words inside a phrase are AND'ed and prefix-matched.
+    Returns a DataFrame with ID, score (lower is better) and a highlighted snippet.
+    """
+    if isinstance(terms, str):
+        terms = [terms]
+
+    phrases = [build_match_expression(t) for t in terms]
+    phrases = [f"({p})" for p in phrases if p]
+    if not phrases:
+        return pd.DataFrame(columns=["ID", "score", "snippet"])
+
+    match = " OR ".join(phrases)
+    if columns:
+        match = "{" + " ".join(columns) + "} : (" + match + ")"
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    query = f"""
+            SELECT contact_id AS ID,
+                   bm25(Contacts_FTS, {weights}) AS score,
+                   snippet(Contacts_FTS, -1, '**', '**', '…', 12) AS snippet
+            FROM Contacts_FTS
+            WHERE Contacts_FTS MATCH ?
+            ORDER BY score
+            """
+    params = [match]
+    if limit:
+        query += " LIMIT ?"
+        params.append(int(limit))
+
+    return pd.read_sql_query(query, get_connection(), params=params)
+
+
+def rank_by_hits(df, hits):
+    """Keeps only the rows of df that appear in hits, in relevance order, with the snippet attached."""
+    df = narrow_to_ids(df, hits["ID"])
+    if hits.empty:
+        return df.iloc[0:0]
+    ranked = df.merge(hits[["ID", "score", "snippet"]], on="ID", how="inner")
+    return ranked.sort_values("score", kind="stable").reset_index(drop=True)
+
+
+# ---------------------------------------------------------
+# INVERTED TAG INDEX (category filters)
+# ---------------------------------------------------------
+# Comma-separated columns are split and normalized ONCE. Each tag maps to a
+# bitmap (a Python int, one bit per contact) so a category filter becomes
+# OR within a category and AND across categories instead of a regex scan.
+# The shared index is never modified once published: changes are applied to a
+# copy that replaces it, so sessions can match without taking the lock.
+# Column -> is it a comma-separated multi-valued column?
+TAG_COLUMNS = {
+    "Civic Domains": True,
+    "Communities Served": True,
+    "Capabilities / Expertise": True,
+    "Campus": False,
+}
+
+# If more than this share of contacts changed, a full rebuild is cheaper than patching
+FULL_REBUILD_FRACTION = 0.2
+
+
+def normalize_tag(value):
+    """Lowercases and collapses whitespace so 'Public  Health ' and 'public health' are one tag."""
+    return " ".join(str(value).lower().split())
+
+
+def split_tags(value, multi_valued=True):
+    """Splits a raw cell into a set of normalized tags."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return set()
+    parts = str(value).split(",") if multi_valued else [value]
+    return {tag for tag in (normalize_tag(p) for p in parts) if tag}
+
+
+class TagIndex:
+    """Tag -> contact bitmap index over TAG_COLUMNS, patched incrementally from Contact_Changes."""
+
+    def __init__(self):
+        self.version = None
+        self.positions = {}      # contact ID -> bit position
+        self.ids = []            # bit position -> contact ID
+        self.free_positions = []
+        self.contact_tags = {}   # contact ID -> {column: set of tags}
+        self.bitmaps = {col: {} for col in TAG_COLUMNS}
+        self._tag_matches = {}   # (column, query value) -> matching tags
+
+    @classmethod
+    def build(cls, rows, version=None):
+        """
+        A new index over (ID, *TAG_COLUMNS) rows. Member positions are collected per tag first and
+        each bitmap is packed once (OR-ing one bit at a time into a growing int is quadratic).
+        """
+        index = cls()
+        members = {col: {} for col in TAG_COLUMNS}
+        parsed = {}   # raw cell -> tags; cells repeat a lot (campuses, common domain lists)
+        for pos, row in enumerate(rows):
+            contact_id = row[0]
+            index.positions[contact_id] = pos
+            index.ids.append(contact_id)
+            tags_by_col = {}
+            for (col, multi_valued), value in zip(TAG_COLUMNS.items(), row[1:]):
+                key = (value, multi_valued)
+                tags = parsed.get(key)
+                if tags is None:
+                    tags = parsed[key] = frozenset(split_tags(value, multi_valued))
+                tags_by_col[col] = tags
+                col_members = members[col]
+                for tag in tags:
+                    col_members.setdefault(tag, []).append(pos)
+            index.contact_tags[contact_id] = tags_by_col
+
+        for col, col_members in members.items():
+            for tag, positions in col_members.items():
+                bits = np.zeros(positions[-1] + 1, dtype=bool)
+                bits[positions] = True
+                index.bitmaps[col][tag] = int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+        index.version = version
+        return index
+
+    def copy(self):
+        """A copy that can be patched while readers keep using this one (bitmaps are immutable ints)."""
+        index = TagIndex()
+        index.version = self.version
+        index.positions = dict(self.positions)
+        index.ids = list(self.ids)
+        index.free_positions = list(self.free_positions)
+        index.contact_tags = dict(self.contact_tags)
+        index.bitmaps = {col: dict(col_bitmaps) for col, col_bitmaps in self.bitmaps.items()}
+        return index
+
+    def upsert(self, contact_id, values):
+        """Adds or refreshes one contact's tags."""
+        if contact_id in self.positions:
+            self.remove(contact_id, keep_position=True)
+            pos = self.positions[contact_id]
+        else:
+            pos = self.free_positions.pop() if self.free_positions else len(self.ids)
+            if pos == len(self.ids):
+                self.ids.append(contact_id)
+            else:
+                self.ids[pos] = contact_id
+            self.positions[contact_id] = pos
+
+        bit = 1 << pos
+        tags_by_col = {}
+        for (col, multi_valued), value in zip(TAG_COLUMNS.items(), values):
+            tags = split_tags(value, multi_valued)
+            tags_by_col[col] = tags
+            col_bitmaps = self.bitmaps[col]
+            for tag in tags:
+                col_bitmaps[tag] = col_bitmaps.get(tag, 0) | bit
+        self.contact_tags[contact_id] = tags_by_col
+        self._tag_matches.clear()
+
+    def remove(self, contact_id, keep_position=False):
+        """Clears a contact's bits from every tag it had."""
+        pos = self.positions.get(contact_id)
+        if pos is None:
+            return
+        mask = ~(1 << pos)
+        for col, tags in self.contact_tags.pop(contact_id, {}).items():
+            col_bitmaps = self.bitmaps[col]
+            for tag in tags:
+                remaining = col_bitmaps[tag] & mask
+                if remaining:
+                    col_bitmaps[tag] = remaining
+                else:
+                    del col_bitmaps[tag]
+        if not keep_position:
+            del self.positions[contact_id]
+            self.ids[pos] = None
+            self.free_positions.append(pos)
+        self._tag_matches.clear()
+
+    def _matching_tags(self, col, value):
+        """Tags in a column containing the query value (same semantics as the old str.contains)."""
+        key = (col, normalize_tag(value))
+        if key not in self._tag_matches:
+            needle = key[1]
+            self._tag_matches[key] = [tag for tag in self.bitmaps[col] if needle in tag]
+        return self._tag_matches[key]
+
+    def match_bitmap(self, filters):
+        """ORs the values inside each {column: [values]} entry, then ANDs the columns together."""
+        result = None
+        for col, values in filters.items():
+            if col not in self.bitmaps:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            col_bitmap = 0
+            for value in values:
+                for tag in self._matching_tags(col, value):
+                    col_bitmap |= self.bitmaps[col][tag]
+            result = col_bitmap if result is None else result & col_bitmap
+            if not result:
+                return 0
+        return result
+
+    def ids_from_bitmap(self, bitmap):
+        """Decodes a bitmap back into contact IDs."""
+        if not bitmap:
+            return []
+        raw = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little")
+        return [self.ids[pos] for pos in np.flatnonzero(bits)]
+
+    def match(self, filters):
+        """Returns the contact IDs that satisfy every category filter."""
+        bitmap = self.match_bitmap(filters)
+        return self.ids_from_bitmap(bitmap) if bitmap else []
+
+
+_tag_index = TagIndex()
+_tag_lock = threading.Lock()
+
+
+def _fetch_tag_rows(conn, contact_ids=None):
+    """Reads ID plus the tag columns, optionally for a subset of contacts."""
+    cols = ", ".join(f'"{c}"' for c in TAG_COLUMNS)
+    if contact_ids is None:
+        return conn.execute(f"SELECT ID, {cols} FROM Network_Contacts").fetchall()
+
+    rows = []
+    contact_ids = list(contact_ids)
+    for i in range(0, len(contact_ids), 500):
+        chunk = contact_ids[i:i + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        rows.extend(conn.execute(f"SELECT ID, {cols} FROM Network_Contacts WHERE ID IN ({placeholders})",
+                                 chunk).fetchall())
+    return rows
+
+
+def get_tag_index():
+    """Returns the shared tag index, applying only the contact rows changed since it was last synced."""
+    global _tag_index
+    # One read snapshot, so the version stamp matches the rows fetched
+    with transaction(immediate=False) as conn:
+        version = get_data_version(conn)
+        index = _tag_index
+        if index.version == version:
+            return index
+
+        changed = get_changed_contact_ids(index.version, conn) if index.version is not None else None
+        if changed is None or len(changed) > FULL_REBUILD_FRACTION * max(len(index.positions), 1):
+            # Built outside the lock: other sessions keep matching on the old index until the swap
+            fresh = TagIndex.build(_fetch_tag_rows(conn), version)
+            with _tag_lock:
+                if _tag_index.version is None or _tag_index.version < version:
+                    _tag_index = fresh
+                return _tag_index
+
+        fresh_rows = {row[0]: row[1:] for row in _fetch_tag_rows(conn, changed)}
+
+    # Patched on a copy: sessions still matching on the published index never see it half-updated
+    patched = index.copy()
+    for contact_id in changed:
+        if contact_id in fresh_rows:
+            patched.upsert(contact_id, fresh_rows[contact_id])
+        else:
+            patched.remove(contact_id)
+    patched.version = version
+    with _tag_lock:
+        # Another thread may have synced (or swapped in a rebuild) while we patched
+        if _tag_index.version is None or _tag_index.version < version:
+            _tag_index = patched
+        return _tag_index
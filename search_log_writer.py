@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from batch_writer import BatchWriter
+
+# ---------------------------------------------------------
+# WRITE-BEHIND SEARCH LOGGING
+# ---------------------------------------------------------
+# Logging a copilot question used to cost a connection, an INSERT and a commit
+# inside the request. Now the row is queued in memory (microseconds) and a
+# background thread writes queued rows in ONE executemany transaction whenever
+# the batch is big enough or old enough. The queue is also flushed at shutdown.
+FLUSH_BATCH_SIZE = 100
+FLUSH_INTERVAL_SECONDS = 2.0
+MAX_QUEUE_SIZE = 10000    # beyond this the oldest rows are dropped rather than growing without bound
+
+
+def _utc_timestamp():
+    # Same format as SQLite's CURRENT_TIMESTAMP, captured when the search happened (not when it was flushed)
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _insert_logs(conn, rows):
+    conn.executemany("INSERT INTO Search_Logs (user_id, search_query, search_time) VALUES (?, ?, ?)", rows)
+
+
+# Failed batches are retried: a search log is worth keeping through a busy spell
+_writer = BatchWriter("search-log-writer", _insert_logs, batch_size=FLUSH_BATCH_SIZE,
+                      flush_interval=FLUSH_INTERVAL_SECONDS, max_queue_size=MAX_QUEUE_SIZE, retry_failed=True)
+
+
+def enqueue_search_log(user_id, query):
+    """Queues a Search_Logs row; the background writer persists it shortly after. Never blocks on the database."""
+    _writer.enqueue((user_id, query, _utc_timestamp()))
+
+
+def flush():
+    """Writes everything queued so far, synchronously. Returns the number of rows written."""
+    return _writer.flush()
+
+
+def shutdown(timeout=5.0):
+    """Stops the background writer after a final flush."""
+    _writer.shutdown(timeout)
+
+
+def get_writer_stats():
+    """Counters for the admin/debug view, plus the current queue depth."""
+    return _writer.stats()
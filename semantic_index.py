@@ -0,0 +1,308 @@
+import re
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+from db_manager import get_connection, get_data_version, get_changed_contact_ids, transaction
+from query_parser import FILLER_WORDS
+
+# ---------------------------------------------------------
+# LOCAL SEMANTIC INDEX (hashed TF-IDF + LSA, NumPy only)
+# ---------------------------------------------------------
+# Keyword search misses paraphrases ("housing insecurity" vs "tenant organizing").
+# Each contact's text is turned into a hashed TF-IDF vector, projected onto an
+# LSA basis (randomized SVD) so words that co-occur land close together, and
+# stored as a compact float32 blob in SQLite. A query is one matrix product
+# against the in-memory matrix. No network, no model download.
+# The shared index is never modified once published: refits and patches build a
+# new index (one at a time, outside the lock readers take) that replaces it, and
+# while one is running other sessions keep searching the current index.
+SEMANTIC_COLUMNS = ["Notes / Insights", "Needs / Challenges", "Capabilities / Expertise", "Civic Domains"]
+
+HASH_FEATURES = 4096      # hashed vocabulary size (power of two)
+LSA_DIMS = 100            # stored vector size
+FIT_SAMPLE_SIZE = 5000    # max documents used to fit the basis
+BATCH_SIZE = 2000         # documents projected per dense batch
+FULL_REFIT_FRACTION = 0.2
+
+# Minimum cosine similarity for a contact to count as a semantic candidate
+SEMANTIC_MIN_SCORE = 0.35
+
+STOP_WORDS = FILLER_WORDS | {
+    "also", "been", "but", "into", "its", "not", "our", "she", "her", "his", "him", "they", "them", "their",
+    "this", "these", "those", "was", "were", "will", "would", "through", "other", "such", "well", "via",
+    "nan", "none", "including", "within", "across", "serves", "primary",
+}
+
+
+def tokenize(text):
+    """Lowercase alphabetic tokens of 3+ letters, without stop words."""
+    return [w for w in re.findall(r"[a-z]{3,}", str(text).lower()) if w not in STOP_WORDS]
+
+
+def _feature_ids(tokens):
+    """Hashes unigrams and bigrams into HASH_FEATURES buckets."""
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return Counter(zlib.crc32(g.encode("utf-8")) & (HASH_FEATURES - 1) for g in grams)
+
+
+def _row_text(values):
+    return " ".join(str(v) for v in values if v is not None and v == v)
+
+
+def _term_matrix(texts):
+    """Dense sublinear-TF matrix (len(texts) x HASH_FEATURES), float32."""
+    matrix = np.zeros((len(texts), HASH_FEATURES), dtype=np.float32)
+    for i, text in enumerate(texts):
+        counts = _feature_ids(tokenize(text))
+        if counts:
+            cols = np.fromiter(counts.keys(), dtype=np.int64)
+            tf = np.fromiter(counts.values(), dtype=np.float32)
+            matrix[i, cols] = 1.0 + np.log(tf)
+    return matrix
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _randomized_basis(X, dims, oversample=10, power_iters=2, seed=0):
+    """Top right-singular vectors of X (features x dims) via randomized SVD."""
+    rng = np.random.default_rng(seed)
+    width = min(dims + oversample, min(X.shape))
+    Y = X.T @ rng.standard_normal((X.shape[0], width)).astype(np.float32)
+    for _ in range(power_iters):
+        Y, _ = np.linalg.qr(Y)
+        Y = X.T @ (X @ Y)
+    Q, _ = np.linalg.qr(Y)
+    _, _, Wt = np.linalg.svd(X @ Q, full_matrices=False)
+    return (Q @ Wt.T)[:, :dims].astype(np.float32)
+
+
+class SemanticIndex:
+    """In-memory matrix of contact vectors plus the fitted model needed to embed new text."""
+
+    def __init__(self):
+        self.model_id = None
+        self.version = None
+        self.idf = None
+        self.basis = None
+        self.ids = []
+        self.positions = {}
+        self.matrix = np.zeros((0, LSA_DIMS), dtype=np.float32)
+
+    def embed(self, texts):
+        """Projects raw texts into the LSA space (unit-length float32 rows)."""
+        out = []
+        for i in range(0, len(texts), BATCH_SIZE):
+            tfidf = _normalize_rows(_term_matrix(texts[i:i + BATCH_SIZE]) * self.idf)
+            out.append(_normalize_rows(tfidf @ self.basis))
+        return np.vstack(out) if out else np.zeros((0, self.basis.shape[1]), dtype=np.float32)
+
+    def fit(self, texts):
+        """Fits IDF weights and the LSA basis on (a sample of) the corpus."""
+        if len(texts) > FIT_SAMPLE_SIZE:
+            rng = np.random.default_rng(0)
+            texts = [texts[i] for i in rng.choice(len(texts), FIT_SAMPLE_SIZE, replace=False)]
+        tf = _term_matrix(texts)
+        doc_freq = (tf > 0).sum(axis=0)
+        self.idf = (np.log((len(texts) + 1) / (doc_freq + 1)) + 1.0).astype(np.float32)
+        tfidf = _normalize_rows(tf * self.idf)
+        self.basis = _randomized_basis(tfidf, min(LSA_DIMS, max(1, min(tfidf.shape) - 1)))
+
+    def set_vectors(self, contact_ids, vectors):
+        """Adds or replaces rows in the in-memory matrix."""
+        new_rows = []
+        for contact_id, vector in zip(contact_ids, vectors):
+            pos = self.positions.get(contact_id)
+            if pos is None:
+                self.positions[contact_id] = len(self.ids) + len(new_rows)
+                new_rows.append(vector)
+            else:
+                self.matrix[pos] = vector
+        if new_rows:
+            self.matrix = np.vstack([self.matrix, np.asarray(new_rows, dtype=np.float32)])
+            self.ids.extend(cid for cid in contact_ids if self.positions[cid] >= len(self.ids))
+
+    def copy(self):
+        """A copy that can be patched while readers keep searching this one (the fitted model is shared)."""
+        index = SemanticIndex()
+        index.model_id = self.model_id
+        index.version = self.version
+        index.idf = self.idf
+        index.basis = self.basis
+        index.ids = list(self.ids)
+        index.positions = dict(self.positions)
+        index.matrix = self.matrix.copy()
+        return index
+
+    def remove(self, contact_ids):
+        """Drops rows for deleted contacts."""
+        drop = {self.positions[c] for c in contact_ids if c in self.positions}
+        if not drop:
+            return
+        keep = [i for i in range(len(self.ids)) if i not in drop]
+        self.matrix = self.matrix[keep]
+        self.ids = [self.ids[i] for i in keep]
+        self.positions = {cid: i for i, cid in enumerate(self.ids)}
+
+    def search(self, text, top_k=25, min_score=0.0, allowed_ids=None):
+        """Top-k contacts by cosine similarity: returns [(contact_id, score)], best first."""
+        if self.basis is None or not self.ids:
+            return []
+        query = self.embed([text])[0]
+        if not query.any():
+            return []
+        scores = self.matrix @ query
+        if allowed_ids is not None:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[self.positions[c] for c in allowed_ids if c in self.positions]] = True
+            scores = np.where(mask, scores, -1.0)
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top if scores[i] >= min_score]
+
+
+_index = SemanticIndex()
+_index_lock = threading.Lock()   # guards swapping the _index reference
+_sync_lock = threading.Lock()    # one load/refit/patch at a time
+
+
+def _fetch_texts(conn, contact_ids=None):
+    """Returns {contact_id: concatenated semantic text}."""
+    cols = ", ".join(f'"{c}"' for c in SEMANTIC_COLUMNS)
+    if contact_ids is None:
+        rows = conn.execute(f"SELECT ID, {cols} FROM Network_Contacts").fetchall()
+    else:
+        rows = []
+        contact_ids = list(contact_ids)
+        for i in range(0, len(contact_ids), 500):
+            chunk = contact_ids[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows.extend(conn.execute(f"SELECT ID, {cols} FROM Network_Contacts WHERE ID IN ({placeholders})",
+                                     chunk).fetchall())
+    return {row[0]: _row_text(row[1:]) for row in rows}
+
+
+def _save_vectors(conn, model_id, contact_ids, vectors):
+    conn.executemany("INSERT OR REPLACE INTO Contact_Vectors (contact_id, model_id, vector) VALUES (?, ?, ?)",
+                     [(cid, model_id, vec.astype(np.float32).tobytes()) for cid, vec in zip(contact_ids, vectors)])
+
+
+def _refit(conn, version):
+    """Fits a new model on the whole table and rewrites every stored vector."""
+    texts = _fetch_texts(conn)
+    fresh = SemanticIndex()
+    contact_ids = list(texts)
+    fresh.fit(list(texts.values()) or [""])
+    vectors = fresh.embed(list(texts.values()))
+
+    with transaction():
+        cursor = conn.execute('''
+                              INSERT INTO Semantic_Model (features, dims, idf, basis, synced_version)
+                              VALUES (?, ?, ?, ?, ?)
+                              ''', (HASH_FEATURES, fresh.basis.shape[1], fresh.idf.tobytes(), fresh.basis.tobytes(),
+                                    version))
+        fresh.model_id = cursor.lastrowid
+        conn.execute("DELETE FROM Contact_Vectors")
+        conn.execute("DELETE FROM Semantic_Model WHERE model_id != ?", (fresh.model_id,))
+        _save_vectors(conn, fresh.model_id, contact_ids, vectors)
+
+    fresh.set_vectors(contact_ids, vectors)
+    fresh.version = version
+    return fresh
+
+
+def _load(conn):
+    """Loads the latest stored model and its vectors, or returns None if there is none."""
+    row = conn.execute('''
+                       SELECT model_id, features, dims, idf, basis, synced_version
+                       FROM Semantic_Model
+                       ORDER BY model_id DESC
+                       LIMIT 1
+                       ''').fetchone()
+    if row is None or row[1] != HASH_FEATURES:
+        return None
+    model_id, features, dims, idf, basis, synced_version = row
+    loaded = SemanticIndex()
+    loaded.model_id = model_id
+    loaded.idf = np.frombuffer(idf, dtype=np.float32)
+    loaded.basis = np.frombuffer(basis, dtype=np.float32).reshape(features, dims)
+    vectors = conn.execute("SELECT contact_id, vector FROM Contact_Vectors WHERE model_id = ?",
+                           (model_id,)).fetchall()
+    loaded.ids = [v[0] for v in vectors]
+    loaded.positions = {cid: i for i, cid in enumerate(loaded.ids)}
+    loaded.matrix = (np.frombuffer(b"".join(v[1] for v in vectors), dtype=np.float32).reshape(-1, dims).copy()
+                     if vectors else np.zeros((0, dims), dtype=np.float32))
+    loaded.version = synced_version
+    return loaded
+
+
+def _apply_changes(conn, index, version, changed):
+    """
+    A patched copy of the index with only the changed contacts re-embedded (fold-in with the current
+    model). The index passed in is left untouched.
+    """
+    texts = _fetch_texts(conn, changed)
+    present = [cid for cid in changed if cid in texts]
+    removed = [cid for cid in changed if cid not in texts]
+    vectors = index.embed([texts[cid] for cid in present]) if present else None
+    with transaction():
+        if present:
+            _save_vectors(conn, index.model_id, present, vectors)
+        if removed:
+            conn.executemany("DELETE FROM Contact_Vectors WHERE contact_id = ?", [(cid,) for cid in removed])
+        conn.execute("UPDATE Semantic_Model SET synced_version = ? WHERE model_id = ?", (version, index.model_id))
+    patched = index.copy()
+    if present:
+        patched.set_vectors(present, vectors)
+    if removed:
+        patched.remove(removed)
+    patched.version = version
+    return patched
+
+
+def _sync(conn, version, force_refit):
+    """Builds the index for version from the published one (load, refit or patch). Caller holds _sync_lock."""
+    index = _index
+    if force_refit:
+        return _refit(conn, version)
+    if index.basis is None:
+        index = _load(conn) or _refit(conn, version)
+    if index.version == version:
+        return index
+    changed = get_changed_contact_ids(index.version, conn)
+    if changed is None or len(changed) > FULL_REFIT_FRACTION * max(len(index.ids), 1):
+        return _refit(conn, version)
+    return _apply_changes(conn, index, version, changed)
+
+
+def get_semantic_index(force_refit=False):
+    """Returns the shared semantic index, loading, fitting or patching it as needed."""
+    global _index
+    conn = get_connection()
+    version = get_data_version(conn)
+    index = _index
+    if index.version == version and not force_refit:
+        return index
+    # While another session syncs, search the current index rather than wait for a refit
+    if not _sync_lock.acquire(blocking=force_refit or index.basis is None):
+        return index
+    try:
+        version = get_data_version(conn)   # the session that held the lock may have synced past it
+        if _index.version == version and not force_refit:
+            return _index
+        fresh = _sync(conn, version, force_refit)
+        with _index_lock:
+            _index = fresh
+        return fresh
+    finally:
+        _sync_lock.release()
+
+
+def semantic_search(text, top_k=25, min_score=SEMANTIC_MIN_SCORE, allowed_ids=None):
+    """Convenience wrapper: [(contact_id, score)] for the contacts closest in meaning to the text."""
+    return get_semantic_index().search(text, top_k=top_k, min_score=min_score, allowed_ids=allowed_ids)